@@ -7,7 +7,18 @@ ddddocr HTTP API服务模块
 __version__ = "1.0.0"
 __author__ = "sml2h3"
 
-from .server import create_app, run_server
-from .models import *
-
 __all__ = ['create_app', 'run_server']
+
+
+def __getattr__(name):
+    """按需导入服务模块与数据模型，避免导入 api 子模块时加载 FastAPI 等重依赖"""
+    import importlib
+
+    if name in __all__:
+        return getattr(importlib.import_module(".server", __name__), name)
+    if name.startswith("_"):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    models = importlib.import_module(".models", __name__)
+    if hasattr(models, name):
+        return getattr(models, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,68 @@
+# coding=utf-8
+"""
+管理接口
+按需CPU采样分析与请求追踪查询，仅限持有管理员JWT的调用方访问
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+
+from .models import APIResponse, AdminProfileRequest, TracingConfigRequest
+from .middleware import is_admin_claims
+
+
+def require_admin(request: Request):
+    """校验调用方的JWT具有管理员权限（声明由 AuthMiddleware 写入）"""
+    if not is_admin_claims(getattr(request.state, "auth_claims", None)):
+        raise HTTPException(status_code=403, detail="需要管理员权限")
+
+
+class AdminHandler:
+    """管理接口处理器"""
+
+    def __init__(self, service):
+        self.service = service
+        self.router = APIRouter(dependencies=[Depends(require_admin)])
+        self._setup_routes()
+
+    def _setup_routes(self):
+        service = self.service
+
+        @self.router.post("/profile", response_model=APIResponse)
+        async def start_profile(request: AdminProfileRequest):
+            """开始一次限时CPU采样"""
+            try:
+                service.profiler.start(request.duration_seconds, request.interval_ms)
+            except RuntimeError as e:
+                raise HTTPException(status_code=409, detail=str(e))
+            return APIResponse(success=True, message="CPU采样已开始", data=service.profiler.status())
+
+        @self.router.get("/profile", response_model=APIResponse)
+        async def profile_status():
+            """CPU采样状态"""
+            return APIResponse(success=True, message="获取采样状态成功", data=service.profiler.status())
+
+        @self.router.get("/profile/download", response_class=PlainTextResponse)
+        async def download_profile():
+            """下载折叠栈格式的采样结果，可直接交给 flamegraph.pl 或 speedscope"""
+            collapsed = service.profiler.collapsed()
+            if collapsed is None:
+                raise HTTPException(status_code=404, detail="尚无采样结果，请先调用 POST /admin/profile")
+            return PlainTextResponse(
+                collapsed,
+                headers={"Content-Disposition": 'attachment; filename="ddddocr-profile.collapsed"'}
+            )
+
+        @self.router.post("/tracing", response_model=APIResponse)
+        async def configure_tracing(request: TracingConfigRequest):
+            """调整请求追踪采样率与缓冲区大小"""
+            service.tracer.configure(request.sample_rate, request.capacity)
+            return APIResponse(success=True, message="追踪配置已更新", data=service.tracer.get_metrics())
+
+        @self.router.get("/traces", response_model=APIResponse)
+        async def slowest_traces(limit: int = Query(10, ge=1, le=1000), operation: Optional[str] = None):
+            """查询最慢的N条请求追踪"""
+            return APIResponse(success=True, message="获取追踪成功",
+                               data={"traces": service.tracer.slowest(limit, operation)})
@@ -0,0 +1,250 @@
+# coding=utf-8
+"""
+滑块背景图库索引
+验证码厂商复用有限数量的背景图。以感知哈希 (pHash) 索引已知的完整背景，
+并缓存其解码后的像素，新的滑块请求只需上传带坑位的图片：
+同尺寸的背景按哈希距离排序后逐个做抽样像素差分校验，匹配后直接与缓存的像素做差分定位缺口。
+缺口会使哈希偏移十几到三十多位，与无关背景之间的距离相当，因此哈希只决定校验顺序，不做筛除。
+
+背景来源: 预加载目录中的图片，以及（开启学习时）以往 /slide-comparison 请求中的完整背景图
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from .logs import log
+
+if TYPE_CHECKING:
+    import numpy as np
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp"}
+
+_dct_matrix = None
+
+
+def _dct_basis(size: int = 32):
+    """DCT-II 变换矩阵（pHash 只需 32×32 的二维DCT，无需额外依赖）"""
+    global _dct_matrix
+    if _dct_matrix is None:
+        import numpy as np
+
+        k = np.arange(size).reshape(-1, 1)
+        n = np.arange(size).reshape(1, -1)
+        matrix = np.cos(np.pi * (2 * n + 1) * k / (2 * size)) * np.sqrt(2.0 / size)
+        matrix[0] /= np.sqrt(2.0)
+        _dct_matrix = matrix
+    return _dct_matrix
+
+
+def decode_rgb(image_data: bytes) -> "np.ndarray":
+    """解码为RGB像素数组（与 ddddocr 滑块引擎的输入一致）"""
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(io.BytesIO(image_data)) as image:
+        return np.array(image.convert("RGB"))
+
+
+def phash(pixels: "np.ndarray") -> int:
+    """64位感知哈希：灰度缩放到32×32，取DCT左上8×8低频系数（去掉直流分量）与中位数比较"""
+    import numpy as np
+    from PIL import Image
+
+    gray = Image.fromarray(pixels).convert("L").resize((32, 32), Image.BILINEAR)
+    basis = _dct_basis()
+    coefficients = basis @ np.asarray(gray, dtype=np.float64) @ basis.T
+    low = coefficients[:8, :8].flatten()[1:]
+    bits = low > np.median(low)
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+# 像素差分校验的抽样步长
+_SAMPLE_STEP = 4
+
+
+def _sample(pixels: "np.ndarray") -> "np.ndarray":
+    import numpy as np
+
+    return pixels[::_SAMPLE_STEP, ::_SAMPLE_STEP].astype(np.int16)
+
+
+class _Background:
+    __slots__ = ("digest", "hash", "pixels", "sample", "hits", "source")
+
+    def __init__(self, digest: str, hash_value: int, pixels, source: str):
+        self.digest = digest
+        self.hash = hash_value
+        self.pixels = pixels
+        # 抽样像素预先转换好，校验每个候选时不再重复转换
+        self.sample = _sample(pixels)
+        self.hits = 0
+        self.source = source
+
+
+class BackgroundIndex:
+    """
+    背景图库索引（LRU，按图片尺寸分组）
+
+    Args:
+        capacity: 最多缓存的背景数（每个背景保留一份解码后的像素）
+        max_bytes: 缓存像素的总字节数上限，与 capacity 同时生效；单张超过上限的背景不收录
+        max_diff_ratio: 差分像素占比上限，超过时认为背景不匹配（缺口通常只占很小的面积）
+        learn: 是否从 /slide-comparison 请求中自动收录背景（默认关闭：收录需要完整解码，
+            且任何调用方都能借此写入图库）
+        directory: 预加载的背景图目录
+    """
+
+    def __init__(self, capacity: int = 256, max_bytes: int = 256 * 1024 * 1024, max_diff_ratio: float = 0.2,
+                 learn: bool = False, directory: Optional[str] = None):
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.max_diff_ratio = max_diff_ratio
+        self.learn = learn
+        self.directory = directory
+        self._preloaded = False
+        self._entries: "OrderedDict[str, _Background]" = OrderedDict()
+        self._by_shape: Dict[Tuple[int, ...], List[_Background]] = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.lookups = 0
+        self.hits = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls) -> "BackgroundIndex":
+        return cls(
+            capacity=int(os.getenv("DDDDOCR_SLIDE_INDEX_SIZE", 256)),
+            max_bytes=int(os.getenv("DDDDOCR_SLIDE_INDEX_MAX_BYTES", 256 * 1024 * 1024)),
+            learn=os.getenv("DDDDOCR_SLIDE_INDEX_LEARN", "false").lower() == "true",
+            directory=os.getenv("DDDDOCR_SLIDE_BACKGROUND_DIR") or None,
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, image_data: bytes, source: str = "request") -> bool:
+        """
+        收录一张完整背景，已存在时只刷新其 LRU 位置
+
+        Returns:
+            是否新增（解码后超过字节上限的背景不收录）
+        """
+        from PIL import Image
+
+        if self.capacity <= 0:
+            return False
+        digest = hashlib.sha256(image_data).hexdigest()
+        with self._lock:
+            if digest in self._entries:
+                self._entries.move_to_end(digest)
+                return False
+        with Image.open(io.BytesIO(image_data)) as image:
+            # 按像素尺寸估算解码后的大小，超限时不解码
+            width, height = image.size
+        if self._entry_bytes(width, height) > self.max_bytes:
+            return False
+        pixels = decode_rgb(image_data)
+        entry = _Background(digest, phash(pixels), pixels, source)
+        size = entry.pixels.nbytes + entry.sample.nbytes
+        with self._lock:
+            if digest in self._entries:
+                return False
+            self._entries[digest] = entry
+            self._by_shape.setdefault(pixels.shape, []).append(entry)
+            self.bytes += size
+            while len(self._entries) > self.capacity or self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._by_shape[evicted.pixels.shape].remove(evicted)
+                self.bytes -= evicted.pixels.nbytes + evicted.sample.nbytes
+        return True
+
+    @staticmethod
+    def _entry_bytes(width: int, height: int) -> int:
+        """一个背景占用的字节数：RGB像素加 int16 抽样像素"""
+        sampled = -(-width // _SAMPLE_STEP) * -(-height // _SAMPLE_STEP)
+        return width * height * 3 + sampled * 3 * 2
+
+    def load_directory(self, directory: str) -> int:
+        """预加载目录中的背景图，返回新增数量"""
+        added = 0
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() not in IMAGE_EXTENSIONS:
+                    continue
+                try:
+                    with open(os.path.join(root, name), "rb") as f:
+                        added += self.add(f.read(), source="preload")
+                except Exception as e:
+                    log.warning("SlideIndex", f"Skipped background {name}: {e}")
+        log.info("SlideIndex", f"Preloaded {added} backgrounds from {directory}")
+        return added
+
+    def preload(self):
+        """加载配置的背景图目录（只加载一次，预派生模式下在 fork 前完成，工作进程共享）"""
+        if self.directory and not self._preloaded:
+            self._preloaded = True
+            self.load_directory(self.directory)
+
+    def _candidates(self, pixels) -> List[Tuple[int, _Background]]:
+        """同尺寸的全部背景，按哈希距离升序（正确背景通常排在前面，校验可提前结束）"""
+        with self._lock:
+            entries = list(self._by_shape.get(pixels.shape, ()))
+        if not entries:
+            return []
+        hash_value = phash(pixels)
+        scored = [((hash_value ^ entry.hash).bit_count(), entry) for entry in entries]
+        return sorted(scored, key=lambda item: item[0])
+
+    def solve(self, slide_engine, target_data: bytes) -> Optional[Dict[str, Any]]:
+        """
+        仅凭带坑位的图片求解滑块
+
+        Returns:
+            与 slide_comparison 相同的结果，附带匹配的背景信息；未找到匹配背景时返回 None
+        """
+        import numpy as np
+
+        with self._lock:
+            self.lookups += 1
+        target = decode_rgb(target_data)
+        sample = _sample(target)
+        limit = self.max_diff_ratio * sample.shape[0] * sample.shape[1]
+        for distance, entry in self._candidates(target):
+            # 抽样校验：差分像素过多说明是另一张背景
+            changed = np.count_nonzero(np.abs(sample - entry.sample).max(axis=2) > 30)
+            if changed > limit:
+                with self._lock:
+                    self.rejected += 1
+                continue
+            result = slide_engine._perform_slide_comparison(target, entry.pixels)
+            with self._lock:
+                entry.hits += 1
+                self.hits += 1
+                if entry.digest in self._entries:
+                    self._entries.move_to_end(entry.digest)
+            result["background"] = {"id": entry.digest[:16], "distance": distance, "source": entry.source}
+            return result
+        return None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            shapes = {f"{shape[1]}x{shape[0]}": len(entries) for shape, entries in self._by_shape.items() if entries}
+        return {
+            "backgrounds": len(self._entries),
+            "capacity": self.capacity,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "learn": self.learn,
+            "shapes": shapes,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.lookups if self.lookups else None,
+            "rejected_candidates": self.rejected,
+        }
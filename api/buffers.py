@@ -0,0 +1,206 @@
+# coding=utf-8
+"""
+图片到ONNX张量的低拷贝路径
+默认路径中一张验证码要经过多次整图拷贝：PIL图片 -> np.array -> astype(float32) -> /255，
+模型输出再由 session.run 分配新数组返回。这里:
+- 预处理仍复用 ddddocr 的缩放与灰度转换（保证输入完全一致），像素直接归一化写入按线程复用的张量缓冲区
+- 通过 onnxruntime I/O 绑定把该缓冲区作为输入、把按线程复用的输出缓冲区作为输出，会话直接读写，不再拷贝
+
+复用的缓冲区属于执行推理的线程，只在同一次推理调用内有效
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+class BufferPool:
+    """按线程、形状与类型复用的 NumPy 缓冲区"""
+
+    def __init__(self, max_shapes: int = 16):
+        self.max_shapes = max_shapes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.allocations = 0
+        self.reuses = 0
+
+    def get(self, shape: Tuple[int, ...], dtype="float32") -> "np.ndarray":
+        """获取当前线程的缓冲区（内容未初始化）"""
+        import numpy as np
+
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        key = (shape, dtype)
+        buffer = buffers.get(key)
+        if buffer is None:
+            if len(buffers) >= self.max_shapes:
+                # 输入尺寸很多变时不无限增长
+                buffers.clear()
+            buffer = buffers[key] = np.empty(shape, dtype=dtype)
+            with self._lock:
+                self.allocations += 1
+        else:
+            self.reuses += 1
+        return buffer
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {"allocations": self.allocations, "reuses": self.reuses}
+
+
+def resize_for_model(engine, image, png_fix: bool = False):
+    """按 OCREngine._preprocess_image 的规则透明背景处理、缩放并转换通道（返回PIL图片）"""
+    from ddddocr.utils.image_io import png_rgba_black_preprocess
+    from ddddocr.preprocessing.image_processor import ImageProcessor
+
+    if png_fix and image.mode == "RGBA":
+        image = png_rgba_black_preprocess(image)
+    if not engine.use_import_onnx:
+        target_height = 64
+        target_width = int(image.size[0] * (target_height / image.size[1]))
+        image = ImageProcessor.resize_image(image, (target_width, target_height))
+        return ImageProcessor.convert_to_grayscale(image)
+    if engine.resize[0] == -1:
+        if engine.word:
+            image = ImageProcessor.resize_image(image, (engine.resize[1], engine.resize[1]))
+        else:
+            target_height = engine.resize[1]
+            target_width = int(image.size[0] * (target_height / image.size[1]))
+            image = ImageProcessor.resize_image(image, (target_width, target_height))
+    else:
+        image = ImageProcessor.resize_image(image, (engine.resize[0], engine.resize[1]))
+    if engine.channel == 1:
+        image = ImageProcessor.convert_to_grayscale(image)
+    return image
+
+
+def normalize_into(pixels: "np.ndarray", pool: BufferPool) -> "np.ndarray":
+    """
+    uint8 像素 (H, W) 或 (H, W, C) 归一化到 [0, 1] 并写入复用的 (1, C, H, W) 张量
+
+    与 ddddocr 的 astype(float32) / 255.0 逐位一致（均按 float32 计算）
+    """
+    import numpy as np
+
+    if pixels.ndim == 2:
+        tensor = pool.get((1, 1) + pixels.shape)
+        np.divide(pixels, np.float32(255), out=tensor[0, 0])
+    else:
+        height, width, channels = pixels.shape
+        tensor = pool.get((1, channels, height, width))
+        # 写入 CHW 缓冲区的 HWC 视图，转置在写入时完成
+        np.divide(pixels, np.float32(255), out=tensor[0].transpose(1, 2, 0))
+    return tensor
+
+
+class BoundSession:
+    """
+    基于 I/O 绑定的会话调用
+
+    输入直接绑定调用方的缓冲区；输出形状按输入形状记录，已知时绑定复用的输出缓冲区，
+    首次遇到的输入形状由会话分配输出并记录其形状。
+    模型声明的输出维数与实际不符时（ddddocr 自带模型声明为 [1, seqlen]，实际输出 (T, 1, C)）
+    onnxruntime 拒绝预分配的输出，此时输出由会话的内存池分配，以不拷贝的 numpy 视图返回
+    """
+
+    def __init__(self, pool: BufferPool):
+        self.pool = pool
+        self._local = threading.local()
+        self._output_shapes: Dict[Tuple[int, ...], Tuple[int, ...]] = {}
+
+    def run(self, session, input_name: str, tensor: "np.ndarray") -> "np.ndarray":
+        import numpy as np
+
+        local = self._local
+        if getattr(local, "session", None) is not session:
+            # 会话重建（执行配置切换、弹性线程数调整）后重新创建绑定
+            local.session = session
+            local.binding = session.io_binding()
+            local.output_name = session.get_outputs()[0].name
+            local.output_rank = len(session.get_outputs()[0].shape)
+        binding = local.binding
+        binding.bind_cpu_input(input_name, tensor)
+        shape = self._output_shapes.get(tensor.shape)
+        try:
+            if shape is not None:
+                output = self.pool.get(shape)
+                binding.bind_output(local.output_name, "cpu", element_type=np.float32, shape=list(shape),
+                                    buffer_ptr=output.ctypes.data)
+                session.run_with_iobinding(binding)
+                return output
+            binding.bind_output(local.output_name, "cpu")
+            session.run_with_iobinding(binding)
+            output = binding.get_outputs()[0].numpy()
+            if output.dtype == np.float32 and output.ndim == local.output_rank:
+                if len(self._output_shapes) >= 64:
+                    self._output_shapes.clear()
+                self._output_shapes[tensor.shape] = output.shape
+            return output
+        finally:
+            binding.clear_binding_inputs()
+            binding.clear_binding_outputs()
+
+
+def benchmark_ingest(instance, images, repeat: int = 200) -> Dict[str, Dict[str, Optional[float]]]:
+    """
+    对比默认路径与低拷贝路径的单次请求耗时与内存分配
+
+    每条路径都从base64文本开始，到模型输出为止。分配用 tracemalloc 统计单次请求的瞬时峰值
+    （覆盖 Python 对象与 NumPy 缓冲区，不含 PIL/onnxruntime 内部的C分配）；
+    低拷贝路径另计稳态下新分配的张量/输出缓冲区个数
+
+    Returns:
+        {路径: {median_ms, peak_kib, buffer_allocations}}
+    """
+    import base64
+    import binascii
+    import statistics
+    import time
+    import tracemalloc
+    from .engine import OCRRunner
+
+    encoded = [base64.b64encode(image).decode() for image in images]
+    runner = OCRRunner(instance)
+    engine = runner.engine
+
+    def default_path(text):
+        image = runner.load_image(base64.b64decode(text))
+        tensor = engine._preprocess_image(image, False)
+        return engine.session.run(None, {runner.input_name: tensor})[0]
+
+    def zero_copy_path(text):
+        image = runner.load_image(binascii.a2b_base64(text))
+        return runner.infer(runner.preprocess(image, False, pooled=True), pooled=True)
+
+    report: Dict[str, Dict[str, Optional[float]]] = {}
+    for name, path in (("default", default_path), ("zero_copy", zero_copy_path)):
+        # 预热：每种输入尺寸各一次（低拷贝路径在此分配缓冲区、记录输出形状）
+        for text in encoded:
+            path(text)
+        allocations_before = runner.buffers.allocations
+        timings = []
+        for index in range(repeat):
+            started = time.perf_counter()
+            path(encoded[index % len(encoded)])
+            timings.append((time.perf_counter() - started) * 1000)
+
+        samples = min(repeat, 50)
+        peaks = []
+        tracemalloc.start()
+        for index in range(samples):
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            path(encoded[index % len(encoded)])
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+        tracemalloc.stop()
+
+        report[name] = {
+            "median_ms": round(statistics.median(timings), 3),
+            "peak_kib": round(statistics.median(peaks) / 1024, 1),
+            "buffer_allocations": runner.buffers.allocations - allocations_before if name == "zero_copy" else None,
+        }
+    return report
@@ -0,0 +1,264 @@
+# coding=utf-8
+"""
+离线批量识别
+从目录、tar 归档或 JSONL 清单读取图片，在多进程中复用 DDDDOCRService 的
+模型加载与推理路径（每个进程一份模型），结果以 JSONL 流式写出，支持断点续跑
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import tarfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp"}
+
+# 操作名 -> 所需的图片字段
+OPERATION_FIELDS = {
+    "ocr": ("image",),
+    "detect": ("image",),
+    "slide_match": ("target_image", "background_image"),
+    "slide_comparison": ("target_image", "background_image"),
+}
+
+# 工作进程内的服务实例与任务参数
+_worker_service = None
+_worker_operation = None
+_worker_request = None
+_worker_options: Dict[str, Any] = {}
+
+
+def _is_image_name(name: str) -> bool:
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+
+def iter_directory(path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """按相对路径排序遍历目录中的图片，图片以路径传递由工作进程读取"""
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if _is_image_name(name):
+                full_path = os.path.join(root, name)
+                yield os.path.relpath(full_path, path), {"image": full_path}
+
+
+def iter_tar(path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """流式读取 tar 归档（支持压缩），逐个成员读入内存"""
+    with tarfile.open(path, "r|*") as archive:
+        for member in archive:
+            if member.isfile() and _is_image_name(member.name):
+                data = archive.extractfile(member).read()
+                yield member.name, {"image": data}
+
+
+def iter_manifest(path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    读取 JSONL 清单，每行一个样本:
+      {"id": "...", "image": "相对清单目录的路径"}
+      {"id": "...", "target_image": "...", "background_image": "..."}
+    图片字段也可用 "<字段>_base64" 直接给出base64内容
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            images = {}
+            for field in ("image", "target_image", "background_image"):
+                if record.get(f"{field}_base64"):
+                    images[field] = base64.b64decode(record[f"{field}_base64"])
+                elif record.get(field):
+                    images[field] = os.path.join(base_dir, record[field])
+            yield str(record.get("id", line_number)), images
+
+
+def iter_input(path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """根据输入类型（目录 / JSONL 清单 / tar 归档）选择读取方式"""
+    if os.path.isdir(path):
+        return iter_directory(path)
+    if path.endswith(".jsonl"):
+        return iter_manifest(path)
+    if tarfile.is_tarfile(path):
+        return iter_tar(path)
+    raise ValueError(f"不支持的输入: {path}（需为目录、.jsonl 清单或 tar 归档）")
+
+
+def load_completed(output_path: str) -> Set[str]:
+    """
+    读取已有输出中成功完成的样本ID，用于断点续跑；
+    中断时写了一半的末行会被截断
+    """
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    valid_size = 0
+    with open(output_path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            valid_size += len(line)
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if "error" not in record:
+                completed.add(record["id"])
+    if valid_size != os.path.getsize(output_path):
+        with open(output_path, "r+b") as f:
+            f.truncate(valid_size)
+    return completed
+
+
+def _init_worker(init_config: Dict[str, Any], operation: str, options: Dict[str, Any], threads: int):
+    """工作进程初始化：加载一份模型"""
+    global _worker_service, _worker_operation, _worker_request, _worker_options
+    from .server import DDDDOCRService
+    from .models import InitializeRequest, OCRRequest
+    from .prefork import prepare_service
+
+    _worker_service = DDDDOCRService()
+    _worker_service.initialize(InitializeRequest(**init_config))
+    # 并发由进程数提供，每个进程的ONNX会话只用少量线程，避免超额订阅CPU
+    prepare_service(_worker_service, intra_op_threads=threads)
+    _worker_operation = operation
+    _worker_options = options
+    if operation == "ocr":
+        _worker_request = OCRRequest(image="", **options)
+
+
+def _read_image(value) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    with open(value, "rb") as f:
+        return f.read()
+
+
+def _solve(item_id: str, images: Dict[str, Any]) -> Dict[str, Any]:
+    """在工作进程中处理一个样本（与HTTP接口走相同的推理路径）"""
+    started = time.perf_counter()
+    record = {"id": item_id}
+    try:
+        missing = [field for field in OPERATION_FIELDS[_worker_operation] if field not in images]
+        if missing:
+            raise ValueError(f"缺少图片字段: {', '.join(missing)}")
+        service = _worker_service
+        if _worker_operation == "ocr":
+            record["result"] = service.run_ocr(_read_image(images["image"]), _worker_request)
+        elif _worker_operation == "detect":
+            record["result"] = service.run_detection(_read_image(images["image"]))
+        elif _worker_operation == "slide_match":
+            record["result"] = service.run_slide_match(
+                _read_image(images["target_image"]), _read_image(images["background_image"]),
+                _worker_options.get("simple_target", False)
+            )
+        else:
+            record["result"] = service.run_slide_comparison(
+                _read_image(images["target_image"]), _read_image(images["background_image"])
+            )
+    except Exception as e:
+        record["error"] = str(e)
+    record["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return record
+
+
+def solve(input_path: str, output_path: str, operation: str = "ocr",
+          options: Optional[Dict[str, Any]] = None, init_config: Optional[Dict[str, Any]] = None,
+          workers: Optional[int] = None, threads: int = 1, resume: bool = True,
+          progress_interval: float = 5.0) -> Dict[str, Any]:
+    """
+    批量处理并流式写出 JSONL 结果
+
+    Args:
+        input_path: 图片目录、JSONL 清单或 tar 归档
+        output_path: 结果 JSONL 文件（续跑时追加）
+        operation: ocr / detect / slide_match / slide_comparison
+        options: 识别参数，ocr 时与 OCRRequest 字段一致
+        init_config: 模型初始化参数，与 InitializeRequest 字段一致
+        workers: 进程数，默认 CPU 核数
+        threads: 每个进程的ONNX算子内线程数
+        resume: 跳过输出中已成功完成的样本
+        progress_interval: 进度输出间隔（秒）
+
+    Returns:
+        吞吐量统计
+    """
+    from .models import OCRRequest
+
+    if operation not in OPERATION_FIELDS:
+        raise ValueError(f"不支持的操作: {operation}")
+    options = options or {}
+    if operation == "ocr":
+        # 参数校验失败在主进程中尽早报错
+        OCRRequest(image="", **options)
+    init_config = dict(init_config or {})
+    init_config.setdefault("ocr", operation == "ocr")
+    init_config.setdefault("det", operation == "detect")
+
+    workers = workers or os.cpu_count() or 1
+    completed = load_completed(output_path) if resume else set()
+    if not resume and os.path.exists(output_path):
+        open(output_path, "w").close()
+
+    stats = {"processed": 0, "errors": 0, "skipped": 0}
+    latencies = []
+    max_pending = workers * 4
+    started = time.perf_counter()
+    last_report = started
+
+    def report(final: bool = False):
+        elapsed = time.perf_counter() - started
+        rate = stats["processed"] / elapsed if elapsed > 0 else 0.0
+        prefix = "完成" if final else "进度"
+        # 命令行进度直接写标准错误：服务日志默认写标准输出，会与命令最后输出的 JSON 汇总混在一起
+        print(f"[solve] {prefix}: {stats['processed']} 已处理, {stats['errors']} 失败, "
+              f"{stats['skipped']} 跳过, {rate:.1f} 张/秒, 用时 {elapsed:.1f}s", file=sys.stderr)
+
+    with open(output_path, "a", encoding="utf-8") as output, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                initargs=(init_config, operation, options, threads)) as pool:
+        pending = set()
+
+        def drain(block: bool):
+            nonlocal last_report
+            done, _ = wait(pending, return_when=FIRST_COMPLETED, timeout=None if block else 0)
+            for future in done:
+                pending.discard(future)
+                record = future.result()
+                stats["processed"] += 1
+                if "error" in record:
+                    stats["errors"] += 1
+                else:
+                    latencies.append(record["elapsed_ms"])
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+            if progress_interval and time.perf_counter() - last_report >= progress_interval:
+                last_report = time.perf_counter()
+                report()
+
+        for item_id, images in iter_input(input_path):
+            if item_id in completed:
+                stats["skipped"] += 1
+                continue
+            # 在途任务数有上限，保证内存占用与输入规模无关
+            while len(pending) >= max_pending:
+                drain(block=True)
+            pending.add(pool.submit(_solve, item_id, images))
+        while pending:
+            drain(block=True)
+
+    report(final=True)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        **stats,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput": round(stats["processed"] / elapsed, 3) if elapsed > 0 else None,
+        "p50_ms": latencies[len(latencies) // 2] if latencies else None,
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None,
+        "workers": workers,
+    }
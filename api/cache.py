@@ -0,0 +1,393 @@
+# coding=utf-8
+"""
+推理结果缓存
+多副本部署时，客户端重试同一验证码常被负载均衡到另一个实例。结果缓存按内容寻址:
+键由操作名、图片摘要、影响结果的参数以及模型指纹（模型文件摘要与字符集）计算，
+不同实例加载同一模型时键相同，换模型后自然失效。
+
+后端可组合为多级（依次查询，命中下级时回填上级）:
+- local: 主进程 fork 前创建的匿名共享内存哈希表，同一主机上的工作进程共享
+- redis://host:port/db（TLS 用 rediss://）: RESP 协议的网络键值存储（Redis、Valkey、KeyDB 等，测试中可用本地替身服务器）
+
+一次查询在所有后端上共用一个严格超时，超时或出错按未命中处理，缓存变慢不会增加请求延迟；写入不阻塞请求
+"""
+
+import os
+import json
+import mmap
+import time
+import ssl
+import struct
+import asyncio
+import hashlib
+import multiprocessing
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse, unquote
+
+from .logs import log
+
+_fingerprints: Dict[Tuple[str, int, int], str] = {}
+
+
+def file_digest(path: str) -> str:
+    """模型文件摘要（按路径、大小与修改时间缓存，只计算一次）"""
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    digest = _fingerprints.get(key)
+    if digest is None:
+        hasher = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                hasher.update(chunk)
+        digest = _fingerprints[key] = hasher.hexdigest()[:16]
+    return digest
+
+
+def model_fingerprint(instance) -> Optional[str]:
+    """ddddocr 实例的模型指纹：模型文件摘要，OCR模型另含字符集摘要"""
+    from .prefork import model_path_for
+
+    if instance is None:
+        return None
+    path = model_path_for(instance)
+    if not path or not os.path.exists(path):
+        return None
+    fingerprint = file_digest(path)
+    engine = getattr(instance, "ocr_engine", None)
+    manager = getattr(engine, "charset_manager", None)
+    if manager is not None:
+        charset = "\x00".join(manager.get_charset())
+        fingerprint += "-" + hashlib.sha256(charset.encode()).hexdigest()[:8]
+    return fingerprint
+
+
+class CacheBackend:
+    """缓存后端接口"""
+
+    name = "backend"
+
+    @property
+    def label(self) -> str:
+        """指标中区分同类后端的名称"""
+        return self.name
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        raise NotImplementedError
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {}
+
+
+class SharedMemoryBackend(CacheBackend):
+    """
+    跨工作进程的共享内存缓存（直接映射哈希表，冲突时覆盖旧条目）
+
+    Args:
+        slots: 槽位数
+        slot_size: 单个槽位字节数，超出的结果不缓存
+    """
+
+    name = "local"
+    _HEADER = struct.Struct("32sdI")
+
+    def __init__(self, slots: int = 4096, slot_size: int = 4096):
+        self.slots = slots
+        self.slot_size = slot_size
+        self._memory = mmap.mmap(-1, slots * slot_size)
+        self._lock = multiprocessing.Lock()
+        self.oversized = 0
+        self.contended = 0
+
+    def _slot(self, digest: bytes) -> int:
+        return int.from_bytes(digest[:8], "little") % self.slots * self.slot_size
+
+    def _acquire(self) -> bool:
+        # 锁只在拷贝时持有；拿不到锁时按未命中处理，不等待
+        if self._lock.acquire(block=False):
+            return True
+        self.contended += 1
+        return False
+
+    async def get(self, key: str) -> Optional[bytes]:
+        digest = bytes.fromhex(key)
+        offset = self._slot(digest)
+        if not self._acquire():
+            return None
+        try:
+            stored, expires, length = self._HEADER.unpack_from(self._memory, offset)
+            if stored != digest or expires < time.time():
+                return None
+            start = offset + self._HEADER.size
+            return bytes(self._memory[start:start + length])
+        finally:
+            self._lock.release()
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        if self._HEADER.size + len(value) > self.slot_size:
+            self.oversized += 1
+            return
+        digest = bytes.fromhex(key)
+        offset = self._slot(digest)
+        if not self._acquire():
+            return
+        try:
+            self._HEADER.pack_into(self._memory, offset, digest, time.time() + ttl, len(value))
+            start = offset + self._HEADER.size
+            self._memory[start:start + len(value)] = value
+        finally:
+            self._lock.release()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "slots": self.slots,
+            "slot_size": self.slot_size,
+            "oversized": self.oversized,
+            "contended": self.contended,
+        }
+
+
+class RedisError(Exception):
+    """RESP 错误回复"""
+
+
+class RedisBackend(CacheBackend):
+    """
+    RESP 协议的网络键值存储（只用到 GET/SET PX，兼容 Redis 及其替代实现）
+
+    连接按进程惰性建立并复用；请求被超时取消时连接可能残留未读回复，直接关闭而不放回连接池
+
+    Args:
+        url: redis://[:password@]host:port[/db]，rediss:// 使用 TLS（按系统信任的证书校验服务器）
+        pool_size: 每个进程保留的空闲连接数上限
+        prefix: 键前缀
+    """
+
+    name = "redis"
+
+    @property
+    def label(self) -> str:
+        return self.url
+
+    def __init__(self, url: str, pool_size: int = 8, prefix: str = "ddddocr:"):
+        parsed = urlparse(url)
+        self.url = f"{parsed.scheme}://{parsed.hostname}:{parsed.port or 6379}{parsed.path}"
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.strip("/") or 0)
+        self.ssl = ssl.create_default_context() if parsed.scheme == "rediss" else None
+        self.pool_size = pool_size
+        self.prefix = prefix.encode()
+        self._idle: deque = deque()
+        self._pid: Optional[int] = None
+        self.connects = 0
+        self.dropped = 0
+
+    async def _connect(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+        self.connects += 1
+        connection = (reader, writer)
+        try:
+            if self.password:
+                await self._execute(connection, b"AUTH", self.password.encode())
+            if self.db:
+                await self._execute(connection, b"SELECT", str(self.db).encode())
+        except BaseException:
+            # 握手中途出错或被超时取消时连接尚未交给调用方，在此关闭
+            self.dropped += 1
+            writer.close()
+            raise
+        return connection
+
+    async def _acquire(self):
+        if self._pid != os.getpid():
+            # fork 后不复用父进程的连接
+            self._idle.clear()
+            self._pid = os.getpid()
+        while self._idle:
+            connection = self._idle.pop()
+            if not connection[1].is_closing():
+                return connection
+        return await self._connect()
+
+    @staticmethod
+    async def _read_reply(reader: asyncio.StreamReader):
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("缓存服务器关闭了连接")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload
+        if kind == b"-":
+            raise RedisError(payload.decode(errors="replace"))
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            return (await reader.readexactly(length + 2))[:-2]
+        if kind == b"*":
+            count = int(payload)
+            return None if count < 0 else [await RedisBackend._read_reply(reader) for _ in range(count)]
+        raise RedisError(f"无法解析的回复: {line!r}")
+
+    @staticmethod
+    async def _execute(connection, *parts: bytes):
+        reader, writer = connection
+        writer.write(b"*%d\r\n" % len(parts) + b"".join(b"$%d\r\n%s\r\n" % (len(part), part) for part in parts))
+        await writer.drain()
+        return await RedisBackend._read_reply(reader)
+
+    async def _command(self, *parts: bytes):
+        connection = await self._acquire()
+        healthy = False
+        try:
+            reply = await self._execute(connection, *parts)
+            healthy = True
+            return reply
+        except RedisError:
+            healthy = True
+            raise
+        finally:
+            if healthy and len(self._idle) < self.pool_size:
+                self._idle.append(connection)
+            else:
+                self.dropped += not healthy
+                connection[1].close()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._command(b"GET", self.prefix + key.encode())
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self._command(b"SET", self.prefix + key.encode(), value, b"PX", str(int(ttl * 1000)).encode())
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {"url": self.url, "idle_connections": len(self._idle), "connects": self.connects,
+                "dropped_connections": self.dropped}
+
+
+class ResultCache:
+    """
+    多级结果缓存
+
+    Args:
+        backends: 按查询顺序排列的后端
+        timeout: 一次查询（所有后端合计）的超时（秒），写入各自放宽为其10倍
+        ttl: 结果有效期（秒）
+    """
+
+    def __init__(self, backends: List[CacheBackend], timeout: float = 0.005, ttl: float = 300.0):
+        self.backends = backends
+        self.timeout = timeout
+        self.ttl = ttl
+        self._pending: set = set()
+        # 指标按后端实例区分（同类后端如两个 redis 以 URL 区分，仍重名时加序号）
+        self.labels: Dict[int, str] = {}
+        self.stats: Dict[str, Dict[str, int]] = {}
+        for position, backend in enumerate(backends):
+            label = backend.label if backend.label not in self.stats else f"{backend.label}#{position}"
+            self.labels[id(backend)] = label
+            self.stats[label] = {"hits": 0, "misses": 0, "timeouts": 0, "errors": 0, "writes": 0}
+        self.lookups = 0
+        self.hits = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["ResultCache"]:
+        """DDDDOCR_CACHE: 逗号分隔的后端列表（local、redis://...），为空表示关闭"""
+        spec = os.getenv("DDDDOCR_CACHE", "").strip()
+        if not spec:
+            return None
+        backends: List[CacheBackend] = []
+        for item in (part.strip() for part in spec.split(",")):
+            if item == "local":
+                backends.append(SharedMemoryBackend(
+                    slots=int(os.getenv("DDDDOCR_CACHE_SLOTS", 4096)),
+                    slot_size=int(os.getenv("DDDDOCR_CACHE_SLOT_SIZE", 4096)),
+                ))
+            elif item.startswith(("redis://", "rediss://")):
+                backends.append(RedisBackend(item, prefix=os.getenv("DDDDOCR_CACHE_PREFIX", "ddddocr:")))
+            elif item:
+                log.warning("Cache", f"Unknown cache backend ignored: {item}")
+        if not backends:
+            return None
+        return cls(backends, timeout=float(os.getenv("DDDDOCR_CACHE_TIMEOUT_MS", 5)) / 1000,
+                   ttl=float(os.getenv("DDDDOCR_CACHE_TTL", 300)))
+
+    async def get(self, key: str) -> Tuple[bool, Any]:
+        """
+        依次查询各级后端，所有后端共用 timeout 的截止时间，前一级变慢时后面的级别不再查询
+
+        Returns:
+            (是否命中, 结果)
+        """
+        self.lookups += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        for index, backend in enumerate(self.backends):
+            stats = self.stats[self.labels[id(backend)]]
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                stats["timeouts"] += 1
+                continue
+            try:
+                data = await asyncio.wait_for(backend.get(key), remaining)
+            except asyncio.TimeoutError:
+                stats["timeouts"] += 1
+                continue
+            except Exception as e:
+                stats["errors"] += 1
+                log.debug("Cache", f"{self.labels[id(backend)]} lookup failed: {e}")
+                continue
+            if data is None:
+                stats["misses"] += 1
+                continue
+            stats["hits"] += 1
+            self.hits += 1
+            for upper in self.backends[:index]:
+                self._spawn(self._write(upper, key, data))
+            return True, json.loads(data)
+        return False, None
+
+    def put(self, key: str, result: Any):
+        """写入各级后端（后台执行，不阻塞请求）"""
+        try:
+            data = json.dumps(result, ensure_ascii=False, separators=(",", ":")).encode()
+        except (TypeError, ValueError) as e:
+            log.debug("Cache", f"Result not cacheable: {e}")
+            return
+        for backend in self.backends:
+            self._spawn(self._write(backend, key, data))
+
+    def _spawn(self, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _write(self, backend: CacheBackend, key: str, data: bytes):
+        stats = self.stats[self.labels[id(backend)]]
+        try:
+            # 写入的超时放宽，只为避免任务堆积
+            await asyncio.wait_for(backend.set(key, data, self.ttl), max(self.timeout * 10, 0.05))
+            stats["writes"] += 1
+        except asyncio.TimeoutError:
+            stats["timeouts"] += 1
+        except Exception as e:
+            stats["errors"] += 1
+            log.debug("Cache", f"{self.labels[id(backend)]} write failed: {e}")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "timeout_ms": self.timeout * 1000,
+            "ttl_s": self.ttl,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.lookups if self.lookups else None,
+            "pending_writes": len(self._pending),
+            "backends": {label: dict(self.stats[label], **backend.get_metrics())
+                         for backend in self.backends for label in (self.labels[id(backend)],)},
+        }
@@ -0,0 +1,62 @@
+# coding=utf-8
+"""
+置信度级联
+先用快速模型识别，仅在置信度不足或长度不符时升级到较重的模型
+"""
+
+import threading
+from typing import Any, Dict, List, Optional, Union
+
+
+def should_escalate(text: str, confidence: float, threshold: float,
+                    expected_length: Optional[Union[int, List[int]]] = None) -> bool:
+    """判断快速模型的结果是否需要交给重模型复核"""
+    if confidence < threshold:
+        return True
+    if expected_length is not None:
+        lengths = [expected_length] if isinstance(expected_length, int) else expected_length
+        if lengths and len(text) not in lengths:
+            return True
+    return False
+
+
+class CascadeStats:
+    """级联统计：升级率与节省的计算时间（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.escalations = 0
+        self.fast_seconds = 0.0
+        self.heavy_seconds = 0.0
+
+    def record(self, fast_seconds: float, heavy_seconds: Optional[float]):
+        with self._lock:
+            self.requests += 1
+            self.fast_seconds += fast_seconds
+            if heavy_seconds is not None:
+                self.escalations += 1
+                self.heavy_seconds += heavy_seconds
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            requests, escalations = self.requests, self.escalations
+            fast_seconds, heavy_seconds = self.fast_seconds, self.heavy_seconds
+
+        avg_heavy = heavy_seconds / escalations if escalations else None
+        metrics = {
+            "requests": requests,
+            "escalations": escalations,
+            "escalation_rate": escalations / requests if requests else 0.0,
+            "avg_fast_ms": fast_seconds / requests * 1000 if requests else None,
+            "avg_heavy_ms": avg_heavy * 1000 if avg_heavy is not None else None,
+            "saved_ms": None,
+            "saved_ratio": None,
+        }
+        # 节省量 = 全部走重模型的估算耗时 - 实际耗时（快速模型 + 升级部分）
+        if avg_heavy is not None and requests:
+            baseline = avg_heavy * requests
+            actual = fast_seconds + heavy_seconds
+            metrics["saved_ms"] = (baseline - actual) * 1000
+            metrics["saved_ratio"] = (baseline - actual) / baseline if baseline else None
+        return metrics
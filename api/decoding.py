@@ -0,0 +1,148 @@
+# coding=utf-8
+"""
+向量化CTC贪心解码
+基于NumPy一次性完成argmax、去重、去blank与字符集范围过滤，
+并按需输出每个字符的top-k候选、序列置信度或完整概率分布
+"""
+
+import base64
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+def squeeze_logits(output: np.ndarray) -> np.ndarray:
+    """将模型输出整理为 (时间步, 类别数)，兼容 (T, 1, C) 与 (1, T, C)"""
+    if output.ndim == 3:
+        if output.shape[1] == 1:
+            return output[:, 0, :]
+        return output[0]
+    if output.ndim == 1:
+        return output[None, :]
+    return output
+
+
+def softmax(x: np.ndarray, axis: int = -1) -> np.ndarray:
+    """数值稳定的softmax"""
+    exp_x = np.exp(x - np.max(x, axis=axis, keepdims=True))
+    return exp_x / np.sum(exp_x, axis=axis, keepdims=True)
+
+
+class CTCDecoding:
+    """一次贪心CTC解码的结果"""
+
+    __slots__ = ("logits", "indices", "positions", "text")
+
+    def __init__(self, logits: np.ndarray, indices: np.ndarray, positions: np.ndarray, text: str):
+        self.logits = logits
+        self.indices = indices
+        self.positions = positions
+        self.text = text
+
+    def char_confidences(self) -> np.ndarray:
+        """每个输出字符在其发射时间步上的概率"""
+        if len(self.positions) == 0:
+            return np.zeros(0, dtype=np.float32)
+        probs = softmax(self.logits[self.positions].astype(np.float32))
+        return probs[np.arange(len(self.indices)), self.indices]
+
+    def sequence_confidence(self) -> float:
+        """序列置信度：各字符置信度之积，空结果为0"""
+        confidences = self.char_confidences()
+        if len(confidences) == 0:
+            return 0.0
+        return float(np.prod(confidences))
+
+
+def ctc_greedy_decode(output: np.ndarray, charset: List[str],
+                      valid_mask: Optional[np.ndarray] = None) -> CTCDecoding:
+    """
+    贪心CTC解码（与 ddddocr OCREngine 的逐元素实现结果一致）
+
+    Args:
+        output: 模型原始输出
+        charset: 字符集，索引0为blank
+        valid_mask: 字符集范围掩码，去重后再过滤（与 ddddocr 语义一致）
+    """
+    logits = squeeze_logits(output)
+    argmax = logits.argmax(axis=1)
+
+    keep = np.ones(len(argmax), dtype=bool)
+    keep[1:] = argmax[1:] != argmax[:-1]
+    keep &= argmax != 0
+    keep &= argmax < len(charset)
+    if valid_mask is not None:
+        keep &= valid_mask[np.minimum(argmax, len(valid_mask) - 1)]
+
+    positions = np.flatnonzero(keep)
+    indices = argmax[positions]
+    text = "".join(charset[i] for i in indices.tolist())
+    return CTCDecoding(logits, indices, positions, text)
+
+
+def topk_probability(decoding: CTCDecoding, charset: List[str], top_k: int = 3,
+                     valid_mask: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """
+    紧凑概率输出：每个输出字符的 top-k 候选及其置信度，以及整体序列置信度
+    """
+    characters = []
+    if len(decoding.positions):
+        probs = softmax(decoding.logits[decoding.positions].astype(np.float32))
+        ranked = probs.copy()
+        ranked[:, 0] = -1.0  # blank 不作为候选
+        if valid_mask is not None:
+            ranked[:, ~valid_mask] = -1.0
+        k = max(1, min(top_k, ranked.shape[1] - 1))
+        top = np.argpartition(-ranked, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(ranked, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        confidences = probs[np.arange(len(decoding.indices)), decoding.indices]
+
+        for row, (index, position) in enumerate(zip(decoding.indices.tolist(), decoding.positions.tolist())):
+            characters.append({
+                "char": charset[index],
+                "confidence": round(float(confidences[row]), 6),
+                "position": position,
+                "alternatives": [
+                    [charset[alt], round(float(score), 6)]
+                    for alt, score in zip(top[row].tolist(), top_scores[row].tolist())
+                    if score >= 0
+                ],
+            })
+
+    confidence = 0.0
+    if characters:
+        confidence = float(np.prod([c["confidence"] for c in characters]))
+    return {
+        "format": "topk",
+        "text": decoding.text,
+        "confidence": round(confidence, 6),
+        "characters": characters,
+    }
+
+
+def full_probability(output: np.ndarray, decoding: CTCDecoding, charset: List[str]) -> Dict[str, Any]:
+    """完整概率分布（与 ddddocr classification(probability=True) 的输出结构一致）"""
+    probabilities = softmax(output, axis=-1)
+    return {
+        "text": decoding.text,
+        "probabilities": probabilities.tolist(),
+        "charset": charset,
+        "confidence": float(np.mean(np.max(probabilities, axis=-1))),
+        "sequence_confidence": round(decoding.sequence_confidence(), 6),
+    }
+
+
+def packed_probability(decoding: CTCDecoding, charset: List[str]) -> Dict[str, Any]:
+    """完整概率分布的紧凑二进制形式：float16 小端序，按 (时间步, 类别数) 行优先排列后base64编码"""
+    probabilities = softmax(decoding.logits.astype(np.float32), axis=-1).astype("<f2")
+    return {
+        "format": "float16",
+        "text": decoding.text,
+        "confidence": round(decoding.sequence_confidence(), 6),
+        "shape": list(probabilities.shape),
+        "data": base64.b64encode(probabilities.tobytes()).decode("ascii"),
+        "charset": charset,
+    }
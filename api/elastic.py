@@ -0,0 +1,184 @@
+# coding=utf-8
+"""
+弹性推理并发
+按排队深度与实测的单次推理耗时，在 [min, max] 之间调整调度器的并发推理数:
+- 扩容: 有任务排队且排队时延超过单次推理耗时的一定比例时，并发数翻倍（至多增加排队数）
+- 回退: 扩容后吞吐量没有提升而单次耗时明显变长（CPU争用），撤回扩容并暂停扩容一段时间
+- 缩容: 队列为空且线程池忙碌比例持续偏低时逐步减少
+并发数变化时按 线程预算 // 并发数 重新设置ONNX算子内线程数，使总线程数不超过核数
+"""
+
+import os
+import time
+import asyncio
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+from .logs import log
+
+
+class ElasticController:
+    """
+    弹性并发控制器（在事件循环线程中运行）
+
+    Args:
+        scheduler: InferenceScheduler
+        min_concurrency: 最小并发推理数
+        max_concurrency: 最大并发推理数（即推理线程池大小）
+        thread_budget: 并发数 × 算子内线程数 的上限，默认为核数
+        interval: 决策周期（秒）
+        wait_ratio: 排队时延超过单次推理耗时的该比例时扩容
+        idle_ticks: 连续多少个周期空闲后缩容
+        on_resize: 算子内线程数需要调整时的回调 on_resize(threads)，为空表示不调整
+    """
+
+    def __init__(self, scheduler, min_concurrency: int, max_concurrency: int, thread_budget: Optional[int] = None,
+                 interval: float = 1.0, wait_ratio: float = 0.5, idle_ticks: int = 5,
+                 on_resize: Optional[Callable[[int], None]] = None):
+        self.scheduler = scheduler
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.thread_budget = thread_budget or os.cpu_count() or 1
+        self.interval = interval
+        self.wait_ratio = wait_ratio
+        self.idle_ticks = idle_ticks
+        self.on_resize = on_resize
+        self.intra_op_threads: Optional[int] = None
+
+        self._wait_ewma = 0.0
+        self._service_ewma = 0.0
+        self._busy_seconds = 0.0
+        self._last_busy = 0.0
+        self._last_completed = 0
+        self._last_tick = 0.0
+        self._idle = 0
+        self._hold_until = 0.0
+        # 最近一次扩容前的 (吞吐量, 单次耗时)，用于判断扩容是否有效
+        self._before_scale_up: Optional[tuple] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.throughput = 0.0
+        self.scale_ups = 0
+        self.scale_downs = 0
+        self.decisions: deque = deque(maxlen=20)
+
+    @classmethod
+    def from_env(cls, scheduler) -> Optional["ElasticController"]:
+        """DDDDOCR_MIN_CONCURRENCY 小于最大并发数时启用（无法解析时记录警告并不启用）"""
+        from .scheduler import _env_float, _env_int
+
+        ceiling = scheduler.concurrency_ceiling
+        min_concurrency = _env_int("DDDDOCR_MIN_CONCURRENCY", ceiling)
+        if min_concurrency >= ceiling:
+            return None
+        return cls(
+            scheduler,
+            min_concurrency=min_concurrency,
+            max_concurrency=ceiling,
+            thread_budget=_env_int("DDDDOCR_THREAD_BUDGET", 0) or None,
+            interval=_env_float("DDDDOCR_ELASTIC_INTERVAL", 1.0),
+        )
+
+    def observe(self, wait_seconds: float, service_seconds: float):
+        """记录一次完成的推理（排队时延与执行耗时）"""
+        self._wait_ewma = wait_seconds if not self._wait_ewma else 0.8 * self._wait_ewma + 0.2 * wait_seconds
+        self._service_ewma = (service_seconds if not self._service_ewma
+                              else 0.8 * self._service_ewma + 0.2 * service_seconds)
+        self._busy_seconds += service_seconds
+        if self._timer is None:
+            self._start()
+
+    def _start(self):
+        self._last_tick = time.monotonic()
+        self._last_completed = self.scheduler.completed
+        self._last_busy = self._busy_seconds
+        self._resize_threads()
+        self._timer = asyncio.get_running_loop().call_later(self.interval, self._tick)
+
+    def _tick(self):
+        now = time.monotonic()
+        elapsed = max(now - self._last_tick, 1e-6)
+        current = self.scheduler.max_concurrency
+        completed = self.scheduler.completed - self._last_completed
+        busy_seconds = self._busy_seconds - self._last_busy
+        self.throughput = completed / elapsed
+        busy = busy_seconds / (elapsed * current)
+        # 本周期的平均单次耗时（EWMA 跟不上逐级扩容，争用判断用周期均值）
+        service = busy_seconds / completed if completed else self._service_ewma
+        self._last_tick, self._last_completed, self._last_busy = now, self.scheduler.completed, self._busy_seconds
+        queued = self.scheduler.queued
+
+        if self._before_scale_up is not None:
+            throughput_before, service_before = self._before_scale_up
+            self._before_scale_up = None
+            if (queued and self.throughput < throughput_before * 1.05
+                    and service > service_before * 1.2 and current > self.min_concurrency):
+                # 扩容没有带来吞吐量提升，单次推理反而变慢：CPU已饱和
+                self._hold_until = now + 10 * self.interval
+                self._scale(max(self.min_concurrency, current // 2 or 1), "contention", queued)
+                return self._schedule()
+
+        if (queued and current < self.max_concurrency and now >= self._hold_until
+                and self._wait_ewma > self._service_ewma * self.wait_ratio):
+            self._idle = 0
+            self._before_scale_up = (self.throughput, service)
+            target = min(self.max_concurrency, current * 2, current + queued)
+            self._scale(max(target, current + 1), "queue", queued)
+        elif not queued and busy < 0.5 and current > self.min_concurrency:
+            self._idle += 1
+            if self._idle >= self.idle_ticks:
+                self._idle = 0
+                self._scale(current - 1, "idle", queued)
+        else:
+            self._idle = 0
+        self._schedule()
+
+    def _schedule(self):
+        self._timer = asyncio.get_running_loop().call_later(self.interval, self._tick)
+
+    def _scale(self, target: int, reason: str, queued: int):
+        current = self.scheduler.max_concurrency
+        if target == current:
+            return
+        if target > current:
+            self.scale_ups += 1
+        else:
+            self.scale_downs += 1
+        self.scheduler.max_concurrency = target
+        self.decisions.append({
+            "time": time.time(),
+            "from": current,
+            "to": target,
+            "reason": reason,
+            "queued": queued,
+            "wait_ms": round(self._wait_ewma * 1000, 3),
+            "service_ms": round(self._service_ewma * 1000, 3),
+            "throughput": round(self.throughput, 2),
+        })
+        log.info("Elastic", f"Inference concurrency {current} -> {target} ({reason})", queued=queued,
+                 wait_ms=self.decisions[-1]["wait_ms"], service_ms=self.decisions[-1]["service_ms"])
+        self._resize_threads()
+        self.scheduler._pump()
+
+    def _resize_threads(self):
+        """按当前并发数调整算子内线程数：并发数 × 线程数 ≤ 线程预算"""
+        if self.on_resize is None:
+            return
+        threads = max(1, self.thread_budget // self.scheduler.max_concurrency)
+        if threads != self.intra_op_threads:
+            self.intra_op_threads = threads
+            self.on_resize(threads)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "min_concurrency": self.min_concurrency,
+            "max_concurrency": self.max_concurrency,
+            "concurrency": self.scheduler.max_concurrency,
+            "intra_op_threads": self.intra_op_threads,
+            "thread_budget": self.thread_budget,
+            "wait_ms": round(self._wait_ewma * 1000, 3),
+            "service_ms": round(self._service_ewma * 1000, 3),
+            "throughput": round(self.throughput, 2),
+            "scale_ups": self.scale_ups,
+            "scale_downs": self.scale_downs,
+            "decisions": list(self.decisions),
+        }
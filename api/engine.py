@@ -0,0 +1,144 @@
+# coding=utf-8
+"""
+OCR推理执行器
+直接调用 ddddocr OCR引擎的预处理与ONNX会话，获取原始模型输出，
+由服务自行完成CTC解码（见 decoding.py）
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
+
+from .buffers import BoundSession, BufferPool, normalize_into, resize_for_model
+from .logs import log
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+class OCRRunner:
+    """
+    包装 ddddocr.DdddOcr 的OCR实例
+
+    ddddocr 1.6 的 DdddOcr 内部持有 OCREngine（ONNX会话、预处理与字符集），
+    这里复用其预处理并直接运行会话。字符集范围按请求计算，不修改实例的共享状态。
+    若实例结构不符合预期（native 为 False），调用方应回退到 classification()。
+    """
+
+    def __init__(self, instance):
+        self.instance = instance
+        self.engine = getattr(instance, "ocr_engine", None)
+        self.native = (
+            self.engine is not None
+            and getattr(self.engine, "session", None) is not None
+            and hasattr(self.engine, "_preprocess_image")
+            and hasattr(self.engine, "charset_manager")
+        )
+        self.charset: List[str] = self.engine.charset_manager.get_charset() if self.native else []
+        self.input_name = self.engine.session.get_inputs()[0].name if self.native else None
+        self._range_cache: Dict[str, Optional[np.ndarray]] = {}
+        self._range_lock = threading.Lock()
+        # 低拷贝路径：按线程复用输入/输出缓冲区并通过 I/O 绑定运行会话（见 buffers.py）
+        self.zero_copy = self.native and os.getenv("DDDDOCR_ZERO_COPY", "true").lower() == "true"
+        self.buffers = BufferPool()
+        self._bound = BoundSession(self.buffers)
+
+    def load_image(self, image_data: bytes, color_filter_colors: Optional[List[str]] = None,
+                   color_filter_custom_ranges: Optional[List] = None):
+        """解码图片并按需应用颜色过滤（与 OCREngine.predict 一致）"""
+        from ddddocr.utils.image_io import load_image_from_input
+        from ddddocr.preprocessing.color_filter import ColorFilter
+
+        image = load_image_from_input(image_data)
+        if color_filter_colors or color_filter_custom_ranges:
+            try:
+                color_filter = ColorFilter(colors=color_filter_colors,
+                                           custom_ranges=color_filter_custom_ranges)
+                image = color_filter.filter_image(image)
+            except Exception as e:
+                log.warning("Engine", f"Color filter failed, skipped: {e}", colors=color_filter_colors)
+        return image
+
+    def preprocess(self, image, png_fix: bool = False, pooled: bool = False) -> np.ndarray:
+        """
+        图片预处理为模型输入张量 (1, C, H, W)
+
+        Args:
+            pooled: 允许写入当前线程复用的缓冲区（结果在同一线程下次预处理前有效）
+        """
+        if not (pooled and self.zero_copy):
+            return self.engine._preprocess_image(image, png_fix)
+        import numpy as np
+
+        pixels = np.asarray(resize_for_model(self.engine, image, png_fix))
+        if pixels.dtype != np.uint8:
+            return self.engine._preprocess_image(image, png_fix)
+        return normalize_into(pixels, self.buffers)
+
+    def infer(self, tensor: np.ndarray, pooled: bool = False) -> np.ndarray:
+        """
+        运行ONNX会话，返回原始输出（logits）
+
+        Args:
+            pooled: 允许通过 I/O 绑定输出到当前线程复用的缓冲区（结果在同一线程下次推理前有效）
+        """
+        if pooled and self.zero_copy and tensor.flags.c_contiguous:
+            return self._bound.run(self.engine.session, self.input_name, tensor)
+        return self.engine.session.run(None, {self.input_name: tensor})[0]
+
+    @property
+    def dynamic_batch(self) -> bool:
+        """模型输入的批次维度是否可变（ddddocr 自带模型固定为1）"""
+        if not self.native:
+            return False
+        batch = self.engine.session.get_inputs()[0].shape[0]
+        return not isinstance(batch, int) or batch <= 0
+
+    def infer_batch(self, tensors: List[np.ndarray]) -> List[np.ndarray]:
+        """
+        推理多个同尺寸的输入，按输入顺序返回各自的原始输出（批次维度保留为1）
+
+        批次维度可变时拼接为一个批次运行一次会话，否则逐个运行
+        """
+        import numpy as np
+
+        if len(tensors) < 2 or not self.dynamic_batch or len({t.shape for t in tensors}) != 1:
+            return [self.infer(tensor) for tensor in tensors]
+        output = self.infer(np.concatenate(tensors))
+        # ddddocr 模型输出为 (T, N, C)，其他布局按批次在首维处理
+        axis = 1 if output.ndim == 3 and output.shape[1] == len(tensors) else 0
+        return [np.take(output, [index], axis=axis) for index in range(len(tensors))]
+
+    def run(self, image_data: bytes, png_fix: bool = False,
+            color_filter_colors: Optional[List[str]] = None,
+            color_filter_custom_ranges: Optional[List] = None) -> np.ndarray:
+        """解码、预处理并推理，返回原始模型输出"""
+        image = self.load_image(image_data, color_filter_colors, color_filter_custom_ranges)
+        return self.infer(self.preprocess(image, png_fix))
+
+    def valid_mask(self, charset_range: Optional[Union[int, str, List[str]]]) -> Optional[np.ndarray]:
+        """
+        计算字符集范围对应的有效字符掩码（语义与 CharsetManager.set_ranges 一致），
+        None 表示不限制
+        """
+        if charset_range is None:
+            return None
+        key = repr(charset_range)
+        mask = self._range_cache.get(key)
+        if mask is not None or key in self._range_cache:
+            return mask
+
+        import numpy as np
+        from ddddocr.models.charset_manager import CharsetManager
+
+        manager = CharsetManager(self.charset)
+        manager.set_ranges(charset_range)
+        mask = np.zeros(len(self.charset), dtype=bool)
+        mask[manager.get_valid_indices()] = True
+        with self._range_lock:
+            if len(self._range_cache) >= 256:
+                self._range_cache.clear()
+            self._range_cache[key] = mask
+        return mask
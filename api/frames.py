@@ -0,0 +1,111 @@
+# coding=utf-8
+"""
+多帧（GIF/APNG）验证码
+部分动态验证码的字符分散在不同帧中，需合并多帧才能完整识别。
+帧按需逐帧解码（只解码前 max_frames 帧，且所有帧的像素总数不超过 DDDDOCR_MAX_IMAGE_PIXELS），
+再按以下方式之一合并:
+- 投影: 逐像素取各帧的最大值 (max)、最小值 (min) 或中位数 (median)，合成一张图识别
+- 投票 (vote): 每帧分别识别，按识别文本投票（票数按帧的显示时长加权，编码器合并的重复帧不会少计），
+  平票时取置信度之和较高者
+"""
+
+from __future__ import annotations
+
+import io
+import os
+from collections import defaultdict
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+PROJECTIONS = ("max", "min", "median")
+
+
+def load_frames(image_data: bytes, max_frames: int = 16, max_pixels: Optional[int] = None) -> List["Image.Image"]:
+    """
+    解码图片帧；静态图片直接返回原图（仍为惰性解码），动态图片逐帧解码至多 max_frames 帧
+
+    各帧统一转换为第一帧的颜色模式（含透明通道时为RGBA），保证可以逐像素合并。
+    单帧尺寸已由请求体预检限制，但帧数与尺寸相乘仍可能很大（小文件的大尺寸多帧GIF），
+    因此已解码帧的像素总数达到 max_pixels 后不再解码后续帧（至少保留第一帧）
+
+    Args:
+        max_pixels: 所有帧的像素总数上限，None 时读取 DDDDOCR_MAX_IMAGE_PIXELS，0 表示不限
+    """
+    from PIL import Image, ImageSequence
+
+    image = Image.open(io.BytesIO(image_data))
+    if not getattr(image, "is_animated", False):
+        return [image]
+    if max_pixels is None:
+        max_pixels = int(os.getenv("DDDDOCR_MAX_IMAGE_PIXELS", 4096 * 4096))
+    if max_pixels > 0:
+        max_frames = max(1, min(max_frames, max_pixels // max(1, image.width * image.height)))
+    mode = "RGBA" if image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info else "RGB"
+    decoded = []
+    for frame in ImageSequence.Iterator(image):
+        if len(decoded) >= max_frames:
+            break
+        decoded.append(frame.convert(mode))
+    return decoded
+
+
+def project(frames: Sequence["Image.Image"], mode: str) -> "Image.Image":
+    """
+    逐像素合并多帧：max 适合深色背景上的浅色字符，min 适合浅色背景上的深色字符，median 去除闪烁噪点
+
+    中位数在 uint8 上原地排序后取中间帧，不产生 np.median 的 float64 副本；
+    偶数帧时两个中间值的均值按四舍六入五成双取整，与 np.median(...).round() 一致
+    """
+    import numpy as np
+    from PIL import Image
+
+    if len(frames) == 1:
+        return frames[0]
+    stack = np.stack([np.asarray(frame) for frame in frames])
+    if mode == "max":
+        merged = stack.max(axis=0)
+    elif mode == "min":
+        merged = stack.min(axis=0)
+    elif mode == "median":
+        stack.sort(axis=0)
+        middle = len(frames) // 2
+        if len(frames) % 2:
+            merged = stack[middle]
+        else:
+            total = stack[middle - 1].astype(np.uint16) + stack[middle]
+            half = total >> 1
+            merged = (half + (total & half & 1)).astype(np.uint8)
+    else:
+        raise ValueError(f"不支持的帧合并方式: {mode}")
+    return Image.fromarray(merged, frames[0].mode)
+
+
+def frame_weights(frames: Sequence["Image.Image"]) -> List[float]:
+    """各帧的投票权重：显示时长（毫秒），缺失时按1计"""
+    return [float(frame.info.get("duration") or 1) for frame in frames]
+
+
+def vote(candidates: Sequence[Tuple[str, float]], weights: Optional[Sequence[float]] = None) -> Tuple[int, dict]:
+    """
+    按识别文本投票（空文本不参与，全部为空时取第一帧）
+
+    Args:
+        candidates: 每帧的 (识别文本, 序列置信度)
+        weights: 每帧的票数权重，默认每帧一票
+
+    Returns:
+        (胜出文本中置信度最高的帧序号, {文本: 票数})
+    """
+    votes = defaultdict(float)
+    confidence = defaultdict(float)
+    for (text, score), weight in zip(candidates, weights or [1.0] * len(candidates)):
+        if text:
+            votes[text] += weight
+            confidence[text] += score
+    if not votes:
+        return 0, {}
+    winner = max(votes, key=lambda text: (votes[text], confidence[text]))
+    index = max((i for i, (text, _) in enumerate(candidates) if text == winner), key=lambda i: candidates[i][1])
+    return index, dict(votes)
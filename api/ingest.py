@@ -0,0 +1,389 @@
+# coding=utf-8
+"""
+请求体流式校验
+在请求体到达时即检查大小、增量校验并解码base64图片、嗅探图片格式与像素尺寸，
+超限或非法的上传在进入 FastAPI/Pydantic 之前就被拒绝
+"""
+
+import os
+import re
+import json
+import struct
+import binascii
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+# 需要流式解码的图片字段
+IMAGE_FIELDS = {b"image", b"target_image", b"background_image"}
+
+# base64 文本中忽略的ASCII空白（换行折叠的base64等，与 base64.b64decode 的宽松解码一致）
+_WHITESPACE = re.compile(rb"[ \t\n\r\v\f]+")
+
+# 嗅探图片头最多保留的字节数（JPEG 的 SOF 段可能位于较多元数据之后）
+_SNIFF_LIMIT = 64 * 1024
+
+
+class BodyRejected(Exception):
+    """请求体校验失败"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def sniff_image_header(data: bytes) -> Optional[Tuple[str, int, int]]:
+    """
+    从图片头部解析格式与像素尺寸，无需完整解码。
+
+    Returns:
+        (格式, 宽, 高)；数据不足或格式未知时返回 None
+    """
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        if len(data) >= 24 and data[12:16] == b"IHDR":
+            width, height = struct.unpack(">II", data[16:24])
+            return "png", width, height
+        return None
+
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        if len(data) >= 10:
+            width, height = struct.unpack("<HH", data[6:10])
+            return "gif", width, height
+        return None
+
+    if data.startswith(b"BM"):
+        if len(data) >= 26:
+            width, height = struct.unpack("<ii", data[18:26])
+            return "bmp", abs(width), abs(height)
+        return None
+
+    if data.startswith(b"RIFF") and data[8:12] == b"WEBP":
+        chunk = data[12:16]
+        if chunk == b"VP8 " and len(data) >= 30:
+            width, height = struct.unpack("<HH", data[26:30])
+            return "webp", width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L" and len(data) >= 25:
+            bits = int.from_bytes(data[21:25], "little")
+            return "webp", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8X" and len(data) >= 30:
+            width = int.from_bytes(data[24:27], "little") + 1
+            height = int.from_bytes(data[27:30], "little") + 1
+            return "webp", width, height
+        return None
+
+    if data.startswith(b"\xff\xd8"):
+        # 逐段跳过，直到遇到 SOFn 段
+        offset = 2
+        while offset + 4 <= len(data):
+            if data[offset] != 0xFF:
+                offset += 1
+                continue
+            marker = data[offset + 1]
+            if marker == 0xFF:
+                offset += 1
+                continue
+            if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+                offset += 2
+                continue
+            length = struct.unpack(">H", data[offset + 2:offset + 4])[0]
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                if offset + 9 > len(data):
+                    return None
+                height, width = struct.unpack(">HH", data[offset + 5:offset + 9])
+                return "jpeg", width, height
+            offset += 2 + length
+        return None
+
+    return None
+
+
+class _Base64Sink:
+    """单个图片字段的增量base64解码器"""
+
+    def __init__(self, field: str, max_image_bytes: int, max_image_pixels: int):
+        self.field = field
+        self.max_image_bytes = max_image_bytes
+        self.max_image_pixels = max_image_pixels
+        self.carry = b""
+        self.parts: List[bytes] = []
+        self.size = 0
+        self.padded = False
+        self.head = bytearray()
+        self.sniffed = False
+        self.image_info: Optional[Tuple[str, int, int]] = None
+
+    def _invalid(self) -> BodyRejected:
+        return BodyRejected(400, f"图片base64解码失败: {self.field}")
+
+    def write(self, data: memoryview):
+        """
+        写入一段base64文本（调用方传入请求体的 memoryview 切片，不拷贝文本）
+
+        按4字节对齐直接解码；跨片段的不足4字节的尾部暂存到下一片段。
+        严格模式解码同时校验字符集与填充位置；ASCII空白先被去除（仅在片段含空白时拷贝）
+        """
+        if _WHITESPACE.search(data):
+            data = memoryview(_WHITESPACE.sub(b"", data))
+        if self.carry:
+            need = 4 - len(self.carry)
+            head = self.carry + bytes(data[:need])
+            data = data[need:]
+            if len(head) < 4:
+                self.carry = head
+                return
+            self.carry = b""
+            self._decode(head)
+        cut = len(data) - len(data) % 4
+        if cut:
+            self._decode(data[:cut])
+        self.carry = bytes(data[cut:])
+
+    def _decode(self, block):
+        if self.padded:
+            raise self._invalid()
+        try:
+            decoded = binascii.a2b_base64(block, strict_mode=True)
+        except binascii.Error:
+            raise self._invalid()
+        if block[-1] == 0x3D:  # =
+            self.padded = True
+
+        self.size += len(decoded)
+        if self.max_image_bytes > 0 and self.size > self.max_image_bytes:
+            raise BodyRejected(413, f"图片过大: {self.field} 超过 {self.max_image_bytes} 字节")
+        self.parts.append(decoded)
+
+        if not self.sniffed:
+            self.head.extend(decoded[:_SNIFF_LIMIT - len(self.head)])
+            self._sniff()
+
+    def _sniff(self):
+        info = sniff_image_header(bytes(self.head))
+        if info is None:
+            if len(self.head) >= _SNIFF_LIMIT:
+                self.sniffed = True
+            return
+        self.sniffed = True
+        self.image_info = info
+        _, width, height = info
+        if self.max_image_pixels > 0 and width * height > self.max_image_pixels:
+            raise BodyRejected(413, f"图片尺寸过大: {self.field} 为 {width}x{height} 像素")
+
+    def close(self) -> bytes:
+        if self.carry:
+            raise self._invalid()
+        # 单个片段时 join 直接返回该对象，不再拷贝
+        return b"".join(self.parts)
+
+
+class _JSONImageScanner:
+    """
+    增量JSON扫描器
+
+    只识别字符串、键与嵌套层级，不构建对象；图片字段的字符串内容
+    直接按片段送入 _Base64Sink，其余字符串以 bytes.find 快速跳过。
+    """
+
+    def __init__(self, max_image_bytes: int, max_image_pixels: int):
+        self.max_image_bytes = max_image_bytes
+        self.max_image_pixels = max_image_pixels
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.key_buffer: Optional[bytearray] = None
+        self.last_string: Optional[bytes] = None
+        self.pending_key: Optional[bytes] = None
+        self.sink: Optional[_Base64Sink] = None
+        self.sink_depth = 0
+        # 顶层字段解码结果，供路由复用
+        self.decoded: Dict[str, bytes] = {}
+
+    def feed(self, chunk: bytes):
+        view = memoryview(chunk)
+        i = 0
+        n = len(chunk)
+        while i < n:
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                    self._escaped(chunk[i:i + 1])
+                    i += 1
+                    continue
+                quote = chunk.find(b'"', i)
+                backslash = chunk.find(b"\\", i, quote if quote >= 0 else n)
+                end = backslash if backslash >= 0 else (quote if quote >= 0 else n)
+                if end > i:
+                    self._string_data(view[i:end])
+                if end == n:
+                    return
+                if chunk[end] == 0x5C:
+                    self.escape = True
+                else:
+                    self._string_end()
+                i = end + 1
+                continue
+
+            c = chunk[i]
+            if c == 0x22:  # "
+                self._string_start()
+            elif c == 0x3A:  # :
+                self.pending_key = self.last_string
+            elif c in (0x7B, 0x5B):  # { [
+                self.depth += 1
+                self.pending_key = None
+            elif c in (0x7D, 0x5D):  # } ]
+                self.depth -= 1
+            elif c == 0x2C:  # ,
+                self.pending_key = None
+                self.last_string = None
+            elif c not in (0x20, 0x09, 0x0A, 0x0D):
+                self.pending_key = None
+            i += 1
+
+    def _string_start(self):
+        self.in_string = True
+        if self.pending_key in IMAGE_FIELDS:
+            self.sink = _Base64Sink(self.pending_key.decode(), self.max_image_bytes, self.max_image_pixels)
+            self.sink_depth = self.depth
+            self.key_buffer = None
+        else:
+            self.key_buffer = bytearray()
+        self.pending_key = None
+
+    def _string_data(self, data: memoryview):
+        if self.sink is not None:
+            self.sink.write(data)
+        elif self.key_buffer is not None:
+            if len(self.key_buffer) + len(data) > 64:
+                self.key_buffer = None
+            else:
+                self.key_buffer.extend(data)
+
+    def _escaped(self, char: bytes):
+        if self.sink is not None:
+            if char == b"/":
+                self.sink.write(b"/")
+            elif char not in (b"n", b"r", b"t"):
+                # base64 中不应出现其他转义字符
+                raise BodyRejected(400, f"图片base64解码失败: {self.sink.field}")
+        elif self.key_buffer is not None:
+            self.key_buffer = None
+
+    def _string_end(self):
+        self.in_string = False
+        if self.sink is not None:
+            data = self.sink.close()
+            if self.sink_depth == 1:
+                self.decoded[self.sink.field] = data
+            self.sink = None
+            self.last_string = None
+        else:
+            self.last_string = bytes(self.key_buffer) if self.key_buffer is not None else None
+        self.key_buffer = None
+
+
+class BodyLimitMiddleware:
+    """
+    请求体大小限制与图片预检中间件（纯ASGI实现，流式读取）
+
+    - Content-Length 超过上限时不读取请求体直接返回 413
+    - 读取过程中累计字节数，超限立即返回 413
+    - JSON 请求体中的图片字段边读边校验/解码，并在完整解码前按图片头嗅探像素尺寸
+    """
+
+    def __init__(self, app: ASGIApp, max_body_bytes: Optional[int] = None,
+                 max_image_bytes: Optional[int] = None, max_image_pixels: Optional[int] = None):
+        self.app = app
+        self.max_body_bytes = max_body_bytes if max_body_bytes is not None else \
+            int(os.getenv("DDDDOCR_MAX_BODY_BYTES", 8 * 1024 * 1024))
+        self.max_image_bytes = max_image_bytes if max_image_bytes is not None else \
+            int(os.getenv("DDDDOCR_MAX_IMAGE_BYTES", 4 * 1024 * 1024))
+        self.max_image_pixels = max_image_pixels if max_image_pixels is not None else \
+            int(os.getenv("DDDDOCR_MAX_IMAGE_PIXELS", 4096 * 4096))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT", "PATCH"):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and self.max_body_bytes > 0:
+            try:
+                if int(content_length) > self.max_body_bytes:
+                    await self._reject(send, 413, f"请求体过大，上限为 {self.max_body_bytes} 字节")
+                    return
+            except ValueError:
+                await self._reject(send, 400, "无效的 Content-Length")
+                return
+
+        scanner = None
+        if b"json" in headers.get(b"content-type", b""):
+            scanner = _JSONImageScanner(self.max_image_bytes, self.max_image_pixels)
+
+        chunks: List[bytes] = []
+        received = 0
+        more_body = True
+        try:
+            while more_body:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                body = message.get("body", b"")
+                more_body = message.get("more_body", False)
+                received += len(body)
+                if self.max_body_bytes > 0 and received > self.max_body_bytes:
+                    raise BodyRejected(413, f"请求体过大，上限为 {self.max_body_bytes} 字节")
+                if scanner is not None and body:
+                    scanner.feed(body)
+                chunks.append(body)
+        except BodyRejected as e:
+            await self._reject(send, e.status_code, e.detail)
+            return
+
+        if scanner is not None and scanner.decoded:
+            scope.setdefault("state", {})["decoded_images"] = scanner.decoded
+
+        body = b"".join(chunks)
+        replayed = False
+
+        async def replay() -> Message:
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        await self.app(scope, replay, send)
+
+    @staticmethod
+    async def _reject(send: Send, status_code: int, detail: str):
+        payload = json.dumps({"detail": detail}, ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(payload)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": payload})
+
+
+def get_image_bytes(request: Optional[Request], field: str, value: str) -> bytes:
+    """
+    获取图片字段的二进制数据：优先复用中间件流式解码的结果，否则直接解码base64
+    （request 为 None 时不复用）
+    """
+    decoded = getattr(request.state, "decoded_images", None) if request is not None else None
+    if decoded and field in decoded:
+        return decoded[field]
+    try:
+        # a2b_base64 直接接受ASCII字符串，省去 b64decode 先编码为 bytes 的一次拷贝
+        return binascii.a2b_base64(value)
+    except Exception:
+        raise HTTPException(status_code=400, detail="图片base64解码失败")
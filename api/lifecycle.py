@@ -0,0 +1,172 @@
+# coding=utf-8
+"""
+工作进程生命周期
+- 回收: 处理请求数或常驻内存 (RSS) 超过阈值后，工作进程停止接收新连接、
+  处理完在途请求后退出，由预派生主进程重新派生，释放 ONNX 内存池与图片解码累积的内存
+- 事件: 回收、推理超时、工作进程重启等事件写入主进程 fork 前创建的共享内存环形缓冲区，
+  任一工作进程的 /status 都能看到全部工作进程的事件
+"""
+
+import os
+import json
+import mmap
+import time
+import random
+import struct
+import multiprocessing
+from typing import Any, Callable, Dict, List, Optional
+
+from .logs import log
+
+
+def rss_mb() -> Optional[float]:
+    """当前进程常驻内存（MB），读取 /proc/self/statm，开销远低于 smaps"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class EventLog:
+    """
+    跨进程共享的事件环形缓冲区（匿名共享内存，fork 后父子进程可见同一份）
+
+    Args:
+        slots: 保留的事件条数
+        slot_size: 单条事件 JSON 的最大字节数，超出部分截断字段
+    """
+
+    _HEADER = struct.Struct("Q")
+
+    def __init__(self, slots: int = 64, slot_size: int = 512):
+        self.slots = slots
+        self.slot_size = slot_size
+        self._memory = mmap.mmap(-1, self._HEADER.size + slots * slot_size)
+        self._lock = multiprocessing.Lock()
+
+    def record(self, kind: str, **fields):
+        event = {"time": time.time(), "kind": kind, "pid": os.getpid(), **fields}
+        data = json.dumps(event, ensure_ascii=False, default=str).encode()
+        if len(data) > self.slot_size:
+            data = json.dumps({key: event[key] for key in ("time", "kind", "pid")}).encode()
+        with self._lock:
+            count = self._HEADER.unpack_from(self._memory, 0)[0]
+            offset = self._HEADER.size + (count % self.slots) * self.slot_size
+            self._memory[offset:offset + self.slot_size] = data.ljust(self.slot_size, b"\0")
+            self._HEADER.pack_into(self._memory, 0, count + 1)
+
+    def recent(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """最近的事件，新事件在前"""
+        with self._lock:
+            count = self._HEADER.unpack_from(self._memory, 0)[0]
+            raw = []
+            for index in range(count - 1, max(count - min(limit, self.slots), 0) - 1, -1):
+                offset = self._HEADER.size + (index % self.slots) * self.slot_size
+                raw.append(bytes(self._memory[offset:offset + self.slot_size]))
+        return [json.loads(item.rstrip(b"\0")) for item in raw]
+
+    def count(self) -> int:
+        return self._HEADER.unpack_from(self._memory, 0)[0]
+
+
+class WorkerLifecycle:
+    """
+    工作进程回收与事件
+
+    Args:
+        max_requests: 处理该数量的请求后回收，0 表示不限制
+        max_rss_mb: 常驻内存超过该值后回收，0 表示不限制
+        jitter: 请求数阈值的随机增量上限，避免各工作进程同时回收
+        max_stuck: 卡住（超时未返回）的推理线程达到该数量后回收，0 表示不回收
+        rss_check_interval: RSS 检查的最小间隔（秒）
+    """
+
+    def __init__(self, max_requests: int = 0, max_rss_mb: float = 0, jitter: int = 0,
+                 max_stuck: int = 1, rss_check_interval: float = 5.0):
+        self.max_requests = max_requests
+        self.max_rss_mb = max_rss_mb
+        self.jitter = jitter
+        self.max_stuck = max_stuck
+        self.rss_check_interval = rss_check_interval
+        self.events = EventLog()
+        self.worker_index: Optional[int] = None
+        self.requests = 0
+        self.request_limit = max_requests
+        self.recycling: Optional[str] = None
+        self._shutdown: Optional[Callable[[], None]] = None
+        self._rss_checked_at = 0.0
+
+    @classmethod
+    def from_env(cls) -> "WorkerLifecycle":
+        return cls(
+            max_requests=int(os.getenv("DDDDOCR_MAX_REQUESTS", 0)),
+            max_rss_mb=float(os.getenv("DDDDOCR_MAX_RSS_MB", 0)),
+            jitter=int(os.getenv("DDDDOCR_MAX_REQUESTS_JITTER", 0)),
+            max_stuck=int(os.getenv("DDDDOCR_WATCHDOG_MAX_STUCK", 1)),
+        )
+
+    @property
+    def recycling_enabled(self) -> bool:
+        return self.max_requests > 0 or self.max_rss_mb > 0
+
+    def attach(self, worker_index: int, shutdown: Callable[[], None]):
+        """
+        在预派生工作进程中注册优雅退出回调（停止接收连接并排空在途请求）
+
+        回收依赖主进程重新派生，单进程模式下不会注册，只记录事件
+        """
+        self.worker_index = worker_index
+        self._shutdown = shutdown
+        self.requests = 0
+        self.recycling = None
+        self.request_limit = self.max_requests + (random.randint(0, self.jitter) if self.jitter else 0)
+
+    def request_done(self):
+        """每个推理请求完成后调用（事件循环线程）"""
+        self.requests += 1
+        if self.recycling is not None or self._shutdown is None:
+            return
+        if self.request_limit and self.requests >= self.request_limit:
+            self.recycle("max_requests", requests=self.requests)
+            return
+        if self.max_rss_mb:
+            now = time.monotonic()
+            if now - self._rss_checked_at >= self.rss_check_interval:
+                self._rss_checked_at = now
+                rss = rss_mb()
+                if rss is not None and rss > self.max_rss_mb:
+                    self.recycle("max_rss", rss_mb=round(rss, 1), requests=self.requests)
+
+    def on_scheduler_event(self, kind: str, **fields):
+        """调度器事件回调：记录推理超时，卡住的线程过多时回收工作进程"""
+        self.events.record(kind, worker=self.worker_index, **fields)
+        stuck = fields.get("stuck", 0)
+        if kind == "inference_timeout" and self.max_stuck and stuck >= self.max_stuck:
+            self.recycle("stuck_inference", stuck=stuck)
+
+    def recycle(self, reason: str, **fields):
+        """优雅回收当前工作进程（只触发一次）"""
+        if self.recycling is not None:
+            return
+        if self._shutdown is None:
+            log.warning("Lifecycle", f"Recycle requested ({reason}) but worker recycling requires pre-fork mode")
+            self.events.record("recycle_skipped", reason=reason, **fields)
+            return
+        self.recycling = reason
+        self.events.record("recycle", worker=self.worker_index, reason=reason, **fields)
+        log.info("Lifecycle", f"Recycling worker {self.worker_index}: {reason}", **fields)
+        self._shutdown()
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "worker": self.worker_index,
+            "pid": os.getpid(),
+            "requests": self.requests,
+            "request_limit": self.request_limit or None,
+            "max_rss_mb": self.max_rss_mb or None,
+            "rss_mb": round(rss_mb() or 0, 1) or None,
+            "recycling": self.recycling,
+            "events_total": self.events.count(),
+            "events": self.events.recent(),
+        }
@@ -0,0 +1,261 @@
+# coding=utf-8
+"""
+非阻塞结构化日志
+日志记录只写入内存中的有界环形缓冲区，由后台线程批量格式化并写出，
+请求路径上不做同步 I/O；缓冲区满时丢弃最旧的记录并计数。
+
+- 服务日志: log.info/warning/error，文本或 JSONL 格式
+- 请求日志: 每个推理请求一行 JSONL，成功请求可按比例采样，失败请求始终记录
+- 审计日志: 图片摘要、识别参数、结果与耗时（入队前即算好摘要，缓冲区不持有图片）
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import random
+import hashlib
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+
+
+def format_json(record: Dict[str, Any]) -> str:
+    return json.dumps(record, ensure_ascii=False, default=str)
+
+
+def format_text(record: Dict[str, Any]) -> str:
+    """文本格式: 时间 级别 [组件] 消息 key=value ..."""
+    fields = " ".join(f"{key}={value}" for key, value in record.items()
+                      if key not in ("ts", "level", "component", "message"))
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record["ts"]))
+    line = f"{timestamp} {record['level'].upper():7s} [{record['component']}] {record['message']}"
+    return f"{line} {fields}" if fields else line
+
+
+class LogWriter:
+    """
+    环形缓冲区 + 后台写线程
+
+    Args:
+        path: 输出文件路径，"-" 为标准输出，"stderr" 为标准错误
+        formatter: 在后台线程中将记录转为一行文本
+        capacity: 环形缓冲区容量（条）
+        batch_size: 每批写出的最大条数
+        flush_interval: 空闲时的写出间隔（秒）
+    """
+
+    def __init__(self, path: str = "-", formatter: Callable[[Any], str] = format_json,
+                 capacity: int = 10000, batch_size: int = 256, flush_interval: float = 0.5):
+        self.path = path
+        self.formatter = formatter
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: deque = deque(maxlen=capacity)
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._stream = None
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # 后台线程不随 fork 复制；父进程尚未写出的记录由父进程负责，子进程丢弃
+        self._buffer.clear()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._stream = None
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="ddddocr-log-writer", daemon=True)
+            self._thread.start()
+
+    def put(self, record: Any):
+        """写入一条记录（不阻塞，缓冲区满时覆盖最旧的记录）"""
+        if self._thread is None or self._pid != os.getpid():
+            self._ensure_thread()
+        if len(self._buffer) >= self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append(record)
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def _open(self):
+        if self._stream is None:
+            if self.path in ("-", "stdout"):
+                self._stream = sys.stdout
+            elif self.path == "stderr":
+                self._stream = sys.stderr
+            else:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._stream = open(self.path, "a", encoding="utf-8")
+        return self._stream
+
+    def _write_batch(self) -> int:
+        lines = []
+        while self._buffer and len(lines) < self.batch_size:
+            try:
+                record = self._buffer.popleft()
+            except IndexError:
+                break
+            try:
+                lines.append(self.formatter(record) + "\n")
+            except Exception:
+                self.errors += 1
+        if lines:
+            try:
+                stream = self._open()
+                stream.write("".join(lines))
+                stream.flush()
+                self.written += len(lines)
+            except Exception:
+                self.errors += len(lines)
+        return len(lines)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            while self._write_batch():
+                pass
+
+    def flush(self):
+        """在调用线程中写出缓冲区中的全部记录（用于退出前）"""
+        while self._write_batch():
+            pass
+
+    def close(self):
+        """写出剩余记录并关闭日志文件（标准输出/标准错误不关闭）"""
+        self.flush()
+        with self._lock:
+            stream, self._stream = self._stream, None
+        if stream is not None and stream not in (sys.stdout, sys.stderr):
+            stream.close()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "buffered": len(self._buffer),
+            "capacity": self._buffer.maxlen,
+            "written": self.written,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+
+class Logger:
+    """服务日志"""
+
+    def __init__(self, writer: LogWriter, level: str = "info"):
+        self.writer = writer
+        self.level = LEVELS.get(level, LEVELS["info"])
+
+    @classmethod
+    def from_env(cls) -> "Logger":
+        formatter = format_json if os.getenv("DDDDOCR_LOG_FORMAT", "text").lower() == "json" else format_text
+        return cls(LogWriter(os.getenv("DDDDOCR_LOG_FILE", "-"), formatter=formatter),
+                   level=os.getenv("DDDDOCR_LOG_LEVEL", "info").lower())
+
+    def log(self, level: str, component: str, message: str, **fields):
+        if LEVELS[level] < self.level:
+            return
+        self.writer.put({"ts": time.time(), "level": level, "component": component, "message": message, **fields})
+
+    def debug(self, component: str, message: str, **fields):
+        self.log("debug", component, message, **fields)
+
+    def info(self, component: str, message: str, **fields):
+        self.log("info", component, message, **fields)
+
+    def warning(self, component: str, message: str, **fields):
+        self.log("warning", component, message, **fields)
+
+    def error(self, component: str, message: str, **fields):
+        self.log("error", component, message, **fields)
+
+
+def _image_digests(images: Dict[str, bytes]) -> Dict[str, str]:
+    return {field: hashlib.sha256(data).hexdigest() for field, data in images.items()}
+
+
+class RequestLogger:
+    """
+    请求日志与审计日志
+
+    Args:
+        request_path: 请求日志路径，None 表示关闭
+        audit_path: 审计日志路径，None 表示关闭
+        success_sample_rate: 成功请求写入请求日志的比例，失败请求始终记录
+    """
+
+    def __init__(self, request_path: Optional[str] = None, audit_path: Optional[str] = None,
+                 success_sample_rate: float = 1.0):
+        self.requests = LogWriter(request_path) if request_path else None
+        self.audit = LogWriter(audit_path) if audit_path else None
+        self.success_sample_rate = success_sample_rate
+        self.enabled = self.requests is not None or self.audit is not None
+
+    @classmethod
+    def from_env(cls) -> "RequestLogger":
+        return cls(
+            request_path=os.getenv("DDDDOCR_REQUEST_LOG") or None,
+            audit_path=os.getenv("DDDDOCR_AUDIT_LOG") or None,
+            success_sample_rate=float(os.getenv("DDDDOCR_REQUEST_LOG_SAMPLE_RATE", 1.0)),
+        )
+
+    def record(self, operation: str, client_id: str, request: Any, images: Dict[str, bytes],
+               result: Any, error: Optional[BaseException], seconds: float):
+        """
+        记录一次推理请求
+
+        审计记录在此处即算好图片摘要并去掉请求中的图片字段，队列中只保留小字典，
+        不持有原始图片与 base64 请求体；序列化与写入在后台线程中完成
+        """
+        record = {
+            "ts": time.time(),
+            "operation": operation,
+            "client": client_id,
+            "success": error is None,
+            "latency_ms": round(seconds * 1000, 3),
+        }
+        if error is not None:
+            record["error"] = getattr(error, "detail", None) or str(error)
+        if self.requests is not None and (error is not None or self.success_sample_rate >= 1
+                                          or random.random() < self.success_sample_rate):
+            self.requests.put(record)
+        if self.audit is not None:
+            audit = dict(record, result=result, images=_image_digests(images))
+            if request is not None:
+                audit["options"] = request.model_dump(exclude=set(images) | {"deadline"})
+            self.audit.put(audit)
+
+    def flush(self):
+        for writer in (self.requests, self.audit):
+            if writer is not None:
+                writer.flush()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "success_sample_rate": self.success_sample_rate,
+            "requests": self.requests.get_metrics() if self.requests else None,
+            "audit": self.audit.get_metrics() if self.audit else None,
+        }
+
+
+# 进程内共享的服务日志
+log = Logger.from_env()
+atexit.register(log.writer.flush)
@@ -4,14 +4,17 @@ MCP (Model Context Protocol) 协议支持
 使AI Agent能够调用ddddocr服务
 """
 
+import os
 import json
 import base64
-from typing import Dict, Any, List
+import asyncio
+from typing import Dict, Any, List, Union
 
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, Body, HTTPException, Request
 from fastapi.responses import JSONResponse
 
-from .models import MCPRequest, MCPResponse, MCPCapabilities
+from .models import MCPRequest, MCPResponse, MCPCapabilities, InitializeRequest
+from .operations import OPERATIONS_BY_TOOL, dispatch
 
 
 class MCPHandler:
@@ -20,8 +23,47 @@ class MCPHandler:
     def __init__(self, service):
         self.service = service
         self.router = APIRouter()
+        self.max_batch = int(os.getenv("DDDDOCR_MCP_MAX_BATCH", 32))
         self._setup_routes()
     
+    async def _call_one(self, payload: Dict[str, Any], http_request: Request) -> MCPResponse:
+        """执行单个工具调用，错误以 MCPResponse.error 返回"""
+        request_id = payload.get("id") if isinstance(payload, dict) else None
+        try:
+            request = MCPRequest(**payload)
+            method = request.method
+            params = request.params
+            
+            timing = None
+            operation = OPERATIONS_BY_TOOL.get(method)
+            if operation is not None:
+                # 推理类工具与 REST 接口走同一操作注册表
+                timing_mode = self.service.tracer.timing_mode(http_request.headers.get("x-request-timing"))
+                with self.service.tracer.trace(operation.name, force=timing_mode is not None) as trace:
+                    result = await dispatch(self.service, operation, operation.request_model(**params),
+                                            http_request, reuse_decoded=False)
+                # 批量调用共用一个HTTP响应，耗时明细统一放在各调用的响应信封中
+                if timing_mode is not None:
+                    timing = trace.timing()
+            elif method == "ddddocr_initialize":
+                result = self.service.initialize(InitializeRequest(**params))
+            elif method == "ddddocr_status":
+                result = self.service.get_status().dict()
+            else:
+                raise HTTPException(status_code=400, detail=f"不支持的方法: {method}")
+            
+            return MCPResponse(result=result, id=request.id, timing=timing)
+            
+        except Exception as e:
+            return MCPResponse(
+                error={
+                    "code": -1,
+                    "message": str(e),
+                    "data": None
+                },
+                id=request_id
+            )
+    
     def _setup_routes(self):
         """设置MCP路由"""
         
@@ -40,7 +82,12 @@ class MCPHandler:
                                 "det": {"type": "boolean", "description": "是否启用目标检测功能"},
                                 "old": {"type": "boolean", "description": "是否使用旧版OCR模型"},
                                 "beta": {"type": "boolean", "description": "是否使用beta版OCR模型"},
-                                "use_gpu": {"type": "boolean", "description": "是否使用GPU"}
+                                "use_gpu": {"type": "boolean", "description": "是否使用GPU"},
+                                "execution_provider": {
+                                    "type": "string",
+                                    "enum": ["auto", "cpu", "cpu-no-arena", "xnnpack", "openvino", "dnnl"],
+                                    "description": "ONNX执行配置，auto 测速选择最快且输出一致者"
+                                }
                             }
                         }
                     },
@@ -53,6 +100,12 @@ class MCPHandler:
                                 "image": {"type": "string", "description": "图片数据（base64编码）"},
                                 "png_fix": {"type": "boolean", "description": "是否修复PNG透明背景问题"},
                                 "probability": {"type": "boolean", "description": "是否返回概率信息"},
+                                "probability_format": {
+                                    "type": "string",
+                                    "enum": ["topk", "full", "float16"],
+                                    "description": "概率信息格式，默认 topk"
+                                },
+                                "top_k": {"type": "integer", "description": "topk 格式下每个字符返回的候选数量"},
                                 "color_filter_colors": {
                                     "type": "array", 
                                     "items": {"type": "string"},
@@ -64,7 +117,22 @@ class MCPHandler:
                                         {"type": "string"}
                                     ],
                                     "description": "字符集范围限制"
-                                }
+                                },
+                                "cascade": {"type": "boolean", "description": "是否启用置信度级联（需加载级联重模型）"},
+                                "cascade_threshold": {"type": "number", "description": "快速模型序列置信度低于该值时升级到重模型，默认 0.9"},
+                                "expected_length": {
+                                    "oneOf": [
+                                        {"type": "integer"},
+                                        {"type": "array", "items": {"type": "integer"}}
+                                    ],
+                                    "description": "期望的识别长度，不符时升级到重模型"
+                                },
+                                "frame_mode": {
+                                    "type": "string",
+                                    "enum": ["first", "max", "min", "median", "vote"],
+                                    "description": "多帧图片（GIF/APNG）的处理方式，默认只识别第一帧"
+                                },
+                                "max_frames": {"type": "integer", "description": "多帧图片最多解码的帧数，默认 16"}
                             },
                             "required": ["image"]
                         }
@@ -105,6 +173,17 @@ class MCPHandler:
                             "required": ["target_image", "background_image"]
                         }
                     },
+                    {
+                        "name": "ddddocr_slide_puzzle",
+                        "description": "仅凭带坑位的图片求解滑块（背景从已知背景图库中查找）",
+                        "inputSchema": {
+                            "type": "object",
+                            "properties": {
+                                "target_image": {"type": "string", "description": "带坑位的图片（base64编码）"}
+                            },
+                            "required": ["target_image"]
+                        }
+                    },
                     {
                         "name": "ddddocr_status",
                         "description": "获取服务状态信息",
@@ -118,100 +197,19 @@ class MCPHandler:
             return capabilities
         
         @self.router.post("/call")
-        async def call_tool(request: MCPRequest):
-            """调用MCP工具"""
-            try:
-                method = request.method
-                params = request.params
-                
-                if method == "ddddocr_initialize":
-                    from .models import InitializeRequest
-                    init_request = InitializeRequest(**params)
-                    result = self.service.initialize(init_request)
-                    
-                elif method == "ddddocr_ocr":
-                    from .models import OCRRequest
-                    ocr_request = OCRRequest(**params)
-                    
-                    if not self.service.ocr_instance:
-                        raise HTTPException(status_code=400, detail="OCR功能未初始化")
-                    
-                    # 解码base64图片
-                    image_data = base64.b64decode(ocr_request.image)
-                    
-                    # 设置字符集范围
-                    if ocr_request.charset_range is not None:
-                        self.service.ocr_instance.set_ranges(ocr_request.charset_range)
-                    
-                    # 执行OCR识别
-                    result = self.service.ocr_instance.classification(
-                        image_data,
-                        png_fix=ocr_request.png_fix,
-                        probability=ocr_request.probability,
-                        color_filter_colors=ocr_request.color_filter_colors,
-                        color_filter_custom_ranges=ocr_request.color_filter_custom_ranges
-                    )
-                    
-                elif method == "ddddocr_detection":
-                    from .models import DetectionRequest
-                    det_request = DetectionRequest(**params)
-                    
-                    if not self.service.det_instance:
-                        raise HTTPException(status_code=400, detail="目标检测功能未初始化")
-                    
-                    # 解码base64图片
-                    image_data = base64.b64decode(det_request.image)
-                    
-                    # 执行目标检测
-                    result = self.service.det_instance.detection(image_data)
-                    
-                elif method == "ddddocr_slide_match":
-                    from .models import SlideMatchRequest
-                    slide_request = SlideMatchRequest(**params)
-                    
-                    if not self.service.slide_instance:
-                        raise HTTPException(status_code=500, detail="滑块功能未初始化")
-                    
-                    # 解码base64图片
-                    target_data = base64.b64decode(slide_request.target_image)
-                    background_data = base64.b64decode(slide_request.background_image)
-                    
-                    # 执行滑块匹配
-                    result = self.service.slide_instance.slide_match(
-                        target_data, background_data, simple_target=slide_request.simple_target
-                    )
-                    
-                elif method == "ddddocr_slide_comparison":
-                    from .models import SlideComparisonRequest
-                    slide_request = SlideComparisonRequest(**params)
-                    
-                    if not self.service.slide_instance:
-                        raise HTTPException(status_code=500, detail="滑块功能未初始化")
-                    
-                    # 解码base64图片
-                    target_data = base64.b64decode(slide_request.target_image)
-                    background_data = base64.b64decode(slide_request.background_image)
-                    
-                    # 执行滑块比较
-                    result = self.service.slide_instance.slide_comparison(target_data, background_data)
-                    
-                elif method == "ddddocr_status":
-                    result = self.service.get_status().dict()
-                    
-                else:
-                    raise HTTPException(status_code=400, detail=f"不支持的方法: {method}")
-                
-                return MCPResponse(result=result, id=request.id)
-                
-            except Exception as e:
-                return MCPResponse(
-                    error={
-                        "code": -1,
-                        "message": str(e),
-                        "data": None
-                    },
-                    id=request.id
-                )
+        async def call_tool(http_request: Request, payload: Union[List[Dict[str, Any]], Dict[str, Any]] = Body(...)):
+            """
+            调用MCP工具
+
+            支持 JSON-RPC 批量调用：请求体为数组时，各调用并发执行并按原顺序返回结果数组
+            """
+            if not isinstance(payload, list):
+                return await self._call_one(payload, http_request)
+            if not payload:
+                return MCPResponse(error={"code": -32600, "message": "批量调用不能为空", "data": None})
+            if len(payload) > self.max_batch:
+                raise HTTPException(status_code=400, detail=f"批量调用数量超过上限 {self.max_batch}")
+            return await asyncio.gather(*(self._call_one(item, http_request) for item in payload))
         
         @self.router.get("/")
         async def mcp_info():
@@ -12,6 +12,8 @@ from starlette.requests import Request
 from starlette.responses import Response, JSONResponse
 from starlette.types import ASGIApp
 
+from .logs import log
+
 def is_private_or_local_ip(ip_str: str) -> bool:
     """
     严谨地检查一个IP地址字符串是否属于私有地址或环回地址。
@@ -24,6 +26,34 @@ def is_private_or_local_ip(ip_str: str) -> bool:
     except ValueError:
         return False
 
+def get_client_ip(request: Request) -> str:
+    """
+    获取请求的真实客户端IP，优先取 X-Forwarded-For 的第一个地址。
+    """
+    forwarded_for = request.headers.get("x-forwarded-for")
+    if forwarded_for:
+        return forwarded_for.split(',')[0].strip()
+    return request.client.host if request.client else ""
+
+# 始终需要管理员JWT的路径前缀（管理接口、会在服务器上加载模型与写文件的影子评估配置、
+# 以及含客户端标识（JWT sub/iss、客户端IP）与缓存地址的运行指标）
+ADMIN_PATH_PREFIXES = ("/admin", "/shadow", "/metrics")
+
+def is_admin_claims(claims) -> bool:
+    """
+    JWT声明是否具有管理员权限：
+    admin 为 true、role 为 admin、roles 包含 admin 或 scope 包含 admin
+    """
+    if not isinstance(claims, dict):
+        return False
+    if claims.get("admin") is True or claims.get("role") == "admin":
+        return True
+    roles = claims.get("roles")
+    if isinstance(roles, (list, tuple)) and "admin" in roles:
+        return True
+    scope = claims.get("scope")
+    return isinstance(scope, str) and "admin" in scope.split()
+
 class AuthMiddleware(BaseHTTPMiddleware):
     def __init__(self, app: ASGIApp):
         super().__init__(app)
@@ -37,15 +67,15 @@ class AuthMiddleware(BaseHTTPMiddleware):
             try:
                 with open(secret_file_path, 'r') as f:
                     self.secret_key = f.read().strip()
-                print("[Auth] Secret loaded from file.")
+                log.info("Auth", "Secret loaded from file.")
             except IOError as e:
                 # 在启动时打印错误，但允许服务继续运行
-                print(f"[Auth Error] Could not read secret file {secret_file_path}: {e}", file=sys.stderr)
+                log.error("Auth", f"Could not read secret file {secret_file_path}: {e}")
                 self.secret_key = None
         else:
             self.secret_key = os.getenv("OCR_SHARED_SECRET")
             if self.secret_key:
-                print("[Auth] Secret loaded from environment variable.")
+                log.info("Auth", "Secret loaded from environment variable.")
 
     async def dispatch(
         self, request: Request, call_next: RequestResponseEndpoint
@@ -54,11 +84,13 @@ class AuthMiddleware(BaseHTTPMiddleware):
         if request.method == "OPTIONS":
             return await call_next(request)
 
-        forwarded_for = request.headers.get("x-forwarded-for")
-        final_client_ip = forwarded_for.split(',')[0].strip() if forwarded_for else request.client.host
+        final_client_ip = get_client_ip(request)
         is_local_request = is_private_or_local_ip(final_client_ip)
 
-        auth_required = False
+        # 管理接口始终需要管理员JWT，不受本地/远程认证开关影响
+        admin_request = request.url.path.startswith(ADMIN_PATH_PREFIXES)
+
+        auth_required = admin_request
         if is_local_request and self.local_auth_enabled:
             auth_required = True
         elif not is_local_request and self.remote_auth_enabled:
@@ -105,5 +137,12 @@ class AuthMiddleware(BaseHTTPMiddleware):
                 status_code=403,
                 content={"error": "Invalid token.", "detail": str(e)},
             )
-        
+
+        if admin_request and not is_admin_claims(payload):
+            return JSONResponse(
+                status_code=403, content={"error": "Admin privileges required."}
+            )
+
+        # 保存JWT声明，供调度器按 sub/iss 识别客户端
+        request.state.auth_claims = payload
         return await call_next(request)
\ No newline at end of file
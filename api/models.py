@@ -3,7 +3,7 @@
 API数据模型定义
 """
 
-from typing import List, Optional, Union, Dict, Any
+from typing import List, Literal, Optional, Union, Dict, Any
 from pydantic import BaseModel, Field
 
 
@@ -17,6 +17,15 @@ class InitializeRequest(BaseModel):
     device_id: int = Field(0, description="GPU设备ID")
     import_onnx_path: str = Field("", description="自定义ONNX模型路径")
     charsets_path: str = Field("", description="自定义字符集路径")
+    cascade_model: Optional[str] = Field(None, description="级联重模型类型: 'ocr', 'ocr_old', 'ocr_beta'，为空则不启用级联")
+    cascade_onnx_path: str = Field("", description="级联重模型的自定义ONNX模型路径")
+    cascade_charsets_path: str = Field("", description="级联重模型的自定义字符集路径")
+    execution_provider: str = Field(
+        "cpu", description="ONNX执行配置: 'cpu', 'cpu-no-arena', 'xnnpack', 'openvino', 'dnnl'，或 'auto' 测速选择最快且输出一致者"
+    )
+    execution_providers: Optional[Dict[str, str]] = Field(
+        None, description="按模型指定执行配置，键为 'ocr'、'cascade'、'det'，覆盖 execution_provider"
+    )
 
 
 class SwitchModelRequest(BaseModel):
@@ -37,14 +46,27 @@ class OCRRequest(BaseModel):
     image: str = Field(..., description="图片数据（base64编码）")
     png_fix: bool = Field(False, description="是否修复PNG透明背景问题")
     probability: bool = Field(False, description="是否返回概率信息")
+    probability_format: Literal["topk", "full", "float16"] = Field(
+        "topk", description="概率信息格式: 'topk' 每个字符的top-k候选, 'full' 完整概率分布, 'float16' 打包的float16完整分布"
+    )
+    top_k: int = Field(3, ge=1, le=50, description="topk 格式下每个字符返回的候选数量")
     color_filter_colors: Optional[List[str]] = Field(None, description="颜色过滤预设颜色列表")
     color_filter_custom_ranges: Optional[List[List[List[int]]]] = Field(None, description="自定义HSV颜色范围")
     charset_range: Optional[Union[int, str]] = Field(None, description="字符集范围限制")
+    cascade: bool = Field(False, description="是否启用置信度级联（需在初始化时加载级联重模型）")
+    cascade_threshold: float = Field(0.9, ge=0, le=1, description="快速模型序列置信度低于该值时升级到重模型")
+    expected_length: Optional[Union[int, List[int]]] = Field(None, description="期望的识别长度，不符时升级到重模型")
+    frame_mode: Literal["first", "max", "min", "median", "vote"] = Field(
+        "first", description="多帧图片（GIF/APNG）的处理方式: 'first' 只识别第一帧, 'max'/'min'/'median' 逐像素合并各帧后识别, 'vote' 逐帧识别后投票"
+    )
+    max_frames: int = Field(16, ge=1, le=256, description="多帧图片最多解码的帧数")
+    deadline: Optional[float] = Field(None, description="请求截止时间（Unix时间戳，秒），过期后不再执行推理")
 
 
 class DetectionRequest(BaseModel):
     """目标检测请求模型"""
     image: str = Field(..., description="图片数据（base64编码）")
+    deadline: Optional[float] = Field(None, description="请求截止时间（Unix时间戳，秒），过期后不再执行推理")
 
 
 class SlideMatchRequest(BaseModel):
@@ -52,12 +74,20 @@ class SlideMatchRequest(BaseModel):
     target_image: str = Field(..., description="滑块图片（base64编码）")
     background_image: str = Field(..., description="背景图片（base64编码）")
     simple_target: bool = Field(False, description="是否为简单滑块")
+    deadline: Optional[float] = Field(None, description="请求截止时间（Unix时间戳，秒），过期后不再执行推理")
 
 
 class SlideComparisonRequest(BaseModel):
     """滑块比较请求模型"""
     target_image: str = Field(..., description="带坑位的图片（base64编码）")
     background_image: str = Field(..., description="完整背景图片（base64编码）")
+    deadline: Optional[float] = Field(None, description="请求截止时间（Unix时间戳，秒），过期后不再执行推理")
+
+
+class SlidePuzzleRequest(BaseModel):
+    """仅凭带坑位图片的滑块请求模型（背景从背景图库中查找）"""
+    target_image: str = Field(..., description="带坑位的图片（base64编码）")
+    deadline: Optional[float] = Field(None, description="请求截止时间（Unix时间戳，秒），过期后不再执行推理")
 
 
 class APIResponse(BaseModel):
@@ -65,6 +95,31 @@ class APIResponse(BaseModel):
     success: bool = Field(..., description="请求是否成功")
     message: str = Field("", description="响应消息")
     data: Optional[Any] = Field(None, description="响应数据")
+    timing: Optional[Dict[str, Any]] = Field(None, description="各阶段耗时明细（请求头 X-Request-Timing 要求时返回）")
+
+
+class ShadowConfigRequest(BaseModel):
+    """影子流量配置请求模型"""
+    enabled: bool = Field(True, description="是否启用影子评估，false 时停止并清除候选模型")
+    model_type: Optional[str] = Field(None, description="OCR候选模型类型: 'ocr', 'ocr_old', 'ocr_beta'")
+    import_onnx_path: str = Field("", description="OCR候选模型的自定义ONNX模型路径")
+    charsets_path: str = Field("", description="OCR候选模型的自定义字符集路径")
+    det_onnx_path: str = Field("", description="检测候选模型的ONNX模型路径，为空则不镜像 /detect")
+    sample_rate: float = Field(0.05, ge=0, le=1, description="镜像采样率")
+    dump_dir: Optional[str] = Field(None, description="不一致样本的落盘子目录（相对服务端 DDDDOCR_SHADOW_DUMP_DIR），为空则不落盘")
+    iou_threshold: float = Field(0.5, gt=0, le=1, description="检测框视为一致的最小IoU")
+
+
+class AdminProfileRequest(BaseModel):
+    """CPU采样分析请求模型"""
+    duration_seconds: float = Field(10, ge=1, le=120, description="采样时长（秒）")
+    interval_ms: float = Field(10, ge=1, le=1000, description="采样间隔（毫秒）")
+
+
+class TracingConfigRequest(BaseModel):
+    """请求追踪配置模型"""
+    sample_rate: float = Field(..., ge=0, le=1, description="追踪采样率，0 表示关闭")
+    capacity: Optional[int] = Field(None, ge=1, le=100000, description="环形缓冲区保留的追踪条数")
 
 
 class StatusResponse(BaseModel):
@@ -74,11 +129,15 @@ class StatusResponse(BaseModel):
     enabled_features: List[str] = Field(..., description="已启用的功能列表")
     version: str = Field(..., description="版本信息")
     uptime: float = Field(..., description="运行时间（秒）")
+    shadow: Optional[Dict[str, Any]] = Field(None, description="影子评估统计（未启用时为空）")
+    lifecycle: Optional[Dict[str, Any]] = Field(None, description="工作进程回收状态与最近的回收、推理超时事件")
+    execution_providers: Optional[Dict[str, Any]] = Field(None, description="各模型选用的ONNX执行配置及测速明细")
 
 
 class OCRResponse(BaseModel):
     """OCR识别响应模型"""
     text: Optional[str] = Field(None, description="识别的文本")
+    confidence: Optional[float] = Field(None, description="序列置信度")
     probability: Optional[Dict[str, Any]] = Field(None, description="概率信息")
 
 
@@ -92,6 +151,7 @@ class SlideResponse(BaseModel):
     target: List[int] = Field(..., description="目标位置坐标")
     target_x: Optional[int] = Field(None, description="滑块X偏移")
     target_y: Optional[int] = Field(None, description="滑块Y偏移")
+    background: Optional[Dict[str, Any]] = Field(None, description="匹配到的已知背景（仅 /slide-puzzle 返回）")
 
 
 # MCP协议相关模型
@@ -107,6 +167,7 @@ class MCPResponse(BaseModel):
     result: Optional[Any] = Field(None, description="结果")
     error: Optional[Dict[str, Any]] = Field(None, description="错误信息")
     id: Optional[Union[str, int]] = Field(None, description="请求ID")
+    timing: Optional[Dict[str, Any]] = Field(None, description="各阶段耗时明细（请求头 X-Request-Timing 要求时返回）")
 
 
 class MCPCapabilities(BaseModel):
@@ -0,0 +1,183 @@
+# coding=utf-8
+"""
+推理操作注册表
+REST 路由与 MCP 工具共用同一套操作定义：请求模型、功能开关检查、
+图片解码与调度执行均在此统一完成，两个入口的行为与性能特性保持一致
+"""
+
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Tuple, Type
+
+from fastapi import HTTPException, Request
+from pydantic import BaseModel
+
+from .models import (
+    OCRRequest, DetectionRequest, SlideMatchRequest, SlideComparisonRequest, SlidePuzzleRequest,
+    OCRResponse, DetectionResponse, SlideResponse
+)
+from .ingest import get_image_bytes
+from .prefork import model_path_for
+from .tracing import annotate, current_trace, span
+
+
+class Operation:
+    """
+    一个推理操作的定义
+
+    Args:
+        name: 操作名
+        label: 功能显示名，用于错误信息
+        tool: 对应的MCP工具名
+        request_model: 请求模型
+        instance_attr: 服务上对应模型实例的属性名，为空表示未初始化
+        feature: 需启用的功能名（enabled_features）
+        image_fields: 需要解码的base64图片字段
+        run: 执行函数 run(service, request, images, client)，返回原始结果
+        respond: 将原始结果转为 REST 响应数据
+        not_ready: 模型未初始化时的 (状态码, 错误信息)
+        success_message: REST 成功消息
+        failure_message: REST 失败消息前缀
+    """
+
+    def __init__(self, name: str, label: str, tool: str, request_model: Type[BaseModel], instance_attr: str,
+                 feature: str, image_fields: Tuple[str, ...],
+                 run: Callable[..., Awaitable[Any]], respond: Callable[[Any], Dict[str, Any]],
+                 not_ready: Tuple[int, str], success_message: str, failure_message: str):
+        self.name = name
+        self.label = label
+        self.tool = tool
+        self.request_model = request_model
+        self.instance_attr = instance_attr
+        self.feature = feature
+        self.image_fields = image_fields
+        self.run = run
+        self.respond = respond
+        self.not_ready = not_ready
+        self.success_message = success_message
+        self.failure_message = failure_message
+
+    def check_ready(self, service):
+        """检查模型已初始化且功能已启用"""
+        if not getattr(service, self.instance_attr, None):
+            raise HTTPException(status_code=self.not_ready[0], detail=self.not_ready[1])
+        if self.feature not in service.enabled_features:
+            raise HTTPException(status_code=400, detail=f"{self.label}功能已禁用")
+
+
+def _ocr_response(result) -> Dict[str, Any]:
+    if isinstance(result, dict):
+        confidence = result.get("sequence_confidence", result.get("confidence"))
+        return OCRResponse(text=result.get("text"), confidence=confidence, probability=result).dict()
+    return OCRResponse(text=result, probability=None).dict()
+
+
+async def _run_ocr(service, request: OCRRequest, images, client):
+    return await service.ocr(images["image"], request, client=client)
+
+
+async def _run_detection(service, request: DetectionRequest, images, client):
+    return await service.detect(images["image"], client=client)
+
+
+async def _run_slide_match(service, request: SlideMatchRequest, images, client):
+    return await service.slide_match(images["target_image"], images["background_image"],
+                                     request.simple_target, client=client)
+
+
+async def _run_slide_comparison(service, request: SlideComparisonRequest, images, client):
+    return await service.slide_comparison(images["target_image"], images["background_image"], client=client)
+
+
+async def _run_slide_puzzle(service, request: SlidePuzzleRequest, images, client):
+    return await service.slide_puzzle(images["target_image"], client=client)
+
+
+OPERATIONS: Dict[str, Operation] = {
+    operation.name: operation for operation in (
+        Operation(
+            name="ocr", label="OCR", tool="ddddocr_ocr", request_model=OCRRequest,
+            instance_attr="ocr_instance", feature="ocr", image_fields=("image",),
+            run=_run_ocr, respond=_ocr_response,
+            not_ready=(400, "OCR功能未初始化，请先调用 /initialize 接口"),
+            success_message="OCR识别成功", failure_message="OCR识别失败",
+        ),
+        Operation(
+            name="detect", label="目标检测", tool="ddddocr_detection", request_model=DetectionRequest,
+            instance_attr="det_instance", feature="detection", image_fields=("image",),
+            run=_run_detection, respond=lambda bboxes: DetectionResponse(bboxes=bboxes).dict(),
+            not_ready=(400, "目标检测功能未初始化，请先调用 /initialize 接口"),
+            success_message="目标检测成功", failure_message="目标检测失败",
+        ),
+        Operation(
+            name="slide_match", label="滑块", tool="ddddocr_slide_match", request_model=SlideMatchRequest,
+            instance_attr="slide_instance", feature="slide", image_fields=("target_image", "background_image"),
+            run=_run_slide_match, respond=lambda result: SlideResponse(**result).dict(),
+            not_ready=(500, "滑块功能未初始化"),
+            success_message="滑块匹配成功", failure_message="滑块匹配失败",
+        ),
+        Operation(
+            name="slide_comparison", label="滑块", tool="ddddocr_slide_comparison", request_model=SlideComparisonRequest,
+            instance_attr="slide_instance", feature="slide", image_fields=("target_image", "background_image"),
+            run=_run_slide_comparison, respond=lambda result: SlideResponse(**result).dict(),
+            not_ready=(500, "滑块功能未初始化"),
+            success_message="滑块比较成功", failure_message="滑块比较失败",
+        ),
+        Operation(
+            name="slide_puzzle", label="滑块", tool="ddddocr_slide_puzzle", request_model=SlidePuzzleRequest,
+            instance_attr="slide_instance", feature="slide", image_fields=("target_image",),
+            run=_run_slide_puzzle, respond=lambda result: SlideResponse(**result).dict(),
+            not_ready=(500, "滑块功能未初始化"),
+            success_message="滑块求解成功", failure_message="滑块求解失败",
+        ),
+    )
+}
+
+def _model_name(instance) -> str:
+    """响应耗时明细中的模型名（模型文件名，滑块等无模型文件的操作为算法名）"""
+    path = model_path_for(instance)
+    return os.path.basename(path) if path else "opencv"
+
+
+# MCP工具名 -> 操作
+OPERATIONS_BY_TOOL: Dict[str, Operation] = {operation.tool: operation for operation in OPERATIONS.values()}
+
+
+async def dispatch(service, operation: Operation, request: BaseModel, http_request: Request,
+                   reuse_decoded: bool = True) -> Any:
+    """
+    执行一次推理操作：检查功能、解码图片并经调度器执行
+
+    Args:
+        http_request: 所属HTTP请求，用于识别客户端
+        reuse_decoded: 是否复用中间件流式解码的图片；仅当图片字段位于请求体顶层时可用（REST 入口），
+            MCP 的图片位于 params 中，需自行解码
+    """
+    operation.check_ready(service)
+    if current_trace() is not None:
+        annotate(model=_model_name(getattr(service, operation.instance_attr)),
+                 model_generation=service.model_generation)
+    with span("decode"):
+        images = {
+            field: get_image_bytes(http_request if reuse_decoded else None, field, getattr(request, field))
+            for field in operation.image_fields
+        }
+    client = service.scheduler.identify(http_request, request.deadline)
+    request_logger = service.request_logger
+    try:
+        if not request_logger.enabled:
+            return await operation.run(service, request, images, client)
+
+        started = time.perf_counter()
+        try:
+            result = await operation.run(service, request, images, client)
+        except Exception as e:
+            request_logger.record(operation.name, client.client_id, request, images, None, e,
+                                  time.perf_counter() - started)
+            raise
+        request_logger.record(operation.name, client.client_id, request, images, result, None,
+                              time.perf_counter() - started)
+        return result
+    finally:
+        # 计入工作进程回收的请求数
+        service.lifecycle.request_done()
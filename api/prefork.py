@@ -0,0 +1,312 @@
+# coding=utf-8
+"""
+预派生 (pre-fork) 多进程服务
+主进程加载一次模型与字符集并创建ONNX会话，再 fork 出多个 uvicorn 工作进程。
+会话在主进程堆上持有的权重在 fork 后以写时复制 (COW) 的方式由工作进程共享，
+避免每个工作进程各自加载一份模型导致内存随进程数线性增长。
+模型文件的内存映射只用于预读页缓存，会话并不从映射创建，权重不在映射中共享
+"""
+
+import gc
+import os
+import asyncio
+import mmap
+import time
+import signal
+from typing import Any, Dict, List, Optional
+
+from .logs import log
+
+# 自定义模型所在的数据卷（见 compose.yml）
+MODEL_DIR = os.getenv("DDDDOCR_MODEL_DIR", "/app/models")
+
+# 已映射的模型文件（保持引用使预读的页缓存不被立即回收）
+_mapped_files: Dict[str, mmap.mmap] = {}
+
+
+def memory_usage(pid: Optional[int] = None) -> Dict[str, Any]:
+    """
+    读取进程内存占用（MB）
+
+    rss 为常驻内存，pss 按共享进程数均摊共享页，
+    shared/private 分别为与其他进程共享及独占的页
+    """
+    pid = pid or os.getpid()
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        fields["Rss"] = int(line.split()[1])
+        except OSError:
+            return {"pid": pid}
+
+    def mb(*keys):
+        if not any(key in fields for key in keys):
+            return None
+        return round(sum(fields.get(key, 0) for key in keys) / 1024, 1)
+
+    return {
+        "pid": pid,
+        "rss_mb": mb("Rss"),
+        "pss_mb": mb("Pss"),
+        "shared_mb": mb("Shared_Clean", "Shared_Dirty"),
+        "private_mb": mb("Private_Clean", "Private_Dirty"),
+    }
+
+
+def model_path_for(instance) -> Optional[str]:
+    """推断 ddddocr 实例所用的模型文件路径（与 ddddocr ModelLoader 的选择逻辑一致）"""
+    import ddddocr
+
+    base_dir = os.path.dirname(ddddocr.__file__)
+    if getattr(instance, "detection_engine", None) is not None:
+        return os.path.join(base_dir, "common_det.onnx")
+    if getattr(instance, "ocr_engine", None) is None:
+        return None
+    if instance.import_onnx_path:
+        return instance.import_onnx_path
+    return os.path.join(base_dir, "common.onnx" if instance.beta else "common_old.onnx")
+
+
+def map_model_file(path: str) -> Optional[mmap.mmap]:
+    """
+    只读映射模型文件并预读 (MADV_WILLNEED)，使其驻留在页缓存中
+
+    这只是预热：ONNX会话按文件路径创建并把权重复制到自己的内存中，不引用此映射，
+    之后按路径加载同一文件（重建会话、切换模型、影子评估）时从页缓存读取而不必访问磁盘
+    """
+    mapped = _mapped_files.get(path)
+    if mapped is not None:
+        return mapped
+    try:
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as e:
+        log.warning("Prefork", f"模型文件映射失败 {path}: {e}")
+        return None
+    if hasattr(mapped, "madvise") and hasattr(mmap, "MADV_WILLNEED"):
+        mapped.madvise(mmap.MADV_WILLNEED)
+    _mapped_files[path] = mapped
+    return mapped
+
+
+def preload_model_dir(directory: str = MODEL_DIR) -> List[str]:
+    """预读模型数据卷中的全部 .onnx 文件到页缓存（不创建会话）"""
+    if not os.path.isdir(directory):
+        return []
+    paths = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".onnx") and map_model_file(os.path.join(directory, name)) is not None:
+            paths.append(os.path.join(directory, name))
+    return paths
+
+
+def _fork_safe_session(path: str, profile: str, intra_op_threads: int):
+    """
+    创建可在 fork 后使用的ONNX会话（沿用模型已选择的执行配置）
+
+    onnxruntime 的线程池不会随 fork 复制到子进程，
+    因此主进程中的会话使用单线程执行（不创建线程池），并发由工作进程数提供
+    """
+    from .providers import create_session
+
+    return create_session(path, profile, intra_op_threads, fork_safe=True)
+
+
+def prepare_service(service, intra_op_threads: int = 1, fork_safe: bool = True) -> List[str]:
+    """
+    在主进程中为已加载的模型按线程数重建会话，并预读模型文件到页缓存
+
+    预派生模式下，fork 后各工作进程通过写时复制共享这些会话的权重，
+    共享的是主进程中会话的堆内存，而不是模型文件的映射
+
+    Args:
+        fork_safe: 会话将在 fork 后使用（预派生模式）；单进程模式只需调整线程数
+
+    Returns:
+        已处理的模型文件路径
+    """
+    prepared = []
+    for instance in (service.ocr_instance, service.cascade_instance, service.det_instance):
+        if instance is None:
+            continue
+        engine = getattr(instance, "ocr_engine", None) or getattr(instance, "detection_engine", None)
+        path = model_path_for(instance)
+        if engine is None or getattr(engine, "session", None) is None or not path:
+            continue
+        map_model_file(path)
+        profile = getattr(engine, "execution_provider", "cpu")
+        if fork_safe:
+            engine.session = _fork_safe_session(path, profile, intra_op_threads)
+        else:
+            from .providers import create_session
+
+            engine.session = create_session(path, profile, intra_op_threads)
+        prepared.append(path)
+    prepared.extend(p for p in preload_model_dir() if p not in prepared)
+    return prepared
+
+
+class PreforkServer:
+    """
+    预派生服务：主进程监听套接字并管理工作进程，工作进程退出（回收或异常）后自动重新派生
+
+    启动后很快异常退出的工作进程按槽位指数退避后再派生，连续 max_failures 次后放弃该槽位，
+    避免坏配置或坏模型导致主进程不停 fork
+
+    Args:
+        config: uvicorn.Config
+        workers: 工作进程数
+        lifecycle: 服务的 WorkerLifecycle，用于工作进程回收与事件记录
+        max_failures: 同一槽位连续快速失败的次数上限，达到后不再派生（0 表示不放弃）
+        backoff: 首次快速失败后的派生延迟（秒），之后每次翻倍
+        backoff_max: 派生延迟上限（秒）
+        rapid_window: 启动后多少秒内异常退出视为快速失败
+    """
+
+    def __init__(self, config, workers: int, lifecycle=None, max_failures: int = 5, backoff: float = 0.5,
+                 backoff_max: float = 30.0, rapid_window: float = 30.0):
+        self.config = config
+        self.workers = workers
+        self.lifecycle = lifecycle
+        self.max_failures = max_failures
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.rapid_window = rapid_window
+        self.children: Dict[int, int] = {}
+        self.started_at: Dict[int, float] = {}
+        self.failures: Dict[int, int] = {}
+        self.respawn_at: Dict[int, float] = {}
+        self.abandoned: List[int] = []
+        self.stopping = False
+        self.socket = None
+
+    def _spawn(self, index: int):
+        pid = os.fork()
+        if pid == 0:
+            self._run_worker(index)
+            log.writer.flush()
+            os._exit(0)
+        self.children[pid] = index
+        self.started_at[index] = time.monotonic()
+
+    def _run_worker(self, index: int):
+        import uvicorn
+
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        log.info("Prefork", f"Worker {index} started", **memory_usage())
+        server = uvicorn.Server(self.config)
+        if self.lifecycle is not None:
+            self.lifecycle.attach(index, lambda: self._drain(server))
+        try:
+            server.run(sockets=[self.socket])
+        except Exception as e:
+            log.error("Prefork", f"Worker {index} failed: {e}")
+            log.writer.flush()
+            os._exit(1)
+
+    @staticmethod
+    def _drain(server, grace: float = 0.5):
+        """
+        回收工作进程：立即停止接收新连接（积压的连接留给其他或新派生的工作进程），
+        稍后再让 uvicorn 处理完在途请求后退出，避免刚接受、请求尚未到达的连接被直接关闭
+        """
+        for listener in getattr(server, "servers", []):
+            listener.close()
+        asyncio.get_running_loop().call_later(grace, setattr, server, "should_exit", True)
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def report_memory(self):
+        """打印主进程与各工作进程的内存占用"""
+        log.info("Prefork", "Master memory", **memory_usage())
+        for pid, index in sorted(self.children.items(), key=lambda item: item[1]):
+            log.info("Prefork", f"Worker {index} memory", **memory_usage(pid))
+
+    def _record(self, kind: str, **fields):
+        if self.lifecycle is not None:
+            self.lifecycle.events.record(kind, **fields)
+
+    def _on_exit(self, index: int, pid: int, exit_code: int):
+        """工作进程退出：正常退出（回收）立即重新派生，快速失败按槽位退避，连续失败过多则放弃该槽位"""
+        now = time.monotonic()
+        if exit_code != 0 and now - self.started_at.get(index, now) < self.rapid_window:
+            failures = self.failures[index] = self.failures.get(index, 0) + 1
+        else:
+            failures = self.failures[index] = 0
+        self._record("worker_respawn", worker=index, exited_pid=pid, exit_code=exit_code, failures=failures)
+
+        if self.max_failures and failures >= self.max_failures:
+            self.abandoned.append(index)
+            self._record("worker_abandoned", worker=index, failures=failures)
+            log.error("Prefork", f"Worker {index} (pid {pid}) failed {failures} times in a row, not restarting",
+                      exit_code=exit_code)
+            return
+        delay = min(self.backoff * 2 ** (failures - 1), self.backoff_max) if failures else 0.0
+        level = "info" if exit_code == 0 else "warning"
+        log.log(level, "Prefork", f"Worker {index} (pid {pid}) exited with code {exit_code}, "
+                                  f"restarting in {delay:g}s", failures=failures)
+        self.respawn_at[index] = now + delay
+
+    def _respawn_due(self):
+        now = time.monotonic()
+        for index, due in list(self.respawn_at.items()):
+            if due <= now:
+                del self.respawn_at[index]
+                self._spawn(index)
+
+    def run(self) -> bool:
+        """
+        Returns:
+            是否所有槽位都正常（有槽位因连续失败被放弃时为 False）
+        """
+        self.socket = self.config.bind_socket()
+        log.info("Prefork", "Master memory before fork", **memory_usage())
+
+        # 冻结现有对象，避免子进程的垃圾回收写入对象头而触发页复制
+        gc.collect()
+        gc.freeze()
+
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGTERM, self._stop)
+        for index in range(self.workers):
+            self._spawn(index)
+
+        reported = False
+        started = time.monotonic()
+        while self.children or (self.respawn_at and not self.stopping):
+            if not self.stopping:
+                self._respawn_due()
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                pid, status = 0, 0
+            if pid == 0:
+                if not reported and time.monotonic() - started > 5:
+                    self.report_memory()
+                    reported = True
+                time.sleep(0.5 if not self.respawn_at else
+                           max(0.01, min(0.5, min(self.respawn_at.values()) - time.monotonic())))
+                continue
+            index = self.children.pop(pid, None)
+            if index is not None and not self.stopping:
+                self._on_exit(index, pid, os.waitstatus_to_exitcode(status))
+        self.socket.close()
+        if self.abandoned:
+            log.error("Prefork", f"Workers abandoned after repeated failures: {sorted(self.abandoned)}")
+        return not self.abandoned
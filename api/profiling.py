@@ -0,0 +1,100 @@
+# coding=utf-8
+"""
+按需 CPU 采样分析
+在限定时长内定时采集所有线程的调用栈，汇总为火焰图工具（flamegraph.pl / speedscope）
+可直接读取的折叠栈 (collapsed stack) 格式；未运行时没有任何开销
+"""
+
+import sys
+import time
+import threading
+from collections import Counter
+from typing import Any, Dict, Optional
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+class SamplingProfiler:
+    """
+    定时采样的 CPU 分析器
+
+    同一时间只允许一次采样；结果保留到下一次采样开始
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stacks: Counter = Counter()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.duration = 0.0
+        self.interval = 0.0
+        self.samples = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration_seconds: float = 10.0, interval_ms: float = 10.0):
+        """开始一次限时采样，已有采样在运行时抛出 RuntimeError"""
+        with self._lock:
+            if self.running:
+                raise RuntimeError("已有采样正在运行")
+            self._stacks = Counter()
+            self._stop_event.clear()
+            self.started_at = time.time()
+            self.finished_at = None
+            self.duration = duration_seconds
+            self.interval = interval_ms / 1000
+            self.samples = 0
+            self._thread = threading.Thread(target=self._run, name="ddddocr-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """提前结束采样"""
+        self._stop_event.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + self.duration
+        while not self._stop_event.is_set() and time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)).replace(";", ":"))
+                with self._lock:
+                    self._stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+            self._stop_event.wait(self.interval)
+        self.finished_at = time.time()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration_seconds": self.duration,
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "stacks": len(self._stacks),
+        }
+
+    def collapsed(self) -> Optional[str]:
+        """折叠栈文本（每行 "帧1;帧2;... 次数"），尚无采样结果时返回 None"""
+        if self.started_at is None:
+            return None
+        with self._lock:
+            stacks = dict(self._stacks)
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
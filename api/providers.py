@@ -0,0 +1,189 @@
+# coding=utf-8
+"""
+ONNX执行提供程序 (Execution Provider) 选择
+每个模型可单独指定执行配置；"auto" 在加载时对本机可用的CPU配置做一次微基准测试，
+选出输出与默认CPU配置一致的最快者。未安装的提供程序或输出不一致的配置自动回退到默认CPU配置。
+选择结果记录在引擎上，预派生模式重建会话时沿用同一配置
+"""
+
+from __future__ import annotations
+
+import io
+import time
+import statistics
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from .logs import log
+
+if TYPE_CHECKING:
+    import numpy as np
+
+DEFAULT_PROFILE = "cpu"
+
+
+class ProviderProfile:
+    """
+    一种CPU执行配置
+
+    Args:
+        name: 配置名
+        provider: onnxruntime 执行提供程序名
+        provider_options: 提供程序参数
+        session_settings: SessionOptions 属性
+    """
+
+    def __init__(self, name: str, provider: str, provider_options: Optional[Dict[str, Any]] = None,
+                 session_settings: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.provider = provider
+        self.provider_options = provider_options or {}
+        self.session_settings = session_settings or {}
+
+    def available(self) -> bool:
+        import onnxruntime
+
+        return self.provider in onnxruntime.get_available_providers()
+
+    def providers(self) -> List[Any]:
+        """InferenceSession 的 providers 参数，非CPU提供程序不支持的算子回退到CPU"""
+        providers: List[Any] = [(self.provider, self.provider_options)]
+        if self.provider != "CPUExecutionProvider":
+            providers.append("CPUExecutionProvider")
+        return providers
+
+
+PROFILES: Dict[str, ProviderProfile] = {
+    profile.name: profile for profile in (
+        ProviderProfile("cpu", "CPUExecutionProvider"),
+        # 验证码宽度不一，输入形状多变时内存模式优化难以复用，关闭内存池与内存模式有时反而更快、更省内存
+        ProviderProfile("cpu-no-arena", "CPUExecutionProvider",
+                        session_settings={"enable_cpu_mem_arena": False, "enable_mem_pattern": False}),
+        ProviderProfile("xnnpack", "XnnpackExecutionProvider"),
+        ProviderProfile("openvino", "OpenVINOExecutionProvider", {"device_type": "CPU"}),
+        ProviderProfile("dnnl", "DnnlExecutionProvider"),
+    )
+}
+
+
+def create_session(path: str, profile: str = DEFAULT_PROFILE, intra_op_threads: Optional[int] = None,
+                   fork_safe: bool = False):
+    """
+    按执行配置创建ONNX会话
+
+    Args:
+        fork_safe: 单线程顺序执行且线程不自旋（主进程中创建、fork 后在工作进程中使用）
+    """
+    import onnxruntime
+
+    selected = PROFILES[profile]
+    options = onnxruntime.SessionOptions()
+    for key, value in selected.session_settings.items():
+        setattr(options, key, value)
+    if intra_op_threads:
+        options.intra_op_num_threads = intra_op_threads
+    if fork_safe:
+        options.inter_op_num_threads = 1
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        options.add_session_config_entry("session.intra_op.allow_spinning", "0")
+    return onnxruntime.InferenceSession(path, sess_options=options, providers=selected.providers())
+
+
+def validation_input(engine) -> "np.ndarray":
+    """校验与基准测试用的输入：OCR模型用一张合成验证码，其他模型用固定种子的随机张量"""
+    import numpy as np
+
+    if hasattr(engine, "_preprocess_image"):
+        from PIL import Image
+        from .tuning import synthetic_corpus
+
+        return engine._preprocess_image(Image.open(io.BytesIO(synthetic_corpus(1)[0])), False)
+    shape = [dim if isinstance(dim, int) and dim > 0 else 1 for dim in engine.session.get_inputs()[0].shape]
+    return np.random.default_rng(0).uniform(0, 255, shape).astype(np.float32)
+
+
+def outputs_match(reference: "np.ndarray", output: "np.ndarray", tolerance: float = 1e-2) -> bool:
+    """输出是否一致：形状相同、末维 argmax（OCR的解码结果）相同，且数值误差在容差内"""
+    import numpy as np
+
+    if reference.shape != output.shape:
+        return False
+    if reference.ndim >= 2 and not np.array_equal(reference.argmax(axis=-1), output.argmax(axis=-1)):
+        return False
+    scale = max(1.0, float(np.abs(reference).max()))
+    return float(np.abs(reference.astype(np.float64) - output).max()) <= tolerance * scale
+
+
+def _bench(session, sample, repeat: int) -> float:
+    feed = {session.get_inputs()[0].name: sample}
+    session.run(None, feed)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        session.run(None, feed)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def validate_choice(choice: str):
+    """检查执行配置名"""
+    if choice != "auto" and choice not in PROFILES:
+        raise ValueError(f"不支持的执行配置: {choice}，可选: auto, {', '.join(PROFILES)}")
+
+
+def select_provider(engine, path: str, choice: str = DEFAULT_PROFILE, intra_op_threads: Optional[int] = None,
+                    repeat: int = 10) -> Dict[str, Any]:
+    """
+    为引擎选择执行配置并替换其会话
+
+    Args:
+        engine: ddddocr 的 OCR/检测引擎（持有 session）
+        path: 模型文件路径
+        choice: 配置名，或 "auto" 在可用配置中测速选择
+        intra_op_threads: 会话的算子内线程数，None 为 onnxruntime 默认值
+        repeat: 每个配置的计时次数（取中位数）
+
+    Returns:
+        选择结果与各配置的测速/校验明细
+    """
+    validate_choice(choice)
+    if choice == DEFAULT_PROFILE:
+        engine.execution_provider = DEFAULT_PROFILE
+        return {"requested": choice, "profile": DEFAULT_PROFILE, "providers": engine.session.get_providers()}
+
+    sample = validation_input(engine)
+    reference_session = create_session(path, DEFAULT_PROFILE, intra_op_threads)
+    reference = reference_session.run(None, {reference_session.get_inputs()[0].name: sample})[0]
+
+    names = [name for name in PROFILES if name != DEFAULT_PROFILE] if choice == "auto" else [choice]
+    candidates = {DEFAULT_PROFILE: reference_session} if choice == "auto" else {}
+    report: Dict[str, Dict[str, Any]] = {}
+    for name in names:
+        if not PROFILES[name].available():
+            report[name] = {"available": False}
+            continue
+        try:
+            session = create_session(path, name, intra_op_threads)
+            output = session.run(None, {session.get_inputs()[0].name: sample})[0]
+        except Exception as e:
+            report[name] = {"available": True, "error": str(e)}
+            continue
+        if not outputs_match(reference, output):
+            report[name] = {"available": True, "match": False}
+            continue
+        candidates[name] = session
+
+    for name, session in candidates.items():
+        report[name] = {"available": True, "match": True, "median_ms": round(_bench(session, sample, repeat), 3)}
+
+    selected = min(candidates, key=lambda name: report[name]["median_ms"]) if candidates else DEFAULT_PROFILE
+    if choice != "auto" and selected != choice:
+        log.warning("Providers", f"Execution provider {choice} unusable, falling back to {DEFAULT_PROFILE}",
+                    **report[choice])
+    engine.session = candidates.get(selected, reference_session)
+    engine.execution_provider = selected
+    return {
+        "requested": choice,
+        "profile": selected,
+        "providers": engine.session.get_providers(),
+        "benchmark": {name: report[name] for name in PROFILES if name in report},
+    }
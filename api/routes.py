@@ -8,10 +8,13 @@ import time
 import traceback
 from typing import Dict, Any
 
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import Depends, FastAPI, HTTPException, Request, Response
 from fastapi.responses import JSONResponse, HTMLResponse
 
 from .models import *
+from .admin import require_admin
+from .operations import OPERATIONS, dispatch
+from .tracing import span
 
 
 def create_routes(app: FastAPI, service):
@@ -76,131 +79,75 @@ def create_routes(app: FastAPI, service):
         except Exception as e:
             return APIResponse(success=False, message=str(e))
     
-    @app.post("/ocr", response_model=APIResponse)
-    async def ocr_recognition(request: OCRRequest):
-        """执行OCR识别"""
+    @app.post("/shadow", response_model=APIResponse, dependencies=[Depends(require_admin)])
+    async def configure_shadow(request: ShadowConfigRequest):
+        """配置影子流量评估（候选模型、采样率与不一致样本落盘）"""
         try:
-            if not service.ocr_instance:
-                raise HTTPException(status_code=400, detail="OCR功能未初始化，请先调用 /initialize 接口")
-            
-            if "ocr" not in service.enabled_features:
-                raise HTTPException(status_code=400, detail="OCR功能已禁用")
-            
-            # 解码base64图片
-            try:
-                image_data = base64.b64decode(request.image)
-            except Exception:
-                raise HTTPException(status_code=400, detail="图片base64解码失败")
-            
-            # 设置字符集范围
-            if request.charset_range is not None:
-                service.ocr_instance.set_ranges(request.charset_range)
-            
-            # 执行OCR识别
-            result = service.ocr_instance.classification(
-                image_data,
-                png_fix=request.png_fix,
-                probability=request.probability,
-                color_filter_colors=request.color_filter_colors,
-                color_filter_custom_ranges=request.color_filter_custom_ranges
-            )
-            
-            if request.probability:
-                response_data = OCRResponse(text=None, probability=result)
-            else:
-                response_data = OCRResponse(text=result, probability=None)
-            
-            return APIResponse(success=True, message="OCR识别成功", data=response_data.dict())
-            
-        except HTTPException:
-            raise
+            result = service.configure_shadow(request)
+            return APIResponse(success=True, message=result["message"], data=result)
         except Exception as e:
-            return APIResponse(success=False, message=f"OCR识别失败: {str(e)}")
+            return APIResponse(success=False, message=str(e))
+    
+    async def run_operation(name: str, request, http_request: Request, response: Response) -> APIResponse:
+        """
+        经操作注册表执行推理，并包装为统一的 APIResponse
+
+        请求头 X-Request-Timing（或 DDDDOCR_SERVER_TIMING）要求时，
+        附带 Server-Timing 响应头和/或响应体 timing 字段
+        """
+        operation = OPERATIONS[name]
+        timing_mode = service.tracer.timing_mode(http_request.headers.get("x-request-timing"))
+        with service.tracer.trace(name, force=timing_mode is not None) as trace:
+            try:
+                result = await dispatch(service, operation, request, http_request)
+                with span("serialize"):
+                    api_response = APIResponse(success=True, message=operation.success_message,
+                                               data=operation.respond(result))
+            except HTTPException:
+                raise
+            except Exception as e:
+                api_response = APIResponse(success=False, message=f"{operation.failure_message}: {str(e)}")
+            if timing_mode in ("body", "both"):
+                api_response.timing = trace.timing()
+            if timing_mode in ("header", "both"):
+                response.headers["Server-Timing"] = trace.server_timing()
+            return api_response
+    
+    @app.post("/ocr", response_model=APIResponse)
+    async def ocr_recognition(request: OCRRequest, http_request: Request, response: Response):
+        """执行OCR识别"""
+        return await run_operation("ocr", request, http_request, response)
     
     @app.post("/detect", response_model=APIResponse)
-    async def object_detection(request: DetectionRequest):
+    async def object_detection(request: DetectionRequest, http_request: Request, response: Response):
         """执行目标检测"""
-        try:
-            if not service.det_instance:
-                raise HTTPException(status_code=400, detail="目标检测功能未初始化，请先调用 /initialize 接口")
-            
-            if "detection" not in service.enabled_features:
-                raise HTTPException(status_code=400, detail="目标检测功能已禁用")
-            
-            # 解码base64图片
-            try:
-                image_data = base64.b64decode(request.image)
-            except Exception:
-                raise HTTPException(status_code=400, detail="图片base64解码失败")
-            
-            # 执行目标检测
-            bboxes = service.det_instance.detection(image_data)
-            
-            response_data = DetectionResponse(bboxes=bboxes)
-            return APIResponse(success=True, message="目标检测成功", data=response_data.dict())
-            
-        except HTTPException:
-            raise
-        except Exception as e:
-            return APIResponse(success=False, message=f"目标检测失败: {str(e)}")
+        return await run_operation("detect", request, http_request, response)
     
     @app.post("/slide-match", response_model=APIResponse)
-    async def slide_match(request: SlideMatchRequest):
+    async def slide_match(request: SlideMatchRequest, http_request: Request, response: Response):
         """滑块匹配"""
-        try:
-            if not service.slide_instance:
-                raise HTTPException(status_code=500, detail="滑块功能未初始化")
-            
-            # 解码base64图片
-            try:
-                target_data = base64.b64decode(request.target_image)
-                background_data = base64.b64decode(request.background_image)
-            except Exception:
-                raise HTTPException(status_code=400, detail="图片base64解码失败")
-            
-            # 执行滑块匹配
-            result = service.slide_instance.slide_match(
-                target_data, background_data, simple_target=request.simple_target
-            )
-            
-            response_data = SlideResponse(**result)
-            return APIResponse(success=True, message="滑块匹配成功", data=response_data.dict())
-            
-        except HTTPException:
-            raise
-        except Exception as e:
-            return APIResponse(success=False, message=f"滑块匹配失败: {str(e)}")
+        return await run_operation("slide_match", request, http_request, response)
     
     @app.post("/slide-comparison", response_model=APIResponse)
-    async def slide_comparison(request: SlideComparisonRequest):
+    async def slide_comparison(request: SlideComparisonRequest, http_request: Request, response: Response):
         """滑块比较"""
-        try:
-            if not service.slide_instance:
-                raise HTTPException(status_code=500, detail="滑块功能未初始化")
-            
-            # 解码base64图片
-            try:
-                target_data = base64.b64decode(request.target_image)
-                background_data = base64.b64decode(request.background_image)
-            except Exception:
-                raise HTTPException(status_code=400, detail="图片base64解码失败")
-            
-            # 执行滑块比较
-            result = service.slide_instance.slide_comparison(target_data, background_data)
-            
-            response_data = SlideResponse(**result)
-            return APIResponse(success=True, message="滑块比较成功", data=response_data.dict())
-            
-        except HTTPException:
-            raise
-        except Exception as e:
-            return APIResponse(success=False, message=f"滑块比较失败: {str(e)}")
+        return await run_operation("slide_comparison", request, http_request, response)
+    
+    @app.post("/slide-puzzle", response_model=APIResponse)
+    async def slide_puzzle(request: SlidePuzzleRequest, http_request: Request, response: Response):
+        """仅凭带坑位的图片求解滑块（从背景图库中查找完整背景）"""
+        return await run_operation("slide_puzzle", request, http_request, response)
     
     @app.get("/status", response_model=StatusResponse)
     async def get_status():
         """获取当前服务状态和已加载的模型信息"""
         return service.get_status()
     
+    @app.get("/metrics", dependencies=[Depends(require_admin)])
+    async def get_metrics():
+        """获取调度与推理相关的运行指标（含各客户端标识，仅限管理员）"""
+        return service.get_metrics()
+    
     @app.get("/health")
     async def health_check():
         """健康检查"""
@@ -0,0 +1,565 @@
+# coding=utf-8
+"""
+推理调度器
+优先级通道 + 客户端间加权公平排队(WFQ)，支持每客户端并发与速率配额、
+请求截止时间、基于排队时延的自适应降载(CoDel)、卡死推理的看门狗以及弹性并发
+"""
+
+import os
+import json
+import math
+import time
+import asyncio
+import ipaddress
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from fastapi import HTTPException, Request
+
+from .logs import log
+from .tracing import current_trace
+from .elastic import ElasticController
+
+
+# 优先级通道，按严格优先级从高到低调度
+PRIORITY_LANES = ["interactive", "default", "batch"]
+
+
+class InferenceTimeoutError(HTTPException):
+    """推理调用超过看门狗时限；请求合并的等待者不应重试同一输入"""
+
+    def __init__(self, timeout: float):
+        super().__init__(status_code=504, detail=f"推理超过 {timeout:g} 秒未完成，已放弃等待并重建推理线程池",
+                         headers={"X-Request-Shed": "inference-timeout"})
+
+
+def _env_number(name: str, default, cast):
+    """读取数值环境变量，未设置或为空时取默认值，无法解析时记录警告后取默认值"""
+    raw = os.getenv(name)
+    if raw is None or not raw.strip():
+        return default
+    try:
+        return cast(raw)
+    except ValueError:
+        log.warning("Config", f"Invalid {name}={raw!r}, using {default}")
+        return default
+
+
+def _env_int(name: str, default: int) -> int:
+    return _env_number(name, default, int)
+
+
+def _env_float(name: str, default: float) -> float:
+    return _env_number(name, default, float)
+
+
+def parse_networks(spec: str) -> List[Union[ipaddress.IPv4Network, ipaddress.IPv6Network]]:
+    """逗号分隔的IP或CIDR列表，无效项记录警告后忽略"""
+    networks = []
+    for item in (part.strip() for part in spec.split(",")):
+        if not item:
+            continue
+        try:
+            networks.append(ipaddress.ip_network(item, strict=False))
+        except ValueError:
+            log.warning("Scheduler", f"Invalid trusted proxy ignored: {item}")
+    return networks
+
+
+class ClientContext:
+    """一次请求的调用方身份与调度属性"""
+
+    def __init__(self, client_id: str, priority: str = "default", weight: float = 1.0,
+                 deadline: Optional[float] = None):
+        self.client_id = client_id
+        self.priority = priority if priority in PRIORITY_LANES else "default"
+        self.weight = weight if weight > 0 else 1.0
+        # 截止时间（Unix时间戳，秒）
+        self.deadline = deadline
+
+
+class _Job:
+    """排队中的推理任务"""
+
+    __slots__ = ("func", "args", "future", "client", "finish_tag", "enqueued_at", "started_at", "expiry_timer",
+                 "trace", "context", "watchdog", "timed_out")
+
+    def __init__(self, func: Callable, args: tuple, future: asyncio.Future, client: "_ClientState"):
+        self.func = func
+        self.args = args
+        self.future = future
+        self.client = client
+        self.finish_tag = 0.0
+        self.enqueued_at = time.monotonic()
+        self.started_at = 0.0
+        self.expiry_timer: Optional[asyncio.TimerHandle] = None
+        self.watchdog: Optional[asyncio.TimerHandle] = None
+        self.timed_out = False
+        # 被追踪的请求需将上下文带入线程池，使推理阶段的 span 归属到该请求
+        self.trace = current_trace()
+        self.context = contextvars.copy_context() if self.trace is not None else None
+
+
+class _ClientState:
+    """单个客户端的队列、配额与统计"""
+
+    def __init__(self, context: ClientContext, rate: float, burst: float):
+        self.client_id = context.client_id
+        self.priority = context.priority
+        self.weight = context.weight
+        self.queue: deque = deque()
+        self.inflight = 0
+        self.last_finish = 0.0
+        self.rate = rate
+        self.tokens = burst
+        self.burst = burst
+        self.refilled_at = time.monotonic()
+        self.completed = 0
+        self.rejected = 0
+        self.expired = 0
+        self.shed = 0
+        self.last_seen = time.monotonic()
+
+    def take_token(self) -> bool:
+        """令牌桶限速，rate<=0 表示不限速"""
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class InferenceScheduler:
+    """
+    推理调度器
+
+    所有推理调用经由 submit() 进入调度器，在事件循环线程上完成排队与分发，
+    实际计算在线程池中执行，不再阻塞事件循环。
+    """
+
+    def __init__(self, max_concurrency: int = 2, client_max_inflight: int = 0,
+                 client_max_queue: int = 64, client_rate: float = 0.0, client_burst: float = 0.0,
+                 client_policies: Optional[Dict[str, Dict[str, Any]]] = None,
+                 max_tracked_clients: int = 1024,
+                 trusted_proxies: Optional[List[Union[ipaddress.IPv4Network, ipaddress.IPv6Network]]] = None,
+                 codel_target_ms: float = 0.0, codel_interval_ms: float = 100.0,
+                 inference_timeout: float = 0.0):
+        # 当前并发上限（弹性并发启用时由控制器在最小值与 concurrency_ceiling 之间调整）
+        self.max_concurrency = max(1, max_concurrency)
+        self.concurrency_ceiling = self.max_concurrency
+        self.client_max_inflight = client_max_inflight
+        self.client_max_queue = client_max_queue
+        self.client_rate = client_rate
+        self.client_burst = client_burst or max(1.0, client_rate)
+        self.client_policies = client_policies or {}
+        self.max_tracked_clients = max_tracked_clients
+        # 只有来自这些地址的连接才采信 X-Forwarded-For
+        self.trusted_proxies = trusted_proxies or []
+
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency_ceiling,
+                                           thread_name_prefix="ddddocr-infer")
+        self._clients: Dict[str, _ClientState] = {}
+        self._lane_clients: Dict[str, List[_ClientState]] = {lane: [] for lane in PRIORITY_LANES}
+        self._lane_vtime: Dict[str, float] = {lane: 0.0 for lane in PRIORITY_LANES}
+        self._inflight = 0
+        self._queued = 0
+        self._rejected = 0
+        self._completed = 0
+        self._expired = 0
+        self._shed = 0
+
+        # CoDel 降载状态，target<=0 时关闭
+        self.codel_target = codel_target_ms / 1000.0
+        self.codel_interval = max(codel_interval_ms, 1.0) / 1000.0
+        self._first_above_time = 0.0
+        self._dropping = False
+        self._drop_next = 0.0
+        self._drop_count = 0
+        self._last_drop_count = 0
+
+        # 看门狗：推理超过时限时让请求失败并重建线程池，timeout<=0 时关闭
+        self.inference_timeout = inference_timeout
+        self._timed_out = 0
+        self._stuck = 0
+        self._executor_restarts = 0
+        # 事件回调 on_event(kind, **fields)，由服务注册（用于 /status 与工作进程回收）
+        self.on_event: Optional[Callable[..., None]] = None
+        # 弹性并发控制器，未启用时为空
+        self.elastic: Optional[ElasticController] = None
+
+    @classmethod
+    def from_env(cls) -> "InferenceScheduler":
+        """从环境变量构建调度器"""
+        policies = {}
+        raw_policies = os.getenv("DDDDOCR_CLIENT_POLICIES")
+        if raw_policies:
+            try:
+                policies = json.loads(raw_policies)
+            except ValueError:
+                log.warning("Scheduler", f"Invalid DDDDOCR_CLIENT_POLICIES, ignored: {raw_policies}")
+        scheduler = cls(
+            max_concurrency=_env_int("DDDDOCR_MAX_CONCURRENCY", min(4, os.cpu_count() or 1)),
+            client_max_inflight=_env_int("DDDDOCR_CLIENT_MAX_INFLIGHT", 0),
+            client_max_queue=_env_int("DDDDOCR_CLIENT_MAX_QUEUE", 64),
+            client_rate=_env_float("DDDDOCR_CLIENT_RATE", 0.0),
+            client_burst=_env_float("DDDDOCR_CLIENT_BURST", 0.0),
+            client_policies=policies,
+            trusted_proxies=parse_networks(os.getenv("DDDDOCR_TRUSTED_PROXIES", "")),
+            codel_target_ms=_env_float("DDDDOCR_CODEL_TARGET_MS", 0.0),
+            codel_interval_ms=_env_float("DDDDOCR_CODEL_INTERVAL_MS", 100.0),
+            inference_timeout=_env_float("DDDDOCR_INFERENCE_TIMEOUT", 0.0),
+        )
+        scheduler.elastic = ElasticController.from_env(scheduler)
+        if scheduler.elastic is not None:
+            scheduler.max_concurrency = scheduler.elastic.min_concurrency
+        return scheduler
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    @property
+    def completed(self) -> int:
+        return self._completed
+
+    def identify(self, request: Optional[Request], deadline: Optional[float] = None) -> ClientContext:
+        """
+        识别调用方：优先使用 AuthMiddleware 解析出的 JWT sub/iss 声明，否则使用客户端IP（见 client_address）。
+        优先级与权重依次取自 DDDDOCR_CLIENT_POLICIES 配置、JWT 声明、默认值。
+        截止时间取请求体 deadline 字段与 X-Request-Deadline 请求头中较早者。
+        """
+        if request is None:
+            return ClientContext("local", deadline=deadline)
+
+        header_deadline = request.headers.get("x-request-deadline")
+        if header_deadline:
+            try:
+                header_value = float(header_deadline)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="X-Request-Deadline 必须为Unix时间戳（秒）")
+            deadline = header_value if deadline is None else min(deadline, header_value)
+
+        claims = getattr(request.state, "auth_claims", None) or {}
+        subject = claims.get("sub") or claims.get("iss")
+        client_id = f"jwt:{subject}" if subject else f"ip:{self.client_address(request)}"
+
+        policy = self.client_policies.get(client_id, {})
+        priority = policy.get("priority") or claims.get("priority") or "default"
+        try:
+            weight = float(policy.get("weight") or claims.get("weight") or 1.0)
+        except (TypeError, ValueError):
+            weight = 1.0
+        return ClientContext(client_id, priority=priority, weight=weight, deadline=deadline)
+
+    def _is_trusted_proxy(self, address: str) -> bool:
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(ip in network for network in self.trusted_proxies)
+
+    def client_address(self, request: Request) -> str:
+        """
+        匿名客户端的调度键：TCP对端地址。
+        对端属于受信代理时才采信 X-Forwarded-For，从右向左取第一个非受信代理的地址，
+        否则任何客户端都能伪造该请求头来获得新的配额
+        """
+        peer = request.client.host if request.client else ""
+        if not self._is_trusted_proxy(peer):
+            return peer
+        forwarded_for = request.headers.get("x-forwarded-for")
+        if not forwarded_for:
+            return peer
+        hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+        for hop in reversed(hops):
+            if not self._is_trusted_proxy(hop):
+                return hop
+        return hops[0] if hops else peer
+
+    async def submit(self, func: Callable, *args, client: Optional[ClientContext] = None) -> Any:
+        """提交推理任务并等待结果"""
+        context = client or ClientContext("local")
+        state = self._get_client(context)
+        state.last_seen = time.monotonic()
+
+        # 先检查截止时间，已过期的请求不消耗配额
+        if context.deadline is not None and context.deadline <= time.time():
+            state.expired += 1
+            self._expired += 1
+            raise self._deadline_error()
+        if self.client_max_queue > 0 and len(state.queue) >= self.client_max_queue:
+            state.rejected += 1
+            self._rejected += 1
+            raise HTTPException(status_code=429, detail="客户端排队请求过多，请稍后重试",
+                                headers={"Retry-After": "1"})
+        if not state.take_token():
+            state.rejected += 1
+            self._rejected += 1
+            raise HTTPException(status_code=429, detail="客户端请求速率超出配额，请稍后重试",
+                                headers={"Retry-After": "1"})
+
+        loop = asyncio.get_running_loop()
+        job = _Job(func, args, loop.create_future(), state)
+
+        if context.deadline is not None:
+            remaining = context.deadline - time.time()
+            if remaining <= 0:
+                state.expired += 1
+                self._expired += 1
+                raise self._deadline_error()
+            # 截止时间到达时仍未开始执行的任务直接失败，不再等待分发
+            job.expiry_timer = loop.call_later(remaining, self._expire, job)
+
+        # WFQ: 虚拟完成时间 = max(通道虚拟时间, 该客户端上一任务完成时间) + 1/权重
+        start = max(self._lane_vtime[state.priority], state.last_finish)
+        job.finish_tag = start + 1.0 / state.weight
+        state.last_finish = job.finish_tag
+
+        if not state.queue:
+            self._lane_clients[state.priority].append(state)
+        state.queue.append(job)
+        self._queued += 1
+
+        self._pump()
+        return await job.future
+
+    @staticmethod
+    def _deadline_error() -> HTTPException:
+        return HTTPException(status_code=504, detail="请求已超过截止时间，未执行推理",
+                             headers={"X-Request-Shed": "deadline"})
+
+    @staticmethod
+    def _shed_error() -> HTTPException:
+        return HTTPException(status_code=503, detail="服务过载，请求已被降载，请重试其他实例",
+                             headers={"Retry-After": "1", "X-Request-Shed": "overload"})
+
+    def _expire(self, job: _Job):
+        """截止时间到达：任务若仍在排队则立即失败（出队时会被跳过）"""
+        job.expiry_timer = None
+        if not job.future.done():
+            job.client.expired += 1
+            self._expired += 1
+            job.future.set_exception(self._deadline_error())
+
+    def _codel_should_shed(self, sojourn: float, now: float) -> bool:
+        """
+        CoDel 控制律：排队时延持续一个 interval 高于 target 后进入丢弃状态，
+        丢弃间隔按 interval/sqrt(count) 递减，直至时延回落到 target 以下。
+        """
+        if self.codel_target <= 0:
+            return False
+
+        if sojourn < self.codel_target or self._queued == 0:
+            self._first_above_time = 0.0
+            ok_to_drop = False
+        elif self._first_above_time == 0.0:
+            self._first_above_time = now + self.codel_interval
+            ok_to_drop = False
+        else:
+            ok_to_drop = now >= self._first_above_time
+
+        if self._dropping:
+            if not ok_to_drop:
+                self._dropping = False
+                return False
+            if now >= self._drop_next:
+                self._drop_count += 1
+                self._drop_next = now + self.codel_interval / math.sqrt(self._drop_count)
+                return True
+            return False
+
+        if ok_to_drop:
+            self._dropping = True
+            # 最近刚退出丢弃状态时沿用之前的丢弃频率
+            delta = self._drop_count - self._last_drop_count
+            if delta > 1 and now - self._drop_next < 16 * self.codel_interval:
+                self._drop_count = delta
+            else:
+                self._drop_count = 1
+            self._last_drop_count = self._drop_count
+            self._drop_next = now + self.codel_interval / math.sqrt(self._drop_count)
+            return True
+        return False
+
+    def _get_client(self, context: ClientContext) -> _ClientState:
+        state = self._clients.get(context.client_id)
+        if state is None:
+            if len(self._clients) >= self.max_tracked_clients:
+                self._prune_idle_clients()
+            if len(self._clients) >= self.max_tracked_clients:
+                # 所有已跟踪客户端都有排队或执行中的任务：不再为新客户端建表，按过载降载
+                self._shed += 1
+                raise self._shed_error()
+            policy = self.client_policies.get(context.client_id, {})
+            state = _ClientState(
+                context,
+                rate=float(policy.get("rate", self.client_rate)),
+                burst=float(policy.get("burst", self.client_burst)),
+            )
+            self._clients[context.client_id] = state
+        elif state.priority != context.priority and not state.queue:
+            state.priority = context.priority
+        state.weight = context.weight
+        return state
+
+    def _prune_idle_clients(self):
+        idle = [s for s in self._clients.values() if not s.queue and s.inflight == 0]
+        idle.sort(key=lambda s: s.last_seen)
+        for state in idle[:max(1, len(idle) // 2)]:
+            del self._clients[state.client_id]
+
+    def _client_limit(self, state: _ClientState) -> int:
+        policy = self.client_policies.get(state.client_id, {})
+        return int(policy.get("max_inflight", self.client_max_inflight))
+
+    def _next_job(self) -> Optional[_Job]:
+        """按严格优先级选择通道，通道内选择虚拟完成时间最小的客户端队首任务"""
+        for lane in PRIORITY_LANES:
+            best: Optional[_ClientState] = None
+            for state in self._lane_clients[lane]:
+                limit = self._client_limit(state)
+                if limit > 0 and state.inflight >= limit:
+                    continue
+                if best is None or state.queue[0].finish_tag < best.queue[0].finish_tag:
+                    best = state
+            if best is None:
+                continue
+
+            job = best.queue.popleft()
+            self._queued -= 1
+            if not best.queue:
+                self._lane_clients[lane].remove(best)
+            self._lane_vtime[lane] = max(self._lane_vtime[lane], job.finish_tag - 1.0 / best.weight)
+            return job
+        return None
+
+    def _pump(self):
+        """在并发上限内分发排队任务（仅在事件循环线程中调用）"""
+        while self._inflight < self.max_concurrency:
+            job = self._next_job()
+            if job is None:
+                return
+            if job.expiry_timer is not None:
+                job.expiry_timer.cancel()
+                job.expiry_timer = None
+            if job.future.done():
+                # 调用方已取消（例如客户端断开）或已超过截止时间，直接丢弃
+                continue
+
+            now = time.monotonic()
+            if self._codel_should_shed(now - job.enqueued_at, now):
+                job.client.shed += 1
+                self._shed += 1
+                job.future.set_exception(self._shed_error())
+                continue
+
+            job.client.inflight += 1
+            self._inflight += 1
+            job.started_at = now
+            loop = job.future.get_loop()
+            if job.trace is not None:
+                started = time.perf_counter()
+                job.trace.add_span("queue", started - (now - job.enqueued_at), started)
+                task = loop.run_in_executor(self.executor, job.context.run, job.func, *job.args)
+            else:
+                task = loop.run_in_executor(self.executor, job.func, *job.args)
+            if self.inference_timeout > 0:
+                job.watchdog = loop.call_later(self.inference_timeout, self._on_stuck, job)
+            task.add_done_callback(lambda done, job=job: self._on_done(job, done))
+
+    def _on_stuck(self, job: _Job):
+        """
+        推理超时：释放并发名额并让请求失败。
+        卡住的线程无法被强制终止，改为以新线程池接替后续任务，旧线程池在任务结束后自行回收
+        """
+        job.watchdog = None
+        job.timed_out = True
+        job.client.inflight -= 1
+        self._inflight -= 1
+        self._timed_out += 1
+        self._stuck += 1
+        if not job.future.done():
+            job.future.set_exception(InferenceTimeoutError(self.inference_timeout))
+
+        stale = self.executor
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency_ceiling, thread_name_prefix="ddddocr-infer")
+        stale.shutdown(wait=False)
+        self._executor_restarts += 1
+        log.error("Scheduler", f"Inference exceeded {self.inference_timeout:g}s, executor restarted",
+                  client=job.client.client_id, stuck=self._stuck)
+        if self.on_event is not None:
+            self.on_event("inference_timeout", client=job.client.client_id,
+                          timeout_s=self.inference_timeout, stuck=self._stuck)
+        self._pump()
+
+    def _on_done(self, job: _Job, done: asyncio.Future):
+        if job.timed_out:
+            # 超时任务的名额已在看门狗中释放，这里只记录卡住的线程已返回
+            self._stuck -= 1
+            if not done.cancelled():
+                done.exception()
+            return
+        if job.watchdog is not None:
+            job.watchdog.cancel()
+            job.watchdog = None
+        job.client.inflight -= 1
+        job.client.completed += 1
+        self._inflight -= 1
+        self._completed += 1
+        if self.elastic is not None:
+            self.elastic.observe(job.started_at - job.enqueued_at, time.monotonic() - job.started_at)
+
+        if not job.future.done():
+            if done.cancelled():
+                job.future.cancel()
+            elif done.exception() is not None:
+                job.future.set_exception(done.exception())
+            else:
+                job.future.set_result(done.result())
+        self._pump()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """调度器指标：全局与每客户端的排队深度、并发与拒绝计数"""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "inflight": self._inflight,
+            "queued": self._queued,
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "expired": self._expired,
+            "shed": self._shed,
+            "codel": {
+                "enabled": self.codel_target > 0,
+                "target_ms": self.codel_target * 1000,
+                "interval_ms": self.codel_interval * 1000,
+                "dropping": self._dropping,
+            },
+            "watchdog": {
+                "inference_timeout_s": self.inference_timeout or None,
+                "timed_out": self._timed_out,
+                "stuck_threads": self._stuck,
+                "executor_restarts": self._executor_restarts,
+            },
+            "elastic": self.elastic.get_metrics() if self.elastic else None,
+            "lanes": {lane: sum(len(s.queue) for s in clients)
+                      for lane, clients in self._lane_clients.items()},
+            "clients": {
+                client_id: {
+                    "priority": state.priority,
+                    "weight": state.weight,
+                    "queue_depth": len(state.queue),
+                    "inflight": state.inflight,
+                    "completed": state.completed,
+                    "rejected": state.rejected,
+                    "expired": state.expired,
+                    "shed": state.shed,
+                }
+                for client_id, state in self._clients.items()
+            },
+        }
@@ -3,8 +3,10 @@
 FastAPI服务器实现
 """
 
+import os
 import time
 import base64
+import threading
 import traceback
 from typing import Optional, Dict, Any
 from contextlib import asynccontextmanager
@@ -12,11 +14,27 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse, HTMLResponse
 from fastapi.middleware.cors import CORSMiddleware
-import uvicorn
+from fastapi.middleware.gzip import GZipMiddleware
 
 from .models import *
 from .routes import create_routes
 from .mcp import MCPHandler
+from .admin import AdminHandler
+from .scheduler import InferenceScheduler, ClientContext
+from .singleflight import SingleFlight, make_flight_key
+from .ingest import BodyLimitMiddleware
+from .engine import OCRRunner
+from .cascade import CascadeStats, should_escalate
+from .shadow import ShadowEvaluator, resolve_dump_dir, timed
+from .prefork import memory_usage, model_path_for
+from .providers import DEFAULT_PROFILE, select_provider, validate_choice
+from .tracing import TraceRecorder, annotate, span
+from .logs import RequestLogger, log
+from .lifecycle import WorkerLifecycle
+from .profiling import SamplingProfiler
+from .backgrounds import BackgroundIndex
+from .cache import ResultCache, model_fingerprint
+from . import frames
 
 
 class DDDDOCRService:
@@ -24,11 +42,81 @@ class DDDDOCRService:
     
     def __init__(self):
         self.ocr_instance = None
+        # 级联模式下的重模型（低置信度时使用）
+        self.cascade_instance = None
+        self.cascade_stats = CascadeStats()
+        # 影子流量评估（候选模型）
+        self.shadow: Optional[ShadowEvaluator] = None
+        # 请求追踪与采样分析（管理接口）
+        self.tracer = TraceRecorder.from_env()
+        self.profiler = SamplingProfiler()
+        # 请求日志与审计日志（后台线程写出）
+        self.request_logger = RequestLogger.from_env()
         self.det_instance = None
         self.slide_instance = None
+        # 已知滑块背景图库（仅凭带坑位的图片求解）
+        self.backgrounds = BackgroundIndex.from_env()
+        # 各模型的ONNX执行配置（按模型角色 'ocr'、'cascade'、'det'）
+        self._provider_choices: Dict[str, str] = {}
+        self.execution_providers: Dict[str, Dict[str, Any]] = {}
         self.enabled_features = set()
         self.start_time = time.time()
         self.version = "1.6.0"
+        self.scheduler = InferenceScheduler.from_env()
+        # 工作进程回收与推理看门狗事件
+        self.lifecycle = WorkerLifecycle.from_env()
+        self.scheduler.on_event = self.lifecycle.on_scheduler_event
+        if self.scheduler.elastic is not None and os.getenv("DDDDOCR_ELASTIC_INTRA_OP", "true").lower() == "true":
+            self.scheduler.elastic.on_resize = self.resize_intra_op
+        self._resize_lock = threading.Lock()
+        # 是否以预派生模式运行（由 main 在 fork 前设置），决定重建的会话是否需要 fork 安全
+        self.prefork = False
+        self.flights = SingleFlight()
+        # 结果缓存（共享内存在 fork 前创建，由工作进程共享）与各操作的模型指纹
+        self.cache = ResultCache.from_env()
+        self.model_versions: Dict[str, Optional[str]] = {}
+        # 模型代数，每次加载/切换模型后递增，用于区分不同模型的结果
+        self.model_generation = 0
+        # set_ranges 会修改OCR实例的共享状态，回退路径中需与识别调用串行
+        self._ocr_lock = threading.Lock()
+        self._runners: Dict[int, OCRRunner] = {}
+
+    def _runner_for(self, instance) -> Optional[OCRRunner]:
+        """获取OCR实例对应的推理执行器（实例切换后自动重建）"""
+        if instance is None:
+            return None
+        runner = self._runners.get(id(instance))
+        if runner is None or runner.instance is not instance:
+            if len(self._runners) >= 8:
+                self._runners.clear()
+            runner = OCRRunner(instance)
+            self._runners[id(instance)] = runner
+        return runner
+
+    @property
+    def ocr_runner(self) -> Optional[OCRRunner]:
+        """主OCR模型的推理执行器"""
+        return self._runner_for(self.ocr_instance)
+
+    @property
+    def cascade_runner(self) -> Optional[OCRRunner]:
+        """级联重模型的推理执行器"""
+        return self._runner_for(self.cascade_instance)
+
+    @staticmethod
+    def _create_ocr_instance(model_type: str, use_gpu: bool = False, device_id: int = 0,
+                             import_onnx_path: str = "", charsets_path: str = ""):
+        """按模型类型 ('ocr', 'ocr_old', 'ocr_beta') 创建OCR实例"""
+        import ddddocr
+
+        if model_type not in ("ocr", "ocr_old", "ocr_beta"):
+            raise ValueError(f"不支持的OCR模型类型: {model_type}")
+        return ddddocr.DdddOcr(
+            ocr=True, det=False,
+            old=model_type == "ocr_old", beta=model_type == "ocr_beta",
+            use_gpu=use_gpu, device_id=device_id, show_ad=False,
+            import_onnx_path=import_onnx_path, charsets_path=charsets_path
+        )
     
     def initialize(self, config: InitializeRequest) -> Dict[str, Any]:
         """初始化服务"""
@@ -36,8 +124,12 @@ class DDDDOCRService:
             # 动态导入ddddocr以避免循环导入
             import ddddocr
             
+            for choice in [config.execution_provider, *(config.execution_providers or {}).values()]:
+                validate_choice(choice)
+
             # 清理现有实例
             self.ocr_instance = None
+            self.cascade_instance = None
             self.det_instance = None
             self.slide_instance = None
             self.enabled_features.clear()
@@ -56,6 +148,16 @@ class DDDDOCRService:
                     charsets_path=config.charsets_path
                 )
                 self.enabled_features.add("ocr")
+                
+                # 级联重模型
+                if config.cascade_model or config.cascade_onnx_path:
+                    self.cascade_instance = self._create_ocr_instance(
+                        config.cascade_model or "ocr",
+                        use_gpu=config.use_gpu,
+                        device_id=config.device_id,
+                        import_onnx_path=config.cascade_onnx_path,
+                        charsets_path=config.cascade_charsets_path
+                    )
             
             if config.det:
                 self.det_instance = ddddocr.DdddOcr(
@@ -70,9 +172,19 @@ class DDDDOCRService:
             # 滑块功能总是可用
             self.slide_instance = ddddocr.DdddOcr(ocr=False, det=False, show_ad=False)
             self.enabled_features.add("slide")
+            self.backgrounds.preload()
+
+            self._provider_choices = dict.fromkeys(("ocr", "cascade", "det"), config.execution_provider)
+            self._provider_choices.update(config.execution_providers or {})
+            self.execution_providers = {}
+            for role in ("ocr", "cascade", "det"):
+                self._select_provider(role)
+            self.model_generation += 1
+            self._refresh_model_versions()
             
             return {
                 "loaded_models": list(self.enabled_features),
+                "cascade_enabled": self.cascade_instance is not None,
                 "message": "服务初始化成功"
             }
             
@@ -110,15 +222,94 @@ class DDDDOCRService:
                 self.enabled_features.add("detection")
             else:
                 raise ValueError(f"不支持的模型类型: {config.model_type}")
+            if config.model_type != "det" and self.cascade_instance is not None:
+                # 级联重模型是针对原快速模型配置的，切换主模型后不再成立，需经 /initialize 重新配置
+                self.cascade_instance = None
+                self.cascade_stats = CascadeStats()
+                log.info("Cascade", "Cascade disabled after switching the primary OCR model",
+                         model_type=config.model_type)
+            self._select_provider("det" if config.model_type == "det" else "ocr")
+            self.model_generation += 1
+            self._refresh_model_versions()
             
             return {
                 "model_type": config.model_type,
+                "cascade_enabled": self.cascade_instance is not None,
                 "message": f"模型 {config.model_type} 切换成功"
             }
             
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"模型切换失败: {str(e)}")
     
+    def _refresh_model_versions(self):
+        """计算各模型的指纹（结果缓存键的一部分，跨实例一致）"""
+        import ddddocr
+
+        if self.cache is None:
+            return
+        self.model_versions = {
+            "ocr": model_fingerprint(self.ocr_instance),
+            "cascade": model_fingerprint(self.cascade_instance),
+            "det": model_fingerprint(self.det_instance),
+            "slide": f"ddddocr-{ddddocr.__version__}",
+        }
+
+    def _cache_key(self, operation: str, images: tuple, options: Dict[str, Any]) -> Optional[str]:
+        """结果缓存键，模型指纹未知时返回 None（不缓存）"""
+        if operation == "ocr":
+            model = self.model_versions.get("ocr")
+            if model and options.get("cascade"):
+                model = f"{model}+{self.model_versions.get('cascade')}"
+        elif operation == "detect":
+            model = self.model_versions.get("det")
+        else:
+            model = self.model_versions.get("slide")
+        if not model:
+            return None
+        return make_flight_key(operation, images, dict(options, model=model))
+
+    def _select_provider(self, role: str):
+        """按初始化时的配置为模型选择ONNX执行配置（'auto' 时测速选择）"""
+        instance = {"ocr": self.ocr_instance, "cascade": self.cascade_instance, "det": self.det_instance}[role]
+        engine = getattr(instance, "ocr_engine", None) or getattr(instance, "detection_engine", None)
+        path = model_path_for(instance) if instance is not None else None
+        if engine is None or getattr(engine, "session", None) is None or not path:
+            self.execution_providers.pop(role, None)
+            return
+        threads = os.getenv("DDDDOCR_INTRA_OP_THREADS")
+        report = select_provider(engine, path, self._provider_choices.get(role, DEFAULT_PROFILE),
+                                 intra_op_threads=int(threads) if threads else None)
+        self.execution_providers[role] = report
+        if report["requested"] != DEFAULT_PROFILE:
+            log.info("Providers", f"{role} model uses execution provider {report['profile']}",
+                     requested=report["requested"])
+
+    def resize_intra_op(self, threads: int):
+        """在后台线程中以新的算子内线程数重建已加载模型的ONNX会话（沿用各自的执行配置），完成后原子替换"""
+        threading.Thread(target=self._rebuild_sessions, args=(threads,), name="ddddocr-resize", daemon=True).start()
+
+    def _rebuild_sessions(self, threads: int):
+        from .providers import create_session
+
+        # 连续调整时只保留最后一次，避免重复重建
+        with self._resize_lock:
+            elastic = self.scheduler.elastic
+            if elastic is not None and elastic.intra_op_threads != threads:
+                return
+            started = time.perf_counter()
+            for instance in (self.ocr_instance, self.cascade_instance, self.det_instance):
+                engine = getattr(instance, "ocr_engine", None) or getattr(instance, "detection_engine", None)
+                path = model_path_for(instance) if instance is not None else None
+                if engine is None or getattr(engine, "session", None) is None or not path:
+                    continue
+                try:
+                    engine.session = create_session(path, getattr(engine, "execution_provider", DEFAULT_PROFILE),
+                                                    threads, fork_safe=self.prefork)
+                except Exception as e:
+                    log.error("Elastic", f"Failed to rebuild session for {path}: {e}")
+            log.info("Elastic", f"ONNX intra-op threads set to {threads}",
+                     seconds=round(time.perf_counter() - started, 3))
+
     def toggle_feature(self, config: ToggleFeatureRequest) -> Dict[str, Any]:
         """开启/关闭功能"""
         if config.enabled:
@@ -134,11 +325,338 @@ class DDDDOCRService:
             "message": message
         }
     
+    def configure_shadow(self, config: ShadowConfigRequest) -> Dict[str, Any]:
+        """配置影子流量评估：加载候选模型并替换现有评估器"""
+        try:
+            previous = self.shadow
+            if not config.enabled:
+                self.shadow = None
+                if previous:
+                    previous.shutdown()
+                return {"enabled": False, "message": "影子评估已停止"}
+
+            dump_dir = resolve_dump_dir(config.dump_dir)
+            candidates = {}
+            description = {}
+            if config.model_type or config.import_onnx_path:
+                candidate = self._create_ocr_instance(
+                    config.model_type or "ocr",
+                    import_onnx_path=config.import_onnx_path,
+                    charsets_path=config.charsets_path
+                )
+                runner = OCRRunner(candidate)
+                candidates["ocr"] = lambda image_data, request: self._run_candidate_ocr(runner, image_data, request)
+                description["ocr"] = config.import_onnx_path or config.model_type
+
+            if config.det_onnx_path:
+                import ddddocr
+                import onnxruntime
+
+                candidate = ddddocr.DdddOcr(ocr=False, det=True, show_ad=False)
+                candidate.detection_engine.session = onnxruntime.InferenceSession(
+                    config.det_onnx_path, providers=["CPUExecutionProvider"]
+                )
+                candidates["detect"] = lambda image_data, request: candidate.detection(image_data)
+                description["detect"] = config.det_onnx_path
+
+            if not candidates:
+                raise ValueError("未指定候选模型（model_type、import_onnx_path 或 det_onnx_path）")
+
+            self.shadow = ShadowEvaluator(
+                candidates,
+                sample_rate=config.sample_rate,
+                dump_dir=dump_dir,
+                iou_threshold=config.iou_threshold,
+                description=description
+            )
+            if previous:
+                previous.shutdown()
+            return {
+                "enabled": True,
+                "operations": list(candidates),
+                "sample_rate": config.sample_rate,
+                "message": "影子评估已启用"
+            }
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"影子评估配置失败: {str(e)}")
+
+    def _run_candidate_ocr(self, runner: OCRRunner, image_data: bytes, request: OCRRequest) -> str:
+        """候选OCR模型识别，按与主请求相同的参数返回文本"""
+        if request.frame_mode == "vote":
+            frame_list = frames.load_frames(image_data, request.max_frames)
+            if runner.native and len(frame_list) > 1:
+                index, _, _, decodings, _ = self._infer_frames(runner, frame_list, request)
+                return decodings[index].text
+            image_data = frame_list[0]
+        elif request.frame_mode in frames.PROJECTIONS:
+            image_data = frames.project(frames.load_frames(image_data, request.max_frames), request.frame_mode)
+        if not runner.native:
+            return runner.instance.classification(image_data, png_fix=request.png_fix)
+        _, decoded, _ = self._infer_ocr(runner, image_data, request)
+        return decoded.text
+
+    async def submit(self, func, *args, client: Optional[ClientContext] = None):
+        """将推理调用交给调度器执行"""
+        return await self.scheduler.submit(func, *args, client=client)
+
+    async def _coalesced(self, operation: str, images: tuple, options: Dict[str, Any],
+                         func, *args, client: Optional[ClientContext] = None):
+        """相同输入的并发请求合并为一次推理；启用结果缓存时先查缓存（在合并内查询，并发请求只查一次）"""
+        key = make_flight_key(operation, images, dict(options, model_generation=self.model_generation))
+        cache = self.cache
+        # 影子采样的结果附带本次耗时，不缓存
+        cache_key = self._cache_key(operation, images, options) if cache and not options.get("shadow") else None
+        if cache_key is None:
+            return await self.flights.do(key, lambda: self.submit(func, *args, client=client))
+
+        async def lookup_or_infer():
+            with span("cache"):
+                hit, result = await cache.get(cache_key)
+            annotate(cache="hit" if hit else "miss")
+            if hit:
+                return result
+            result = await self.submit(func, *args, client=client)
+            if result is not None:
+                cache.put(cache_key, result)
+            return result
+
+        return await self.flights.do(key, lookup_or_infer)
+
+    async def ocr(self, image_data: bytes, request: OCRRequest, client: Optional[ClientContext] = None):
+        """OCR识别（经请求合并与调度器）"""
+        options = request.model_dump(exclude={"image", "deadline"})
+        shadow = self.shadow
+        if shadow is None or not shadow.sample("ocr"):
+            return await self._coalesced("ocr", (image_data,), options,
+                                         self.run_ocr, image_data, request, client=client)
+
+        # 采样到的请求额外记录主模型耗时，响应后再镜像给候选模型
+        result, seconds = await self._coalesced("ocr", (image_data,), dict(options, shadow=True),
+                                                timed, self.run_ocr, image_data, request, client=client)
+        shadow.mirror("ocr", image_data, request, result, seconds)
+        return result
+
+    async def detect(self, image_data: bytes, client: Optional[ClientContext] = None):
+        """目标检测（经请求合并与调度器）"""
+        shadow = self.shadow
+        if shadow is None or not shadow.sample("detect"):
+            return await self._coalesced("detect", (image_data,), {},
+                                         self.run_detection, image_data, client=client)
+
+        result, seconds = await self._coalesced("detect", (image_data,), {"shadow": True},
+                                                timed, self.run_detection, image_data, client=client)
+        shadow.mirror("detect", image_data, None, result, seconds)
+        return result
+
+    async def slide_match(self, target_data: bytes, background_data: bytes, simple_target: bool = False,
+                          client: Optional[ClientContext] = None):
+        """滑块匹配（经请求合并与调度器）"""
+        return await self._coalesced("slide_match", (target_data, background_data),
+                                     {"simple_target": simple_target},
+                                     self.run_slide_match, target_data, background_data, simple_target,
+                                     client=client)
+
+    async def slide_comparison(self, target_data: bytes, background_data: bytes,
+                               client: Optional[ClientContext] = None):
+        """滑块比较（经请求合并与调度器）"""
+        return await self._coalesced("slide_comparison", (target_data, background_data), {},
+                                     self.run_slide_comparison, target_data, background_data,
+                                     client=client)
+
+    async def slide_puzzle(self, target_data: bytes, client: Optional[ClientContext] = None):
+        """仅凭带坑位的图片求解滑块（经请求合并与调度器）"""
+        result = await self._coalesced("slide_puzzle", (target_data,), {},
+                                       self.run_slide_puzzle, target_data, client=client)
+        if result is None:
+            raise HTTPException(status_code=404, detail="背景图库中没有匹配的背景，请改用 /slide-comparison")
+        return result
+
+
+    def run_ocr(self, image_data: bytes, request: OCRRequest):
+        """
+        执行OCR识别（同步，在推理线程池中运行）
+
+        Returns:
+            未请求概率时返回识别文本；请求概率时返回按 probability_format 组织的概率信息字典
+        """
+        if request.frame_mode != "first":
+            return self._run_ocr_frames(image_data, request)
+        return self._run_ocr_image(image_data, request)
+
+    def _run_ocr_frames(self, image_data: bytes, request: OCRRequest):
+        """多帧图片识别：投影合并为一张图，或逐帧识别后投票"""
+        with span("preprocess"):
+            frame_list = frames.load_frames(image_data, request.max_frames)
+            annotate(frames=len(frame_list))
+            if request.frame_mode in frames.PROJECTIONS:
+                merged = frames.project(frame_list, request.frame_mode)
+        if request.frame_mode in frames.PROJECTIONS:
+            return self._run_ocr_image(merged, request)
+        if len(frame_list) == 1:
+            return self._run_ocr_image(frame_list[0], request)
+
+        runner = self.ocr_runner
+        if runner is None or not runner.native:
+            results = [self._run_ocr_legacy(frame, request) for frame in frame_list]
+            index, votes = frames.vote([
+                (result, 1.0) if isinstance(result, str) else (result.get("text", ""), result.get("confidence") or 0.0)
+                for result in results
+            ], frames.frame_weights(frame_list))
+            result = results[index]
+        else:
+            index, votes, outputs, decodings, valid_mask = self._infer_frames(runner, frame_list, request)
+            result = self._format_ocr(runner, outputs[index], decodings[index], valid_mask, request)
+        if isinstance(result, dict):
+            result["frames"] = {"count": len(frame_list), "selected": index, "votes": votes}
+        return result
+
+    def _infer_frames(self, runner: OCRRunner, frame_list, request: OCRRequest):
+        """各帧一并推理并解码，返回 (胜出帧序号, 票数, 各帧输出, 各帧解码结果, 字符集掩码)"""
+        from . import decoding
+
+        with span("preprocess"):
+            tensors = [
+                runner.preprocess(runner.load_image(frame, request.color_filter_colors,
+                                                    request.color_filter_custom_ranges), request.png_fix)
+                for frame in frame_list
+            ]
+        with span("inference"):
+            outputs = runner.infer_batch(tensors)
+        with span("postprocess"):
+            valid_mask = runner.valid_mask(request.charset_range)
+            decodings = [decoding.ctc_greedy_decode(output, runner.charset, valid_mask) for output in outputs]
+            index, votes = frames.vote([(item.text, item.sequence_confidence()) for item in decodings],
+                                       frames.frame_weights(frame_list))
+        return index, votes, outputs, decodings, valid_mask
+
+    def _run_ocr_image(self, image_data, request: OCRRequest):
+        """单张图片识别（image_data 为图片字节或已解码的 PIL 图片）"""
+        runner = self.ocr_runner
+        if runner is None or not runner.native:
+            return self._run_ocr_legacy(image_data, request)
+
+        cascade_runner = self.cascade_runner if request.cascade else None
+        if cascade_runner is not None and cascade_runner.native:
+            return self._run_ocr_cascade(runner, cascade_runner, image_data, request)
+
+        output, decoded, valid_mask = self._infer_ocr(runner, image_data, request)
+        return self._format_ocr(runner, output, decoded, valid_mask, request)
+
+    @staticmethod
+    def _infer_ocr(runner: OCRRunner, image_data: bytes, request: OCRRequest):
+        """运行模型并完成CTC解码"""
+        from . import decoding
+
+        with span("preprocess"):
+            image = runner.load_image(image_data, request.color_filter_colors,
+                                      request.color_filter_custom_ranges)
+            tensor = runner.preprocess(image, request.png_fix, pooled=True)
+        with span("inference"):
+            output = runner.infer(tensor, pooled=True)
+        with span("postprocess"):
+            valid_mask = runner.valid_mask(request.charset_range)
+            decoded = decoding.ctc_greedy_decode(output, runner.charset, valid_mask)
+        return output, decoded, valid_mask
+
+    @staticmethod
+    def _format_ocr(runner: OCRRunner, output, decoded, valid_mask, request: OCRRequest):
+        """按请求的概率格式组织识别结果"""
+        from . import decoding
+
+        if not request.probability:
+            return decoded.text
+        with span("postprocess"):
+            if request.probability_format == "full":
+                return decoding.full_probability(output, decoded, runner.charset)
+            if request.probability_format == "float16":
+                return decoding.packed_probability(decoded, runner.charset)
+            return decoding.topk_probability(decoded, runner.charset, request.top_k, valid_mask)
+
+    def _run_ocr_cascade(self, fast: OCRRunner, heavy: OCRRunner, image_data: bytes, request: OCRRequest):
+        """级联识别：快速模型置信度不足或长度不符时升级到重模型"""
+        started = time.perf_counter()
+        output, decoded, valid_mask = self._infer_ocr(fast, image_data, request)
+        fast_seconds = time.perf_counter() - started
+
+        escalate = should_escalate(decoded.text, decoded.sequence_confidence(),
+                                   request.cascade_threshold, request.expected_length)
+        annotate(cascade_escalated=escalate)
+        if not escalate:
+            self.cascade_stats.record(fast_seconds, None)
+            result = self._format_ocr(fast, output, decoded, valid_mask, request)
+        else:
+            started = time.perf_counter()
+            output, decoded, valid_mask = self._infer_ocr(heavy, image_data, request)
+            self.cascade_stats.record(fast_seconds, time.perf_counter() - started)
+            result = self._format_ocr(heavy, output, decoded, valid_mask, request)
+
+        if isinstance(result, dict):
+            result["escalated"] = escalate
+        return result
+
+    def _run_ocr_legacy(self, image_data: bytes, request: OCRRequest):
+        """通过 ddddocr classification() 识别（OCR实例结构不支持直接推理时使用）"""
+        options = dict(
+            png_fix=request.png_fix,
+            probability=request.probability,
+            color_filter_colors=request.color_filter_colors,
+            color_filter_custom_ranges=request.color_filter_custom_ranges
+        )
+        with span("inference"):
+            if request.charset_range is not None:
+                with self._ocr_lock:
+                    self.ocr_instance.set_ranges(request.charset_range)
+                    return self.ocr_instance.classification(image_data, **options)
+            return self.ocr_instance.classification(image_data, **options)
+
+    def run_detection(self, image_data: bytes):
+        """执行目标检测（同步）"""
+        with span("inference"):
+            return self.det_instance.detection(image_data)
+
+    def run_slide_match(self, target_data: bytes, background_data: bytes, simple_target: bool = False):
+        """执行滑块匹配（同步）"""
+        with span("inference"):
+            return self.slide_instance.slide_match(target_data, background_data, simple_target=simple_target)
+
+    def run_slide_comparison(self, target_data: bytes, background_data: bytes):
+        """执行滑块比较（同步）"""
+        with span("inference"):
+            result = self.slide_instance.slide_comparison(target_data, background_data)
+        if self.backgrounds.learn and result.get("target") != [0, 0]:
+            # 比较成功说明背景图完整，收录到背景图库
+            try:
+                self.backgrounds.add(background_data)
+            except Exception as e:
+                log.warning("SlideIndex", f"Failed to index background: {e}")
+        return result
+
+    def run_slide_puzzle(self, target_data: bytes):
+        """在背景图库中查找匹配背景并执行滑块比较（同步），未找到时返回 None"""
+        with span("inference"):
+            return self.backgrounds.solve(self.slide_instance.slide_engine, target_data)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取服务运行指标"""
+        return {
+            "scheduler": self.scheduler.get_metrics(),
+            "coalescing": self.flights.get_metrics(),
+            "cascade": self.cascade_stats.get_metrics(),
+            "shadow": self.shadow.get_metrics() if self.shadow else None,
+            "process": memory_usage(),
+            "tracing": self.tracer.get_metrics(),
+            "slide_index": self.backgrounds.get_metrics(),
+            "cache": self.cache.get_metrics() if self.cache else None,
+            "logging": dict(self.request_logger.get_metrics(), service=log.writer.get_metrics())
+        }
+
     def get_status(self) -> StatusResponse:
         """获取服务状态"""
         loaded_models = []
         if self.ocr_instance:
             loaded_models.append("ocr")
+        if self.cascade_instance:
+            loaded_models.append("ocr_cascade")
         if self.det_instance:
             loaded_models.append("detection")
         if self.slide_instance:
@@ -149,7 +667,10 @@ class DDDDOCRService:
             loaded_models=loaded_models,
             enabled_features=list(self.enabled_features),
             version=self.version,
-            uptime=time.time() - self.start_time
+            uptime=time.time() - self.start_time,
+            shadow=self.shadow.get_metrics() if self.shadow else None,
+            lifecycle=self.lifecycle.get_status(),
+            execution_providers=self.execution_providers or None
         )
 
 
@@ -161,14 +682,22 @@ service = DDDDOCRService()
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
     # 启动时初始化
-    print("DDDDOCR API服务启动中...")
+    log.info("Server", "DDDDOCR API服务启动中...")
     yield
     # 关闭时清理
-    print("DDDDOCR API服务关闭中...")
+    log.info("Server", "DDDDOCR API服务关闭中...")
+    service.request_logger.flush()
+    log.writer.flush()
+
 
+def create_app(gzip_min_size: Optional[int] = None) -> FastAPI:
+    """
+    创建FastAPI应用
 
-def create_app() -> FastAPI:
-    """创建FastAPI应用"""
+    Args:
+        gzip_min_size: 响应体超过该字节数时启用gzip压缩（如完整概率分布），
+            0 表示关闭，None 表示读取 DDDDOCR_GZIP_MIN_SIZE 环境变量（默认 4096）
+    """
     app = FastAPI(
         title="DDDDOCR API",
         description="带带弟弟OCR通用验证码识别API服务",
@@ -178,6 +707,9 @@ def create_app() -> FastAPI:
         lifespan=lifespan
     )
     
+    # 请求体大小限制与图片预检（后添加的中间件在外层，先添加使其位于 CORS 之内，413/400 响应也带 CORS 头）
+    app.add_middleware(BodyLimitMiddleware)
+
     # 添加CORS中间件
     app.add_middleware(
         CORSMiddleware,
@@ -187,6 +719,12 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
     
+    # 大响应压缩
+    if gzip_min_size is None:
+        gzip_min_size = int(os.getenv("DDDDOCR_GZIP_MIN_SIZE", 4096))
+    if gzip_min_size > 0:
+        app.add_middleware(GZipMiddleware, minimum_size=gzip_min_size)
+    
     # 添加路由
     create_routes(app, service)
     
@@ -194,13 +732,19 @@ def create_app() -> FastAPI:
     mcp_handler = MCPHandler(service)
     app.include_router(mcp_handler.router, prefix="/mcp", tags=["MCP"])
     
+    # 添加管理接口（采样分析与请求追踪）
+    admin_handler = AdminHandler(service)
+    app.include_router(admin_handler.router, prefix="/admin", tags=["Admin"])
+    
     return app
 
 
 def run_server(host: str = "0.0.0.0", port: int = 8000, **kwargs):
     """运行服务器"""
+    import uvicorn
+
     app = create_app()
-    print(f"DDDDOCR API服务启动在 http://{host}:{port}")
-    print(f"API文档地址: http://{host}:{port}/docs")
-    print(f"MCP协议地址: http://{host}:{port}/mcp")
+    log.info("Server", f"DDDDOCR API服务启动在 http://{host}:{port}")
+    log.info("Server", f"API文档地址: http://{host}:{port}/docs")
+    log.info("Server", f"MCP协议地址: http://{host}:{port}/mcp")
     uvicorn.run(app, host=host, port=port, **kwargs)
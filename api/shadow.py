@@ -0,0 +1,273 @@
+# coding=utf-8
+"""
+影子流量评估
+按采样率将线上 /ocr、/detect 请求异步镜像给候选模型，
+在低优先级的独立线程中运行，不影响主请求的响应，
+统计延迟分布与结果不一致率，并将不一致样本落盘供人工复核
+"""
+
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from .ingest import sniff_image_header
+from .logs import log
+
+
+def timed(func, *args):
+    """执行函数并返回 (结果, 耗时秒数)"""
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def _lower_thread_priority():
+    """降低影子线程的调度优先级（Linux 下 nice 值按线程生效）"""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (AttributeError, OSError):
+        pass
+
+
+def resolve_dump_dir(name: Optional[str], root: Optional[str] = None) -> Optional[str]:
+    """
+    不一致样本的落盘目录：只能是服务端配置的根目录（DDDDOCR_SHADOW_DUMP_DIR）下的子目录，
+    客户端传入的名称不能借助绝对路径、.. 或符号链接写到根目录之外
+
+    Returns:
+        解析后的绝对路径；name 为空时返回 None（不落盘）
+    """
+    if not name:
+        return None
+    root = root if root is not None else os.getenv("DDDDOCR_SHADOW_DUMP_DIR", "")
+    if not root:
+        raise ValueError("服务端未配置 DDDDOCR_SHADOW_DUMP_DIR，不能落盘不一致样本")
+    root = os.path.realpath(root)
+    directory = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, directory]) != root:
+        raise ValueError(f"落盘目录必须位于 DDDDOCR_SHADOW_DUMP_DIR 之内: {name}")
+    return directory
+
+
+def bbox_iou(a: List[int], b: List[int]) -> float:
+    """两个 [x1, y1, x2, y2] 框的交并比"""
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def match_bboxes(primary: List[List[int]], candidate: List[List[int]], iou_threshold: float):
+    """
+    按IoU贪心匹配两组检测框
+
+    Returns:
+        (是否一致, 已匹配框的平均IoU)
+    """
+    pairs = sorted(
+        ((bbox_iou(p, c), i, j) for i, p in enumerate(primary) for j, c in enumerate(candidate)),
+        reverse=True
+    )
+    used_p, used_c, ious = set(), set(), []
+    for iou, i, j in pairs:
+        if iou < iou_threshold:
+            break
+        if i in used_p or j in used_c:
+            continue
+        used_p.add(i)
+        used_c.add(j)
+        ious.append(iou)
+    agree = len(ious) == len(primary) == len(candidate)
+    mean_iou = sum(ious) / len(ious) if ious else (1.0 if not primary and not candidate else 0.0)
+    return agree, mean_iou
+
+
+class LatencyRecorder:
+    """最近若干次耗时的分布统计"""
+
+    def __init__(self, size: int = 2048):
+        self._samples = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        samples = sorted(self._samples)
+        if not samples:
+            return {"count": 0, "mean_ms": None, "p50_ms": None, "p90_ms": None, "p99_ms": None}
+
+        def pct(q):
+            return samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+
+        return {
+            "count": len(samples),
+            "mean_ms": sum(samples) / len(samples) * 1000,
+            "p50_ms": pct(0.5),
+            "p90_ms": pct(0.9),
+            "p99_ms": pct(0.99),
+        }
+
+
+class _OperationStats:
+    """单个操作的影子评估统计"""
+
+    def __init__(self):
+        self.mirrored = 0
+        self.dropped = 0
+        self.errors = 0
+        self.compared = 0
+        self.disagreements = 0
+        self.iou_total = 0.0
+        self.primary_latency = LatencyRecorder()
+        self.candidate_latency = LatencyRecorder()
+
+
+class ShadowEvaluator:
+    """
+    影子模型评估器
+
+    Args:
+        candidates: 操作名 ('ocr', 'detect') 到候选模型调用的映射，
+            调用签名为 func(image_data, request) -> 结果
+        sample_rate: 镜像采样率 (0~1)
+        dump_dir: 不一致样本的落盘目录（已由 resolve_dump_dir 校验），None 表示不落盘
+        iou_threshold: 检测框视为一致的最小IoU
+        max_pending: 影子队列上限，超出时直接丢弃镜像
+        max_dumps: 最多落盘的样本数
+    """
+
+    def __init__(self, candidates: Dict[str, Callable], sample_rate: float = 0.05,
+                 dump_dir: Optional[str] = None, iou_threshold: float = 0.5,
+                 max_pending: int = 32, max_dumps: int = 1000, description: Optional[Dict[str, Any]] = None):
+        self.candidates = candidates
+        self.sample_rate = sample_rate
+        self.dump_dir = dump_dir
+        self.iou_threshold = iou_threshold
+        self.max_pending = max_pending
+        self.max_dumps = max_dumps
+        self.description = description or {}
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ddddocr-shadow",
+                                           initializer=_lower_thread_priority)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._dumps = 0
+        self._stats = {operation: _OperationStats() for operation in candidates}
+
+    def sample(self, operation: str) -> bool:
+        """当前请求是否需要镜像给候选模型"""
+        return operation in self.candidates and random.random() < self.sample_rate
+
+    def mirror(self, operation: str, image_data: bytes, request: Any, primary_result: Any,
+               primary_seconds: float):
+        """异步提交一次影子评估（不等待结果）"""
+        stats = self._stats[operation]
+        with self._lock:
+            if self._pending >= self.max_pending:
+                stats.dropped += 1
+                return
+            self._pending += 1
+            stats.mirrored += 1
+        stats.primary_latency.add(primary_seconds)
+        try:
+            self.executor.submit(self._evaluate, operation, image_data, request, primary_result)
+        except RuntimeError:
+            # 评估器已关闭
+            with self._lock:
+                self._pending -= 1
+
+    def _evaluate(self, operation: str, image_data: bytes, request: Any, primary_result: Any):
+        stats = self._stats[operation]
+        try:
+            candidate_result, seconds = timed(self.candidates[operation], image_data, request)
+            stats.candidate_latency.add(seconds)
+
+            if operation == "detect":
+                agree, mean_iou = match_bboxes(primary_result, candidate_result, self.iou_threshold)
+            else:
+                primary_text = primary_result.get("text") if isinstance(primary_result, dict) else primary_result
+                agree, mean_iou = primary_text == candidate_result, None
+
+            with self._lock:
+                stats.compared += 1
+                if mean_iou is not None:
+                    stats.iou_total += mean_iou
+                if not agree:
+                    stats.disagreements += 1
+
+            if not agree:
+                self._dump(operation, image_data, request, primary_result, candidate_result)
+        except Exception as e:
+            with self._lock:
+                stats.errors += 1
+            log.error("Shadow", f"影子评估失败 ({operation}): {str(e)}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _dump(self, operation: str, image_data: bytes, request: Any, primary_result: Any, candidate_result: Any):
+        """将不一致样本（图片与双方结果）写入 dump_dir/<operation>/"""
+        if not self.dump_dir:
+            return
+        with self._lock:
+            if self._dumps >= self.max_dumps:
+                return
+            self._dumps += 1
+            index = self._dumps
+
+        directory = os.path.join(self.dump_dir, operation)
+        os.makedirs(directory, exist_ok=True)
+        header = sniff_image_header(image_data)
+        extension = header[0].lower() if header else "bin"
+        name = f"{int(time.time() * 1000)}_{index:05d}_{hashlib.sha256(image_data).hexdigest()[:12]}"
+
+        with open(os.path.join(directory, f"{name}.{extension}"), "wb") as f:
+            f.write(image_data)
+        record = {
+            "operation": operation,
+            "time": time.time(),
+            "primary": primary_result,
+            "candidate": candidate_result,
+            "options": request.model_dump(exclude={"image"}) if hasattr(request, "model_dump") else None,
+        }
+        with open(os.path.join(directory, f"{name}.json"), "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False, default=str)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """影子评估统计"""
+        operations = {}
+        with self._lock:
+            pending, dumps = self._pending, self._dumps
+            for operation, stats in self._stats.items():
+                operations[operation] = {
+                    "mirrored": stats.mirrored,
+                    "dropped": stats.dropped,
+                    "errors": stats.errors,
+                    "compared": stats.compared,
+                    "disagreements": stats.disagreements,
+                    "disagreement_rate": stats.disagreements / stats.compared if stats.compared else None,
+                }
+                if operation == "detect":
+                    operations[operation]["mean_iou"] = stats.iou_total / stats.compared if stats.compared else None
+        for operation, stats in self._stats.items():
+            operations[operation]["primary_latency"] = stats.primary_latency.summary()
+            operations[operation]["candidate_latency"] = stats.candidate_latency.summary()
+
+        return {
+            "candidate": self.description,
+            "sample_rate": self.sample_rate,
+            "pending": pending,
+            "dumped": dumps,
+            "dump_dir": self.dump_dir,
+            "operations": operations,
+        }
+
+    def shutdown(self):
+        """停止影子评估（丢弃尚未开始的任务）"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,92 @@
+# coding=utf-8
+"""
+请求合并 (single-flight)
+相同图片与相同识别参数的并发请求共享同一次推理
+"""
+
+import json
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict
+
+from fastapi import HTTPException
+
+from .scheduler import InferenceTimeoutError
+from .tracing import annotate, span
+
+
+def make_flight_key(operation: str, images: tuple, options: Dict[str, Any]) -> str:
+    """根据操作名、图片摘要与影响结果的参数生成合并键"""
+    digest = hashlib.sha256()
+    digest.update(operation.encode())
+    for image in images:
+        digest.update(hashlib.sha256(image).digest())
+    digest.update(json.dumps(options, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+class SingleFlight:
+    """进行中请求的合并器"""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # 每个进行中计算共享结果的请求数
+        self._sizes: Dict[str, list] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.fallbacks = 0
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        执行或加入一次计算。
+
+        首个请求创建计算任务，后续相同键的请求等待同一任务的结果。
+        计算以独立任务运行，发起方断开不会影响其他等待者。
+        若发起方因调度层原因被拒绝（配额、截止时间、降载），
+        等待者按自身的调度属性重新提交，而不是继承发起方的拒绝。
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            size = self._sizes[key]
+            size[0] += 1
+            try:
+                with span("coalesced_wait"):
+                    result = await asyncio.shield(task)
+            except InferenceTimeoutError:
+                # 同一输入已让推理卡死，等待者不再重试
+                raise
+            except HTTPException:
+                self.fallbacks += 1
+                annotate(batch_size=1, coalesced=False)
+                return await factory()
+            annotate(batch_size=size[0], coalesced=True)
+            return result
+
+        task = asyncio.ensure_future(factory())
+        size = [1]
+        self._inflight[key] = task
+        self._sizes[key] = size
+        self.leaders += 1
+        task.add_done_callback(lambda done: self._finish(key, done))
+        result = await asyncio.shield(task)
+        annotate(batch_size=size[0], coalesced=False)
+        return result
+
+    def _finish(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        self._sizes.pop(key, None)
+        # 所有等待者都已取消时，避免未读取异常的告警
+        if not task.cancelled():
+            task.exception()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """合并统计"""
+        total = self.leaders + self.coalesced
+        return {
+            "inflight": len(self._inflight),
+            "executed": self.leaders,
+            "coalesced": self.coalesced,
+            "fallbacks": self.fallbacks,
+            "coalesced_ratio": self.coalesced / total if total else 0.0,
+        }
@@ -0,0 +1,250 @@
+# coding=utf-8
+"""
+请求级链路追踪
+按采样率为推理请求记录各阶段耗时（decode / queue / preprocess / inference / postprocess / serialize），
+保存在内存环形缓冲区中，可按耗时查询最慢的请求；
+也可按请求返回各阶段耗时（Server-Timing 响应头或响应体中的 timing 字段）。
+
+当前请求的追踪对象通过 contextvar 传递；未采样的请求 span() 直接返回共享的空上下文，
+关闭追踪时的额外开销仅为一次 contextvar 读取。
+"""
+
+import os
+import time
+import random
+import threading
+import itertools
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("ddddocr_trace", default=None)
+
+# 耗时明细的返回方式：header 为 Server-Timing 响应头，body 为响应体 timing 字段
+TIMING_MODES = ("header", "body", "both")
+
+
+class _NoopSpan:
+    """未采样时使用的空上下文"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("trace", "name", "started")
+
+    def __init__(self, trace: "Trace", name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.trace.add_span(self.name, self.started, time.perf_counter())
+        return False
+
+
+class Trace:
+    """一次请求的追踪记录"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, operation: str):
+        self.id = next(self._ids)
+        self.operation = operation
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.spans: List[tuple] = []
+        self.attributes: Dict[str, Any] = {}
+
+    def add_span(self, name: str, started: float, finished: float):
+        """记录一个阶段（perf_counter 时间）"""
+        self.spans.append((name, started, finished))
+
+    @property
+    def duration(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    def stage_durations(self) -> Dict[str, float]:
+        """按阶段名汇总耗时（毫秒），同名阶段累加"""
+        durations: Dict[str, float] = {}
+        for name, started, finished in self.spans:
+            durations[name] = durations.get(name, 0.0) + (finished - started) * 1000
+        return durations
+
+    def timing(self) -> Dict[str, Any]:
+        """响应中的耗时明细：各阶段耗时与模型、合并批大小等属性"""
+        timing = {f"{name}_ms": round(ms, 3) for name, ms in self.stage_durations().items()}
+        timing["total_ms"] = round(self.duration * 1000, 3)
+        timing.update(self.attributes)
+        return timing
+
+    def server_timing(self) -> str:
+        """Server-Timing 响应头的值"""
+        metrics = [f"{name};dur={ms:.3f}" for name, ms in self.stage_durations().items()]
+        metrics.append(f"total;dur={self.duration * 1000:.3f}")
+        if "model" in self.attributes:
+            metrics.append(f'model;desc="{self.attributes["model"]}"')
+        if "model_generation" in self.attributes:
+            metrics.append(f'generation;desc="{self.attributes["model_generation"]}"')
+        if "batch_size" in self.attributes:
+            metrics.append(f'batch;desc="{self.attributes["batch_size"]}"')
+        return ", ".join(metrics)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "operation": self.operation,
+            "start": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3),
+            "spans": [
+                {
+                    "name": name,
+                    "start_ms": round((started - self.started) * 1000, 3),
+                    "duration_ms": round((finished - started) * 1000, 3),
+                }
+                for name, started, finished in self.spans
+            ],
+            "attributes": self.attributes,
+        }
+
+
+def current_trace() -> Optional[Trace]:
+    """当前请求的追踪对象（未采样时为 None）"""
+    return _current_trace.get()
+
+
+def span(name: str):
+    """记录当前请求的一个阶段，未采样时为空操作"""
+    trace = _current_trace.get()
+    if trace is None:
+        return _NOOP
+    return _Span(trace, name)
+
+
+def annotate(**attributes):
+    """为当前请求的追踪附加属性，未采样时为空操作"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attributes.update(attributes)
+
+
+class _TraceScope:
+    """trace() 返回的上下文：进入时绑定追踪对象，退出时写入环形缓冲区"""
+
+    __slots__ = ("recorder", "trace", "sampled", "token")
+
+    def __init__(self, recorder: "TraceRecorder", trace: Trace, sampled: bool):
+        self.recorder = recorder
+        self.trace = trace
+        self.sampled = sampled
+
+    def __enter__(self) -> Trace:
+        self.token = _current_trace.set(self.trace)
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_trace.reset(self.token)
+        self.trace.finished = time.perf_counter()
+        if exc_type is not None:
+            self.trace.attributes["error"] = exc_type.__name__
+        if self.sampled:
+            self.recorder.record(self.trace)
+        return False
+
+
+class TraceRecorder:
+    """
+    追踪采样与环形缓冲区
+
+    Args:
+        sample_rate: 采样率 (0~1)，0 表示关闭
+        capacity: 环形缓冲区保留的追踪条数
+        timing: 默认的耗时明细返回方式 (header / body / both)，None 表示仅在请求头
+            X-Request-Timing 要求时返回
+    """
+
+    def __init__(self, sample_rate: float = 0.0, capacity: int = 1000, timing: Optional[str] = None):
+        self.sample_rate = sample_rate
+        self.timing = timing if timing in TIMING_MODES else None
+        self._buffer: deque = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "TraceRecorder":
+        return cls(
+            sample_rate=float(os.getenv("DDDDOCR_TRACE_SAMPLE_RATE", 0)),
+            capacity=int(os.getenv("DDDDOCR_TRACE_CAPACITY", 1000)),
+            timing=os.getenv("DDDDOCR_SERVER_TIMING", "").lower() or None,
+        )
+
+    @property
+    def capacity(self) -> int:
+        return self._buffer.maxlen
+
+    def configure(self, sample_rate: Optional[float] = None, capacity: Optional[int] = None):
+        """调整采样率与缓冲区大小（调整大小时保留最近的记录）"""
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if capacity is not None and capacity != self._buffer.maxlen:
+            with self._lock:
+                self._buffer = deque(self._buffer, maxlen=capacity)
+
+    def timing_mode(self, requested: Optional[str]) -> Optional[str]:
+        """
+        解析请求的耗时明细返回方式
+
+        Args:
+            requested: 请求头 X-Request-Timing 的值，"1"/"true" 等同 both，"0"/"false"/"off" 表示关闭
+        """
+        if requested is None:
+            return self.timing
+        requested = requested.strip().lower()
+        if requested in TIMING_MODES:
+            return requested
+        if requested in ("1", "true", "yes", "on"):
+            return "both"
+        return None
+
+    def trace(self, operation: str, force: bool = False):
+        """
+        按采样率开始一次请求追踪，未采样时返回空上下文
+
+        Args:
+            force: 未采样时也创建追踪（用于返回耗时明细），但不写入环形缓冲区
+        """
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not sampled and not force:
+            return _NOOP
+        return _TraceScope(self, Trace(operation), sampled)
+
+    def record(self, trace: Trace):
+        with self._lock:
+            self._buffer.append(trace)
+
+    def slowest(self, limit: int = 10, operation: Optional[str] = None) -> List[Dict[str, Any]]:
+        """按总耗时降序返回最慢的追踪记录"""
+        with self._lock:
+            traces = [t for t in self._buffer if operation is None or t.operation == operation]
+        traces.sort(key=lambda t: t.duration, reverse=True)
+        return [t.to_dict() for t in traces[:limit]]
+
+    def clear(self):
+        with self._lock:
+            self._buffer.clear()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {"sample_rate": self.sample_rate, "capacity": self.capacity, "recorded": len(self._buffer),
+                "timing": self.timing}
@@ -0,0 +1,223 @@
+# coding=utf-8
+"""
+主机自动调优
+在本机上以不同的 工作进程数 × ONNX算子内线程数 × 每进程并发推理数 组合
+对已加载的 ddddocr 模型做闭环压测，给出吞吐量/延迟前沿并选出最佳配置。
+每个工作进程与 `main.py api --workers N` 一样各自持有一份模型，
+推理走与HTTP接口及离线批量识别相同的路径
+"""
+
+import io
+import os
+import time
+import random
+import string
+import statistics
+import itertools
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+from .bulk import iter_input, _init_worker, _solve, _read_image
+
+
+def synthetic_corpus(count: int = 64, seed: int = 0) -> List[bytes]:
+    """生成类验证码的合成图片（随机字符、干扰线与噪点）"""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    images = []
+    for _ in range(count):
+        width, height = rng.choice([(100, 36), (120, 40), (160, 60)])
+        image = Image.new("RGB", (width, height), tuple(rng.randint(200, 255) for _ in range(3)))
+        draw = ImageDraw.Draw(image)
+        text = "".join(rng.choice(string.ascii_lowercase + string.digits) for _ in range(rng.randint(4, 6)))
+        x = rng.randint(2, 10)
+        for char in text:
+            draw.text((x, rng.randint(0, height // 3)), char, fill=tuple(rng.randint(0, 120) for _ in range(3)))
+            x += (width - 16) // len(text)
+        for _ in range(3):
+            draw.line([(rng.randint(0, width), rng.randint(0, height)) for _ in range(2)],
+                      fill=tuple(rng.randint(0, 200) for _ in range(3)))
+        for _ in range(width):
+            draw.point((rng.randint(0, width - 1), rng.randint(0, height - 1)),
+                       fill=tuple(rng.randint(0, 255) for _ in range(3)))
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        images.append(buffer.getvalue())
+    return images
+
+
+def load_corpus(path: str, limit: int = 64) -> List[bytes]:
+    """从图片目录、tar 归档或 JSONL 清单读取至多 limit 张图片（单图字段）"""
+    images = []
+    for _, fields in iter_input(path):
+        if "image" in fields:
+            images.append(_read_image(fields["image"]))
+        if len(images) >= limit:
+            break
+    if not images:
+        raise ValueError(f"语料中没有可用的图片: {path}")
+    return images
+
+
+def _percentile(samples: Sequence[float], q: float) -> Optional[float]:
+    if not samples:
+        return None
+    return round(samples[min(len(samples) - 1, int(q * len(samples)))], 3)
+
+
+def _bench_worker(init_config: Dict[str, Any], operation: str, threads: int, concurrency: int,
+                  images: List[bytes], duration: float, barrier, results):
+    """压测工作进程：加载模型、预热后与其他进程同时开始闭环压测"""
+    try:
+        _init_worker(init_config, operation, {}, threads)
+        for index, image in enumerate(images[:8]):
+            _solve(f"warmup-{index}", {"image": image})
+        barrier.wait()
+    except Exception as e:
+        barrier.abort()
+        results.put({"error": str(e)})
+        return
+
+    stop_at = time.perf_counter() + duration
+
+    def loop(offset: int):
+        latencies, errors, index = [], 0, offset
+        while time.perf_counter() < stop_at:
+            record = _solve(str(index), {"image": images[index % len(images)]})
+            if "error" in record:
+                errors += 1
+            else:
+                latencies.append(record["elapsed_ms"])
+            index += concurrency
+        return latencies, errors
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(loop, range(concurrency)))
+    results.put({
+        "latencies": [latency for latencies, _ in outcomes for latency in latencies],
+        "errors": sum(errors for _, errors in outcomes),
+    })
+
+
+def benchmark(images: List[bytes], workers: int, threads: int, concurrency: int,
+              operation: str = "ocr", init_config: Optional[Dict[str, Any]] = None,
+              duration: float = 5.0, startup_timeout: float = 120.0) -> Dict[str, Any]:
+    """
+    在一组参数下压测
+
+    Returns:
+        吞吐量（张/秒）与延迟分位数（毫秒）
+    """
+    init_config = dict(init_config or {})
+    init_config.setdefault("ocr", operation == "ocr")
+    init_config.setdefault("det", operation == "detect")
+
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+    barrier = context.Barrier(workers + 1)
+    results = context.Queue()
+    processes = [
+        context.Process(target=_bench_worker, daemon=True,
+                        args=(init_config, operation, threads, concurrency, images, duration, barrier, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    outcome: Dict[str, Any] = {"workers": workers, "threads": threads, "concurrency": concurrency}
+    try:
+        # 所有进程加载模型并预热完成后同时开始计时
+        barrier.wait(timeout=startup_timeout)
+        started = time.perf_counter()
+        reports = [results.get(timeout=duration + startup_timeout) for _ in processes]
+        elapsed = max(time.perf_counter() - started, duration)
+    except Exception as e:
+        try:
+            outcome["error"] = results.get(timeout=1)["error"]
+        except Exception:
+            outcome["error"] = f"压测进程启动失败: {e!r}"
+        return outcome
+    finally:
+        for process in processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+
+    failed = [report["error"] for report in reports if "error" in report]
+    if failed:
+        outcome["error"] = failed[0]
+        return outcome
+
+    latencies = sorted(latency for report in reports for latency in report["latencies"])
+    outcome.update({
+        "completed": len(latencies),
+        "errors": sum(report["errors"] for report in reports),
+        "throughput": round(len(latencies) / elapsed, 2),
+        "mean_ms": round(statistics.fmean(latencies), 3) if latencies else None,
+        "p50_ms": _percentile(latencies, 0.5),
+        "p95_ms": _percentile(latencies, 0.95),
+        "p99_ms": _percentile(latencies, 0.99),
+    })
+    return outcome
+
+
+def default_grid(cpu_count: Optional[int] = None) -> Dict[str, List[int]]:
+    """按核数生成默认的参数网格"""
+    cpus = cpu_count or os.cpu_count() or 1
+    workers = sorted({1, max(1, cpus // 2), cpus})
+    threads = sorted({1, min(2, cpus)})
+    return {"workers": workers, "threads": threads, "concurrency": [1, 2, 4]}
+
+
+def pareto_frontier(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """吞吐量/p95 延迟前沿：不存在吞吐量更高且延迟更低的其他配置"""
+    frontier, best_p95 = [], float("inf")
+    for result in sorted(results, key=lambda r: (-r["throughput"], r["p95_ms"])):
+        if result["p95_ms"] < best_p95:
+            frontier.append(result)
+            best_p95 = result["p95_ms"]
+    return frontier
+
+
+def choose_best(results: List[Dict[str, Any]], max_p95_ms: Optional[float] = None,
+                tolerance: float = 0.05) -> Optional[Dict[str, Any]]:
+    """
+    选出最佳配置：满足延迟上限的配置中吞吐量最高者；
+    吞吐量与最高值相差不超过 tolerance 的配置中，取 p95 延迟最低、占用资源最少的一个
+    """
+    eligible = [r for r in results if max_p95_ms is None or r["p95_ms"] <= max_p95_ms]
+    if not eligible:
+        return None
+    top = max(r["throughput"] for r in eligible)
+    close = [r for r in eligible if r["throughput"] >= top * (1 - tolerance)]
+    return min(close, key=lambda r: (r["p95_ms"], r["workers"] * r["threads"], r["concurrency"]))
+
+
+def tune(images: List[bytes], workers: Sequence[int], threads: Sequence[int], concurrency: Sequence[int],
+         operation: str = "ocr", init_config: Optional[Dict[str, Any]] = None, duration: float = 5.0,
+         max_p95_ms: Optional[float] = None, progress=None) -> Dict[str, Any]:
+    """
+    遍历参数网格压测并选出最佳配置
+
+    Args:
+        progress: 每完成一组参数后调用 progress(result)
+
+    Returns:
+        {"results": 全部结果, "frontier": 吞吐量/延迟前沿, "best": 最佳配置或 None}
+    """
+    results = []
+    for worker_count, thread_count, concurrency_count in itertools.product(workers, threads, concurrency):
+        result = benchmark(images, worker_count, thread_count, concurrency_count,
+                           operation=operation, init_config=init_config, duration=duration)
+        results.append(result)
+        if progress:
+            progress(result)
+
+    succeeded = [r for r in results if "error" not in r and r["completed"]]
+    return {
+        "results": results,
+        "frontier": pareto_frontier(succeeded),
+        "best": choose_best(succeeded, max_p95_ms),
+    }
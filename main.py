@@ -11,11 +11,34 @@ import sys
 import json
 import argparse
 from pathlib import Path
-import uvicorn
 
-# 导入我们自己的服务和中间件
-from api.middleware import AuthMiddleware
-from api.server import create_app, service, InitializeRequest
+# uvicorn、FastAPI、ddddocr 等重依赖在各命令中按需导入，
+# version/colors/example 等辅助命令无需加载它们
+
+# 服务器调优预设，可通过 --preset 或配置文件中的 "preset" 选择
+# 取值优先级: 命令行 > 环境变量 > 配置文件 > 预设 > 默认值
+SERVER_PRESETS = {
+    "default": {},
+    "high-throughput": {
+        "http": "httptools",
+        "loop": "uvloop",
+        "timeout_keep_alive": 75,
+        "backlog": 4096,
+        "access_log": False,
+        "gzip_min_size": 1024,
+    },
+}
+
+# 调优参数: (配置键, 环境变量, 类型, 默认值)
+SERVER_TUNING_OPTIONS = [
+    ("timeout_keep_alive", "DDDDOCR_KEEP_ALIVE_TIMEOUT", int, 5),
+    ("backlog", "DDDDOCR_BACKLOG", int, 2048),
+    ("limit_concurrency", "DDDDOCR_LIMIT_CONCURRENCY", int, None),
+    ("http", "DDDDOCR_HTTP_IMPL", str, "auto"),
+    ("loop", "DDDDOCR_LOOP_IMPL", str, "auto"),
+    ("access_log", "DDDDOCR_ACCESS_LOG", lambda v: str(v).lower() == "true", True),
+    ("gzip_min_size", "DDDDOCR_GZIP_MIN_SIZE", int, 4096),
+]
 
 def main():
     """主入口函数，负责解析命令行参数"""
@@ -30,12 +53,80 @@ def main():
     api_parser = subparsers.add_parser("api", help="启动HTTP API服务")
     api_parser.add_argument("--host", help="服务器主机地址 (将被 DDDDOCR_LISTEN_ADDRESS 覆盖)")
     api_parser.add_argument("--port", type=int, help="服务器端口 (将被 DDDDOCR_LISTEN_ADDRESS 覆盖)")
-    api_parser.add_argument("--workers", type=int, default=1, help="工作进程数 (默认: 1)")
+    api_parser.add_argument("--workers", type=int, help="工作进程数 (默认: 配置文件中的 workers 或 1)")
     api_parser.add_argument("--reload", action="store_true", help="启用自动重载 (开发模式)")
     api_parser.add_argument("--config", help="配置文件路径 (JSON格式)")
     api_parser.add_argument("--log-level", default="info", 
                            choices=["critical", "error", "warning", "info", "debug", "trace"],
                            help="日志级别 (默认: info)")
+    api_parser.add_argument("--preset", choices=list(SERVER_PRESETS.keys()),
+                           help="服务器调优预设 (default / high-throughput)")
+    api_parser.add_argument("--timeout-keep-alive", type=int, help="HTTP keep-alive 超时秒数 (默认: 5)")
+    api_parser.add_argument("--backlog", type=int, help="监听队列长度 (默认: 2048)")
+    api_parser.add_argument("--limit-concurrency", type=int, help="最大并发连接数，超出返回503 (默认: 不限制)")
+    api_parser.add_argument("--http", choices=["auto", "h11", "httptools"], help="HTTP协议实现 (默认: auto)")
+    api_parser.add_argument("--loop", choices=["auto", "asyncio", "uvloop"], help="事件循环实现 (默认: auto)")
+    api_parser.add_argument("--gzip-min-size", type=int, help="响应体超过该字节数时启用gzip压缩，0为关闭 (默认: 4096)")
+    api_parser.add_argument("--no-access-log", dest="access_log", action="store_const", const=False,
+                           help="关闭uvicorn访问日志")
+
+    # 离线批量识别
+    solve_parser = subparsers.add_parser("solve", help="离线批量识别目录、tar 归档或 JSONL 清单")
+    solve_parser.add_argument("input", help="图片目录、tar 归档或 JSONL 清单")
+    solve_parser.add_argument("-o", "--output", required=True, help="结果 JSONL 文件")
+    solve_parser.add_argument("--operation", default="ocr",
+                              choices=["ocr", "detect", "slide_match", "slide_comparison"],
+                              help="执行的操作 (默认: ocr)")
+    solve_parser.add_argument("--options", default="{}",
+                              help='识别参数 JSON，ocr 时与 /ocr 请求字段一致，如 \'{"png_fix": true}\'')
+    solve_parser.add_argument("--workers", type=int, help="进程数 (默认: CPU 核数)")
+    solve_parser.add_argument("--threads", type=int, default=1, help="每个进程的ONNX算子内线程数 (默认: 1)")
+    solve_parser.add_argument("--old", action="store_true", help="使用旧版OCR模型")
+    solve_parser.add_argument("--beta", action="store_true", help="使用beta版OCR模型")
+    solve_parser.add_argument("--import-onnx-path", default="", help="自定义ONNX模型路径")
+    solve_parser.add_argument("--charsets-path", default="", help="自定义字符集路径")
+    solve_parser.add_argument("--no-resume", dest="resume", action="store_false",
+                              help="不跳过已完成的样本，覆盖输出文件")
+    solve_parser.add_argument("--progress-interval", type=float, default=5, help="进度输出间隔秒数 (默认: 5)")
+
+    # 主机自动调优
+    tune_parser = subparsers.add_parser("tune", help="在本机压测不同的进程/线程/并发组合并写入最佳配置")
+    tune_parser.add_argument("--config", default="config.json",
+                             help="写入最佳配置的JSON配置文件，即 api --config 读取的文件 (默认: config.json)")
+    tune_parser.add_argument("--corpus", help="压测语料：图片目录、tar 归档或 JSONL 清单 (默认: 合成验证码)")
+    tune_parser.add_argument("--samples", type=int, default=64, help="语料图片数 (默认: 64)")
+    tune_parser.add_argument("--operation", default="ocr", choices=["ocr", "detect"], help="压测的操作 (默认: ocr)")
+    tune_parser.add_argument("--workers", help="工作进程数候选，逗号分隔 (默认: 1、核数/2、核数)")
+    tune_parser.add_argument("--threads", help="每进程ONNX算子内线程数候选，逗号分隔 (默认: 1,2)")
+    tune_parser.add_argument("--concurrency", help="每进程并发推理数候选，逗号分隔 (默认: 1,2,4)")
+    tune_parser.add_argument("--duration", type=float, default=5, help="每组参数的压测秒数 (默认: 5)")
+    tune_parser.add_argument("--max-p95-ms", type=float, help="p95 延迟上限，超出的配置不参与选择")
+    tune_parser.add_argument("--old", action="store_true", help="使用旧版OCR模型")
+    tune_parser.add_argument("--beta", action="store_true", help="使用beta版OCR模型")
+    tune_parser.add_argument("--import-onnx-path", default="", help="自定义ONNX模型路径")
+    tune_parser.add_argument("--charsets-path", default="", help="自定义字符集路径")
+    tune_parser.add_argument("--dry-run", action="store_true", help="只输出结果，不写入配置文件")
+
+    # 冷启动基准
+    bench_parser = subparsers.add_parser("startup-bench", help="测量冷启动耗时并检查启动预算")
+    bench_parser.add_argument("--repeat", type=int, default=3, help="重复次数，取中位数 (默认: 3)")
+    bench_parser.add_argument("--budget-ms", type=float,
+                              default=float(os.getenv("DDDDOCR_STARTUP_BUDGET_MS", 10000)),
+                              help="服务就绪耗时预算，毫秒 (默认: 10000，环境变量 DDDDOCR_STARTUP_BUDGET_MS)")
+    bench_parser.add_argument("--cli-budget-ms", type=float,
+                              default=float(os.getenv("DDDDOCR_CLI_BUDGET_MS", 500)),
+                              help="轻量命令 (version) 耗时预算，毫秒 (默认: 500，环境变量 DDDDOCR_CLI_BUDGET_MS)")
+    bench_parser.add_argument("--timeout", type=float, default=60, help="等待服务就绪的超时秒数 (默认: 60)")
+    bench_parser.add_argument("--json", action="store_true", help="以JSON格式输出结果")
+
+    # 图片摄取基准
+    ingest_parser = subparsers.add_parser("ingest-bench", help="对比默认与低拷贝图片摄取路径的耗时与内存分配")
+    ingest_parser.add_argument("--corpus", help="语料：图片目录、tar 归档或 JSONL 清单 (默认: 合成验证码)")
+    ingest_parser.add_argument("--samples", type=int, default=16, help="语料图片数 (默认: 16)")
+    ingest_parser.add_argument("--repeat", type=int, default=200, help="每条路径的计时次数 (默认: 200)")
+    ingest_parser.add_argument("--old", action="store_true", help="使用旧版OCR模型")
+    ingest_parser.add_argument("--beta", action="store_true", help="使用beta版OCR模型")
+    ingest_parser.add_argument("--json", action="store_true", help="以JSON格式输出结果")
 
     # 其他辅助命令
     subparsers.add_parser("colors", help="显示可用的颜色过滤器预设")
@@ -46,6 +137,14 @@ def main():
     
     if args.command == "api":
         start_api_server(args)
+    elif args.command == "solve":
+        sys.exit(run_solve(args))
+    elif args.command == "tune":
+        sys.exit(run_tune(args))
+    elif args.command == "startup-bench":
+        sys.exit(run_startup_bench(args))
+    elif args.command == "ingest-bench":
+        sys.exit(run_ingest_bench(args))
     elif args.command == "colors":
         show_color_presets()
     elif args.command == "version":
@@ -57,6 +156,8 @@ def main():
 
 def start_api_server(args):
     """配置并启动API服务器"""
+    from api.logs import log
+
     try:
         # 1. 加载配置文件 (逻辑与原版一致)
         config = {}
@@ -65,16 +166,24 @@ def start_api_server(args):
             if config_path.exists():
                 with open(config_path, 'r', encoding='utf-8') as f:
                     config = json.load(f)
-                print(f"Configuration loaded from: {config_path}")
+                log.info("Config", f"Configuration loaded from: {config_path}")
             else:
-                print(f"Warning: Config file not found: {config_path}")
+                log.warning("Config", f"Config file not found: {config_path}")
+
+        # 调度器在导入 api.server 时按环境变量创建，配置文件中的并发数需在导入前生效
+        if config.get("max_concurrency"):
+            os.environ.setdefault("DDDDOCR_MAX_CONCURRENCY", str(config["max_concurrency"]))
+
+        import uvicorn
+        from api.middleware import AuthMiddleware
+        from api.server import create_app, service, InitializeRequest
 
         # 2. 确定监听地址 (优先级: 环境变量 > 命令行 > 配置文件 > 默认值)
         listen_address = os.getenv("DDDDOCR_LISTEN_ADDRESS")
         uvicorn_kwargs = {}
 
         if listen_address:
-            print(f"[Info] Using DDDDOCR_LISTEN_ADDRESS env var: {listen_address}")
+            log.info("Config", f"Using DDDDOCR_LISTEN_ADDRESS env var: {listen_address}")
             if listen_address.startswith("/") or listen_address.startswith("./"):
                 uvicorn_kwargs["uds"] = listen_address
             elif ":" in listen_address:
@@ -94,47 +203,151 @@ def start_api_server(args):
         uvicorn_kwargs["reload"] = args.reload or config.get("reload", False)
         uvicorn_kwargs["log_level"] = args.log_level or config.get("log_level", "info")
 
-        # 4. 创建FastAPI应用并注入中间件
-        app = create_app()
+        # 4. 服务器调优参数 (命令行 > 环境变量 > 配置文件 > 预设 > 默认值)
+        tuning = resolve_server_tuning(args, config)
+        gzip_min_size = tuning.pop("gzip_min_size")
+        uvicorn_kwargs.update(tuning)
+
+        # 5. 创建FastAPI应用并注入中间件
+        app = create_app(gzip_min_size=gzip_min_size)
         app.add_middleware(AuthMiddleware)
 
-        # 5. 程序化自动初始化
-        print("=" * 60)
-        print("Performing programmatic auto-initialization...")
+        # 6. 程序化自动初始化
+        log.info("Init", "Performing programmatic auto-initialization...")
         try:
             det_enabled = os.getenv("DET_ENABLED", "false").lower() == "true"
-            init_config = InitializeRequest(ocr=True, det=det_enabled)
+            cascade_model = os.getenv("CASCADE_MODEL") or None
+            execution_provider = os.getenv("DDDDOCR_EXECUTION_PROVIDER", config.get("execution_provider", "cpu"))
+            init_config = InitializeRequest(ocr=True, det=det_enabled, cascade_model=cascade_model,
+                                            execution_provider=execution_provider,
+                                            execution_providers=config.get("execution_providers"))
             result = service.initialize(init_config)
-            print(f"[Initialization Success] {result['message']}")
-            print(f"[Initialization Success] Loaded models: {result['loaded_models']}")
+            log.info("Init", result['message'], loaded_models=result['loaded_models'])
         except Exception as e:
-            print(f"[Initialization Failed] Error: {e}", file=sys.stderr)
-        print("=" * 60)
+            log.error("Init", f"Initialization failed: {e}")
 
-        # 6. 启动服务器
-        print("Starting DDDOCR API Service (Standalone Mode)...")
-        for key, value in uvicorn_kwargs.items():
-            if value is not None: print(f"  - {key}: {value}")
-        print("=" * 60)
+        # 7. 启动服务器
+        log.info("Server", "Starting DDDDOCR API Service (Standalone Mode)...",
+                 **{key: value for key, value in uvicorn_kwargs.items() if value is not None},
+                 gzip_min_size=gzip_min_size or "disabled")
         
-        uvicorn_kwargs["proxy_headers"] = True
-        uvicorn_kwargs["forwarded_allow_ips"] = '*'
+        # 只采信受信代理的 X-Forwarded-For，否则任何客户端都能伪造 request.client（调度器按它区分匿名客户端）
+        trusted_proxies = os.getenv("DDDDOCR_TRUSTED_PROXIES", "").strip()
+        uvicorn_kwargs["proxy_headers"] = bool(trusted_proxies)
+        uvicorn_kwargs["forwarded_allow_ips"] = trusted_proxies or None
 
-        uvicorn.run(app, **uvicorn_kwargs)
+        workers = uvicorn_kwargs.pop("workers")
+        if (workers > 1 or service.lifecycle.recycling_enabled) and not uvicorn_kwargs["reload"]:
+            # 多进程: 主进程创建模型会话后 fork 工作进程，会话权重写时复制共享；
+            # 工作进程回收依赖主进程重新派生，启用回收时单进程也走预派生模式
+            start_prefork_server(app, uvicorn_kwargs, workers, config)
+        else:
+            intra_op_threads = os.getenv("DDDDOCR_INTRA_OP_THREADS", config.get("intra_op_threads"))
+            if intra_op_threads:
+                from api.prefork import prepare_service
+                prepare_service(service, intra_op_threads=int(intra_op_threads), fork_safe=False)
+                log.info("Server", f"ONNX intra-op threads: {intra_op_threads}")
+            uvicorn.run(app, **uvicorn_kwargs)
         
     except Exception as e:
-        print(f"Failed to start API server: {e}", file=sys.stderr)
+        log.error("Server", f"Failed to start API server: {e}")
+        log.writer.flush()
+        sys.exit(1)
+
+def start_prefork_server(app, uvicorn_kwargs: dict, workers: int, config: dict):
+    """预派生模式启动多个工作进程"""
+    import uvicorn
+    from api.prefork import PreforkServer, prepare_service
+    from api.server import service
+    from api.logs import log
+
+    intra_op_threads = int(os.getenv("DDDDOCR_INTRA_OP_THREADS", config.get("intra_op_threads", 1)))
+    service.prefork = True
+    prepared = prepare_service(service, intra_op_threads=intra_op_threads)
+    elastic = service.scheduler.elastic
+    if elastic is not None and not os.getenv("DDDDOCR_THREAD_BUDGET"):
+        # 各工作进程平分核数，弹性并发在各自的预算内调整
+        elastic.thread_budget = max(1, (os.cpu_count() or 1) // workers)
+    log.info("Prefork", f"Preloaded models: {prepared}")
+    log.info("Prefork", f"Starting {workers} workers (intra-op threads per worker: {intra_op_threads})")
+
+    uvicorn_kwargs.pop("reload", None)
+    server_config = uvicorn.Config(app, **uvicorn_kwargs)
+    prefork = PreforkServer(server_config, workers, lifecycle=service.lifecycle,
+                            max_failures=int(os.getenv("DDDDOCR_WORKER_MAX_FAILURES", 5)),
+                            backoff_max=float(os.getenv("DDDDOCR_WORKER_BACKOFF_MAX", 30)))
+    if not prefork.run():
+        log.writer.flush()
         sys.exit(1)
 
+def resolve_server_tuning(args, config: dict) -> dict:
+    """合并uvicorn调优参数与gzip阈值，并在可选依赖缺失时回退"""
+    from api.logs import log
+
+    preset_name = args.preset or os.getenv("DDDDOCR_SERVER_PRESET") or config.get("preset", "default")
+    if preset_name not in SERVER_PRESETS:
+        log.warning("Config", f"Unknown server preset '{preset_name}', using default")
+        preset_name = "default"
+    preset = SERVER_PRESETS[preset_name]
+
+    tuning = {}
+    for key, env_name, cast, default in SERVER_TUNING_OPTIONS:
+        value = getattr(args, key, None)
+        if value is None and os.getenv(env_name) is not None:
+            value = cast(os.getenv(env_name))
+        if value is None:
+            value = config.get(key, preset.get(key, default))
+        tuning[key] = value
+
+    # httptools/uvloop 为可选依赖，未安装时回退到 auto
+    for key, module in (("http", "httptools"), ("loop", "uvloop")):
+        if tuning[key] == module:
+            try:
+                __import__(module)
+            except ImportError:
+                log.warning("Config", f"{module} is not installed, falling back to {key}=auto")
+                tuning[key] = "auto"
+
+    log.info("Config", f"Server preset: {preset_name}")
+    return tuning
+
+def read_ddddocr_constant(relative_path: str, name: str):
+    """
+    从 ddddocr 源码中解析模块级常量（如 __version__、COLOR_PRESETS）
+
+    只读取源码而不导入 ddddocr，避免连带加载 onnxruntime/OpenCV；
+    未安装或解析失败时返回 None
+    """
+    import ast
+    import importlib.util
+
+    try:
+        spec = importlib.util.find_spec("ddddocr")
+        source_path = Path(spec.submodule_search_locations[0]) / relative_path
+        tree = ast.parse(source_path.read_text(encoding="utf-8"))
+        for node in ast.walk(tree):
+            if (isinstance(node, ast.Assign) and len(node.targets) == 1
+                    and getattr(node.targets[0], "id", None) == name):
+                return ast.literal_eval(node.value)
+    except (AttributeError, TypeError, OSError, SyntaxError, ValueError):
+        pass
+    return None
+
+def load_color_presets() -> dict:
+    """读取颜色过滤器预设，源码解析失败时回退到导入 ColorFilter"""
+    presets = read_ddddocr_constant("preprocessing/color_filter.py", "COLOR_PRESETS")
+    if presets is None:
+        from ddddocr import ColorFilter
+        presets = ColorFilter.COLOR_PRESETS
+    return presets
+
 def show_color_presets():
     """显示颜色过滤器预设 (来自原版)"""
     try:
-        from ddddocr import ColorFilter
+        presets = load_color_presets()
         print("DDDDOCR 颜色过滤器预设")
         print("=" * 40)
-        colors = ColorFilter.get_available_colors()
-        for i, color in enumerate(colors, 1):
-            ranges = ColorFilter.COLOR_PRESETS[color]
+        for i, (color, ranges) in enumerate(presets.items(), 1):
             print(f"{i:2d}. {color:8s} - HSV范围: {ranges}")
         print("\n使用示例:")
         print("  ocr.classification(image, color_filter_colors=['red', 'blue'])")
@@ -144,16 +357,232 @@ def show_color_presets():
 def show_version():
     """显示版本信息 (来自原版)"""
     try:
-        import ddddocr
+        ddddocr_version = read_ddddocr_constant("__init__.py", "__version__") or "未安装"
         print("DDDDOCR 版本信息")
         print("=" * 30)
         # 注意：版本号是硬编码的，因为我们不再是ddddocr包的一部分
         print(f"API 版本: 1.6.0 (增强版)")
+        print(f"ddddocr 版本: {ddddocr_version}")
         print(f"原作者: sml2h3")
         print(f"项目地址: https://github.com/sml2h3/ddddocr")
     except Exception as e:
         print(f"获取版本信息失败: {e}")
 
+def run_solve(args) -> int:
+    """离线批量识别，结果写入JSONL并输出吞吐量统计"""
+    from api.bulk import solve
+
+    try:
+        options = json.loads(args.options)
+        init_config = {
+            "old": args.old,
+            "beta": args.beta,
+            "import_onnx_path": args.import_onnx_path,
+            "charsets_path": args.charsets_path,
+        }
+        summary = solve(args.input, args.output, operation=args.operation, options=options,
+                        init_config=init_config, workers=args.workers, threads=args.threads,
+                        resume=args.resume, progress_interval=args.progress_interval)
+    except Exception as e:
+        print(f"批量识别失败: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return 0 if summary["errors"] == 0 else 2
+
+def run_tune(args) -> int:
+    """压测参数网格，输出吞吐量/延迟前沿并将最佳配置写入配置文件"""
+    from api import tuning
+
+    def parse_grid(value, default):
+        return [int(item) for item in value.split(",") if item.strip()] if value else default
+
+    grid = tuning.default_grid()
+    workers = parse_grid(args.workers, grid["workers"])
+    threads = parse_grid(args.threads, grid["threads"])
+    concurrency = parse_grid(args.concurrency, grid["concurrency"])
+    init_config = {
+        "old": args.old,
+        "beta": args.beta,
+        "import_onnx_path": args.import_onnx_path,
+        "charsets_path": args.charsets_path,
+    }
+
+    try:
+        if args.corpus:
+            images = tuning.load_corpus(args.corpus, args.samples)
+        else:
+            images = tuning.synthetic_corpus(args.samples)
+    except Exception as e:
+        print(f"读取语料失败: {e}", file=sys.stderr)
+        return 1
+
+    total = len(workers) * len(threads) * len(concurrency)
+    print(f"DDDDOCR 主机调优: {len(images)} 张{'语料' if args.corpus else '合成'}图片, "
+          f"{total} 组参数, 每组 {args.duration:g} 秒, CPU 核数 {os.cpu_count()}")
+    header = f"{'workers':>7s} {'threads':>7s} {'concur':>6s} {'img/s':>9s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s}"
+    print(header)
+    print("-" * len(header))
+
+    def show(result):
+        if "error" in result:
+            print(f"{result['workers']:7d} {result['threads']:7d} {result['concurrency']:6d}  失败: {result['error']}")
+        else:
+            print(f"{result['workers']:7d} {result['threads']:7d} {result['concurrency']:6d} "
+                  f"{result['throughput']:9.1f} {result['p50_ms']:9.1f} {result['p95_ms']:9.1f} {result['p99_ms']:9.1f}")
+
+    report = tuning.tune(images, workers, threads, concurrency, operation=args.operation,
+                         init_config=init_config, duration=args.duration,
+                         max_p95_ms=args.max_p95_ms, progress=show)
+
+    print("=" * len(header))
+    print("吞吐量/延迟前沿 (吞吐量降序，延迟严格递减):")
+    for result in report["frontier"]:
+        show(result)
+    best = report["best"]
+    if best is None:
+        print("没有满足条件的配置", file=sys.stderr)
+        return 1
+    print("最佳配置:")
+    show(best)
+
+    if args.dry_run:
+        return 0
+    config_path = Path(args.config)
+    config = {}
+    if config_path.exists():
+        with open(config_path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    config.update({
+        "workers": best["workers"],
+        "intra_op_threads": best["threads"],
+        "max_concurrency": best["concurrency"],
+        "tuning": {
+            "operation": args.operation,
+            "cpu_count": os.cpu_count(),
+            "throughput": best["throughput"],
+            "p50_ms": best["p50_ms"],
+            "p95_ms": best["p95_ms"],
+        },
+    })
+    with open(config_path, "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+    print(f"最佳配置已写入 {config_path}，使用 python main.py api --config {config_path} 启动")
+    return 0
+
+def run_startup_bench(args) -> int:
+    """
+    测量冷启动耗时并检查预算
+
+    每项均在全新的子进程中测量:
+      - cli: `main.py version` 的总耗时（不应加载重依赖）
+      - import: 导入 api.server 的耗时
+      - ready: 从启动 `main.py api` 到 /health 可响应的耗时（含模型初始化）
+
+    Returns:
+        进程退出码，超出预算时为 1
+    """
+    import socket
+    import statistics
+    import subprocess
+    import time
+    import urllib.request
+    import urllib.error
+
+    main_path = str(Path(__file__).resolve())
+    workdir = os.path.dirname(main_path)
+
+    def run_once(command):
+        started = time.perf_counter()
+        subprocess.run(command, cwd=workdir, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return (time.perf_counter() - started) * 1000
+
+    def time_to_ready():
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        env = dict(os.environ, DDDDOCR_LISTEN_ADDRESS=f"127.0.0.1:{port}", AUTH_LOCAL_ENABLED="false")
+        started = time.perf_counter()
+        process = subprocess.Popen([sys.executable, main_path, "api", "--no-access-log"], cwd=workdir, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            while time.perf_counter() - started < args.timeout:
+                if process.poll() is not None:
+                    raise RuntimeError(f"服务进程提前退出，退出码 {process.returncode}")
+                try:
+                    urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1).close()
+                    return (time.perf_counter() - started) * 1000
+                except urllib.error.HTTPError:
+                    return (time.perf_counter() - started) * 1000
+                except OSError:
+                    time.sleep(0.02)
+            raise RuntimeError(f"服务在 {args.timeout} 秒内未就绪")
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    measurements = {
+        "cli": lambda: run_once([sys.executable, main_path, "version"]),
+        "import": lambda: run_once([sys.executable, "-c", "import api.server"]),
+        "ready": time_to_ready,
+    }
+    budgets = {"cli": args.cli_budget_ms, "ready": args.budget_ms}
+
+    results = {}
+    for name, measure in measurements.items():
+        samples = [measure() for _ in range(max(1, args.repeat))]
+        results[name] = {
+            "median_ms": round(statistics.median(samples), 1),
+            "min_ms": round(min(samples), 1),
+            "max_ms": round(max(samples), 1),
+            "budget_ms": budgets.get(name),
+        }
+        results[name]["within_budget"] = budgets.get(name) is None or results[name]["median_ms"] <= budgets[name]
+
+    passed = all(result["within_budget"] for result in results.values())
+    if args.json:
+        print(json.dumps({"results": results, "passed": passed}, ensure_ascii=False, indent=2))
+    else:
+        print("DDDDOCR 冷启动基准")
+        print("=" * 60)
+        for name, result in results.items():
+            budget = f"{result['budget_ms']:.0f}" if result["budget_ms"] is not None else "-"
+            status = "OK" if result["within_budget"] else "OVER BUDGET"
+            print(f"{name:8s} median {result['median_ms']:8.1f} ms  "
+                  f"(min {result['min_ms']:.1f}, max {result['max_ms']:.1f})  budget {budget:>6s}  {status}")
+        print("=" * 60)
+        print("PASSED" if passed else "FAILED: startup budget exceeded")
+    return 0 if passed else 1
+
+def run_ingest_bench(args) -> int:
+    """对比默认路径与低拷贝路径（复用缓冲区 + I/O 绑定）从base64到模型输出的耗时与内存分配"""
+    import ddddocr
+    from api import tuning
+    from api.buffers import benchmark_ingest
+
+    try:
+        images = tuning.load_corpus(args.corpus, args.samples) if args.corpus else tuning.synthetic_corpus(args.samples)
+    except Exception as e:
+        print(f"读取语料失败: {e}", file=sys.stderr)
+        return 1
+    instance = ddddocr.DdddOcr(ocr=True, det=False, old=args.old, beta=args.beta, show_ad=False)
+    report = benchmark_ingest(instance, images, repeat=max(1, args.repeat))
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0
+    print(f"DDDDOCR 图片摄取基准: {len(images)} 张{'语料' if args.corpus else '合成'}图片, 每条路径 {args.repeat} 次")
+    header = f"{'path':10s} {'median ms':>10s} {'peak KiB/req':>13s} {'new buffers':>12s}"
+    print(header)
+    print("-" * len(header))
+    for name, result in report.items():
+        buffers = "-" if result["buffer_allocations"] is None else str(result["buffer_allocations"])
+        print(f"{name:10s} {result['median_ms']:10.3f} {result['peak_kib']:13.1f} {buffers:>12s}")
+    return 0
+
 def show_examples():
     """显示使用示例 (来自原版)"""
     # 此功能为纯文本打印，直接保留
@@ -168,6 +597,15 @@ def show_examples():
 
     3. 查看版本:
        python main.py version
+
+    4. 离线批量识别:
+       python main.py solve ./captchas -o results.jsonl --workers 8
+
+    5. 测量冷启动耗时:
+       python main.py startup-bench --budget-ms 5000
+
+    6. 为本机自动调优并写入配置:
+       python main.py tune --config config.json --corpus ./captchas
     """
     print(examples)
 
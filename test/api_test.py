@@ -55,7 +55,7 @@ def run_all_tests(image_path: str):
         return
     
     # --- 执行初始化 ---
-    print("\n--- (0/4) 正在初始化服务, 加载OCR模型 ---")
+    print("\n--- (0/6) 正在初始化服务, 加载OCR模型 ---")
     init_payload = {"ocr": True}
     test_endpoint("/initialize", init_payload, expected_status=200)
 
@@ -64,23 +64,25 @@ def run_all_tests(image_path: str):
     test_remote_unauthenticated(base64_string)
     test_remote_authenticated(base64_string)
     test_local_authenticated_required(base64_string)
+    test_expired_deadline(base64_string)
+    test_mcp_batch(base64_string)
 
 def test_local_unauthenticated(base64_string):
     """测试无需认证的本地请求 (AUTH_LOCAL_ENABLED=false)"""
-    print("\n--- (1/4) 正在测试: 本地请求, 无Token (需要 AUTH_LOCAL_ENABLED=false) ---")
+    print("\n--- (1/6) 正在测试: 本地请求, 无Token (需要 AUTH_LOCAL_ENABLED=false) ---")
     print("预期: 成功")
     test_endpoint("/ocr", {"image": base64_string}, expected_status=200)
 
 def test_remote_unauthenticated(base64_string):
     """测试需要认证但未提供Token的远程请求 (AUTH_REMOTE_ENABLED=true)"""
-    print("\n--- (2/4) 正在测试: 模拟远程请求, 无Token (需要 AUTH_REMOTE_ENABLED=true) ---")
+    print("\n--- (2/6) 正在测试: 模拟远程请求, 无Token (需要 AUTH_REMOTE_ENABLED=true) ---")
     print("预期: 失败 (401 Unauthorized)")
     headers = {"X-Forwarded-For": SIMULATED_PUBLIC_IP}
     test_endpoint("/ocr", {"image": base64_string}, headers=headers, expected_status=401)
 
 def test_remote_authenticated(base64_string):
     """测试提供了有效Token的远程请求 (AUTH_REMOTE_ENABLED=true)"""
-    print("\n--- (3/4) 正在测试: 模拟远程请求, 有有效Token (需要 AUTH_REMOTE_ENABLED=true) ---")
+    print("\n--- (3/6) 正在测试: 模拟远程请求, 有有效Token (需要 AUTH_REMOTE_ENABLED=true) ---")
     token = generate_jwt()
     if not token:
         print("--- 测试跳过！ ---")
@@ -94,7 +96,7 @@ def test_remote_authenticated(base64_string):
 
 def test_local_authenticated_required(base64_string):
     """测试需要认证的本地请求 (AUTH_LOCAL_ENABLED=true)"""
-    print("\n--- (4/4) 正在测试: 本地请求, 有有效Token (需要 AUTH_LOCAL_ENABLED=true) ---")
+    print("\n--- (4/6) 正在测试: 本地请求, 有有效Token (需要 AUTH_LOCAL_ENABLED=true) ---")
     print("要运行此测试, 请在启动服务时设置环境变量 AUTH_LOCAL_ENABLED=true")
     token = generate_jwt()
     if not token:
@@ -104,6 +106,23 @@ def test_local_authenticated_required(base64_string):
     headers = {"Authorization": f"Bearer {token}"}
     test_endpoint("/ocr", {"image": base64_string}, headers=headers, expected_status=200)
 
+def test_expired_deadline(base64_string):
+    """测试已过截止时间的请求会被直接丢弃 (X-Request-Deadline)"""
+    print("\n--- (5/6) 正在测试: 本地请求, 截止时间已过 ---")
+    print("预期: 失败 (504 Gateway Timeout), 不执行推理")
+    headers = {"X-Request-Deadline": str(time.time() - 1)}
+    test_endpoint("/ocr", {"image": base64_string}, headers=headers, expected_status=504)
+
+def test_mcp_batch(base64_string):
+    """测试MCP JSON-RPC 批量调用"""
+    print("\n--- (6/6) 正在测试: 本地请求, MCP批量调用 ---")
+    print("预期: 成功 (200 OK), 按请求顺序返回结果数组")
+    payload = [
+        {"method": "ddddocr_ocr", "params": {"image": base64_string}, "id": 1},
+        {"method": "ddddocr_status", "params": {}, "id": 2},
+    ]
+    test_endpoint("/mcp/call", payload, expected_status=200)
+
 def test_endpoint(path: str, payload: dict, headers: dict = None, expected_status: int = 200):
     """辅助函数，用于测试单个端点并验证状态码"""
     try:
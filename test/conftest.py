@@ -0,0 +1,19 @@
+# coding=utf-8
+"""pytest 公共夹具"""
+
+import pytest
+
+from api.logs import log
+
+
+@pytest.fixture(autouse=True)
+def flush_service_log():
+    """每个用例结束时写出服务日志，使其计入该用例的捕获输出，而不是在测试汇总之后才打印"""
+    yield
+    log.writer.flush()
+
+
+@pytest.fixture(autouse=True, scope="session")
+def close_service_log():
+    yield
+    log.writer.close()
@@ -0,0 +1,120 @@
+# coding=utf-8
+"""已知背景图库（api/backgrounds.py）的单元测试"""
+
+import io
+import hashlib
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from api.backgrounds import BackgroundIndex
+
+
+def make_background(seed: int, width: int = 320, height: int = 160) -> np.ndarray:
+    """渐变加噪声与若干曲线的合成背景"""
+    rng = np.random.default_rng(seed)
+    base = np.linspace(0, 255, width)[None, :, None] * np.ones((height, 1, 3))
+    pixels = (base * rng.uniform(0.3, 1, 3) + rng.normal(0, 8, (height, width, 3))).clip(0, 255).astype(np.uint8)
+    image = Image.fromarray(pixels)
+    draw = ImageDraw.Draw(image)
+    for _ in range(6):
+        x0, y0 = (int(value) for value in rng.integers(0, height - 10, 2))
+        color = tuple(int(value) for value in rng.integers(0, 255, 3))
+        draw.ellipse([(x0, y0), (x0 + 60 + int(rng.integers(0, 100)), y0 + 10)], outline=color, width=3)
+    return np.asarray(image)
+
+
+def with_gap(pixels: np.ndarray, x: int, y: int, size: int = 50, style: str = "white") -> np.ndarray:
+    """在背景上叠加缺口（不透明白色、半透明白色或压暗）"""
+    gapped = pixels.copy()
+    region = gapped[y:y + size, x:x + size].astype(np.int16)
+    if style == "opaque":
+        region[:] = 255
+    else:
+        region = (region + 255) // 2 if style == "white" else region // 2
+    gapped[y:y + size, x:x + size] = region.astype(np.uint8)
+    return gapped
+
+
+def png(pixels: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture(scope="module")
+def slide_engine():
+    ddddocr = pytest.importorskip("ddddocr")
+    return ddddocr.DdddOcr(ocr=False, det=False, show_ad=False).slide_engine
+
+
+@pytest.mark.parametrize("style", ["opaque", "white", "dark"])
+@pytest.mark.parametrize("x,y", [(30, 20), (150, 60), (250, 100)])
+def test_learned_background_matches_gapped_target(slide_engine, style, x, y):
+    index = BackgroundIndex(learn=True)
+    backgrounds = [png(make_background(seed)) for seed in range(8)]
+    for data in backgrounds:
+        assert index.add(data)
+
+    result = index.solve(slide_engine, png(with_gap(make_background(3), x, y, style=style)))
+
+    assert result is not None
+    assert result["background"]["id"] == hashlib.sha256(backgrounds[3]).hexdigest()[:16]
+    # 定位精度取决于 ddddocr 的差分算法，这里只要求落在缺口内
+    assert x <= result["target"][0] <= x + 50 and y <= result["target"][1] <= y + 50
+    assert index.get_metrics()["hits"] == 1
+
+
+def test_unknown_background_returns_none(slide_engine):
+    index = BackgroundIndex()
+    for seed in range(4):
+        index.add(png(make_background(seed)))
+
+    assert index.solve(slide_engine, png(with_gap(make_background(99), 100, 40))) is None
+    assert index.get_metrics()["lookups"] == 1
+    assert index.get_metrics()["hits"] == 0
+
+
+def test_other_sizes_are_not_compared(slide_engine):
+    index = BackgroundIndex()
+    index.add(png(make_background(1, width=300)))
+
+    assert index.solve(slide_engine, png(with_gap(make_background(1), 100, 40))) is None
+
+
+def test_learning_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("DDDDOCR_SLIDE_INDEX_LEARN", raising=False)
+    assert BackgroundIndex.from_env().learn is False
+    assert BackgroundIndex().learn is False
+
+
+def test_capacity_evicts_least_recently_used():
+    index = BackgroundIndex(capacity=2)
+    first, second, third = (png(make_background(seed)) for seed in range(3))
+    index.add(first)
+    index.add(second)
+    index.add(first)  # 刷新 LRU 位置
+    index.add(third)
+
+    assert len(index) == 2
+    assert index.add(first) is False  # 仍在图库中
+    assert index.add(second) is True  # 已被淘汰，重新收录
+
+
+def test_byte_budget_bounds_memory():
+    entry_bytes = 320 * 160 * 3
+    index = BackgroundIndex(capacity=100, max_bytes=int(entry_bytes * 2.5))
+    for seed in range(5):
+        index.add(png(make_background(seed)))
+
+    metrics = index.get_metrics()
+    assert len(index) == 2
+    assert metrics["bytes"] <= metrics["max_bytes"]
+
+
+def test_background_larger_than_budget_is_skipped():
+    index = BackgroundIndex(max_bytes=1000)
+
+    assert index.add(png(make_background(0))) is False
+    assert len(index) == 0
@@ -0,0 +1,278 @@
+# coding=utf-8
+"""结果缓存（api/cache.py）的单元测试，网络后端使用本地 RESP 替身服务器"""
+
+import ssl
+import json
+import time
+import asyncio
+
+import pytest
+
+from api.cache import CacheBackend, RedisBackend, RedisError, ResultCache, SharedMemoryBackend
+
+
+class FakeRedis:
+    """最小的 RESP 替身服务器：支持 AUTH、SELECT、GET、SET [PX]，可按命令注入延迟"""
+
+    def __init__(self, password=None, delays=None):
+        self.password = password
+        self.delays = delays or {}
+        self.data = {}
+        self.commands = []
+        self.connections = 0
+        self.open = 0
+        self.server = None
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return f"127.0.0.1:{self.server.sockets[0].getsockname()[1]}"
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        self.open += 1
+        authenticated = self.password is None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                parts = []
+                for _ in range(int(line[1:-2])):
+                    length = int((await reader.readline())[1:-2])
+                    parts.append((await reader.readexactly(length + 2))[:-2])
+                command = parts[0].upper()
+                self.commands.append(command)
+                await asyncio.sleep(self.delays.get(command, 0))
+                if command == b"AUTH":
+                    authenticated = parts[1].decode() == self.password
+                    writer.write(b"+OK\r\n" if authenticated else b"-WRONGPASS invalid password\r\n")
+                elif not authenticated:
+                    writer.write(b"-NOAUTH Authentication required.\r\n")
+                elif command == b"SELECT":
+                    writer.write(b"+OK\r\n")
+                elif command == b"GET":
+                    value = self.data.get(parts[1])
+                    writer.write(b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value))
+                elif command == b"SET":
+                    self.data[parts[1]] = parts[2]
+                    writer.write(b"+OK\r\n")
+                else:
+                    writer.write(b"-ERR unknown command\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.open -= 1
+            writer.close()
+
+
+class SlowBackend(CacheBackend):
+    name = "slow"
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    async def get(self, key):
+        await asyncio.sleep(self.delay)
+        return b"1"
+
+
+def run(coroutine_function):
+    """在新的事件循环中启动替身服务器并执行测试主体"""
+    async def main():
+        server = FakeRedis(**getattr(coroutine_function, "server_options", {}))
+        address = await server.start()
+        try:
+            await coroutine_function(server, address)
+        finally:
+            await server.stop()
+    asyncio.run(main())
+
+
+async def settle(cache: ResultCache = None):
+    """等待后台写入与服务器端的连接关闭完成"""
+    if cache is not None and cache._pending:
+        await asyncio.gather(*cache._pending)
+    await asyncio.sleep(0.02)
+
+
+async def connections_closed(server: FakeRedis, timeout: float = 2.0) -> bool:
+    """服务器端观察到所有连接关闭（注入的延迟结束后才会读到 EOF）"""
+    deadline = time.monotonic() + timeout
+    while server.open and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    return server.open == 0
+
+
+KEY = "ab" * 32
+
+
+def test_redis_miss_then_hit():
+    async def body(server, address):
+        cache = ResultCache([RedisBackend(f"redis://{address}")], timeout=1)
+        assert await cache.get(KEY) == (False, None)
+        cache.put(KEY, {"result": "验证码"})
+        await settle(cache)
+        assert await cache.get(KEY) == (True, {"result": "验证码"})
+        stats = cache.get_metrics()["backends"][f"redis://{address}"]
+        assert (stats["hits"], stats["misses"], stats["writes"]) == (1, 1, 1)
+        assert server.data[b"ddddocr:" + KEY.encode()] == json.dumps({"result": "验证码"}, ensure_ascii=False,
+                                                                     separators=(",", ":")).encode()
+    run(body)
+
+
+def test_hit_in_lower_tier_fills_local():
+    async def body(server, address):
+        local = SharedMemoryBackend(slots=16, slot_size=256)
+        redis = RedisBackend(f"redis://{address}")
+        await redis.set(KEY, b'{"result":"x"}', 60)
+        cache = ResultCache([local, redis], timeout=1)
+
+        assert await cache.get(KEY) == (True, {"result": "x"})
+        await settle(cache)
+        assert await local.get(KEY) == b'{"result":"x"}'
+        assert await cache.get(KEY) == (True, {"result": "x"})
+        assert cache.get_metrics()["backends"]["local"]["hits"] == 1
+    run(body)
+
+
+def test_timeout_counts_as_miss_and_drops_connection():
+    async def body(server, address):
+        backend = RedisBackend(f"redis://{address}")
+        cache = ResultCache([backend], timeout=0.05)
+
+        assert await cache.get(KEY) == (False, None)
+        await settle()
+        assert cache.get_metrics()["backends"][backend.url]["timeouts"] == 1
+        # 被取消的请求可能残留未读回复，连接必须关闭而不是放回连接池
+        assert backend.dropped == 1 and len(backend._idle) == 0
+        assert await connections_closed(server)
+    body.server_options = {"delays": {b"GET": 0.5}}
+    run(body)
+
+
+def test_cancel_during_auth_closes_connection():
+    async def body(server, address):
+        backend = RedisBackend(f"redis://:secret@{address}")
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(backend.get(KEY), 0.05)
+        await settle()
+        assert backend.dropped == 1
+        assert await connections_closed(server)
+    body.server_options = {"password": "secret", "delays": {b"AUTH": 0.5}}
+    run(body)
+
+
+def test_auth_and_select_run_once_per_connection():
+    async def body(server, address):
+        backend = RedisBackend(f"redis://:p%40ss@{address}/2")
+        for _ in range(3):
+            assert await backend.get(KEY) is None
+        assert server.commands == [b"AUTH", b"SELECT", b"GET", b"GET", b"GET"]
+        assert backend.connects == 1 and len(backend._idle) == 1
+    body.server_options = {"password": "p@ss"}
+    run(body)
+
+
+def test_wrong_password_raises():
+    async def body(server, address):
+        with pytest.raises(RedisError):
+            await RedisBackend(f"redis://:wrong@{address}").get(KEY)
+    body.server_options = {"password": "secret"}
+    run(body)
+
+
+def test_pool_reuses_connections_up_to_pool_size():
+    async def body(server, address):
+        backend = RedisBackend(f"redis://{address}", pool_size=2)
+        await asyncio.gather(*(backend.get(KEY) for _ in range(4)))
+        assert backend.connects == 4 and len(backend._idle) == 2
+        await asyncio.gather(*(backend.get(KEY) for _ in range(2)))
+        assert backend.connects == 4
+    run(body)
+
+
+def test_fork_discards_inherited_connections():
+    async def body(server, address):
+        backend = RedisBackend(f"redis://{address}")
+        await backend.get(KEY)
+        backend._pid = -1  # 模拟在子进程中首次使用
+        await backend.get(KEY)
+        assert backend.connects == 2 and len(backend._idle) == 1
+    run(body)
+
+
+@pytest.mark.parametrize("reply,expected", [
+    (b"+OK\r\n", b"OK"),
+    (b":42\r\n", 42),
+    (b"$5\r\nhe\r\no\r\n", b"he\r\no"),
+    (b"$-1\r\n", None),
+    (b"*2\r\n$1\r\na\r\n:1\r\n", [b"a", 1]),
+    (b"*-1\r\n", None),
+])
+def test_reply_parser(reply, expected):
+    async def parse():
+        reader = asyncio.StreamReader()
+        reader.feed_data(reply)
+        reader.feed_eof()
+        return await RedisBackend._read_reply(reader)
+    assert asyncio.run(parse()) == expected
+
+
+def test_reply_parser_errors():
+    async def parse(reply):
+        reader = asyncio.StreamReader()
+        reader.feed_data(reply)
+        reader.feed_eof()
+        return await RedisBackend._read_reply(reader)
+    with pytest.raises(RedisError, match="WRONGTYPE"):
+        asyncio.run(parse(b"-WRONGTYPE bad\r\n"))
+    with pytest.raises(ConnectionError):
+        asyncio.run(parse(b""))
+
+
+def test_rediss_uses_tls():
+    assert isinstance(RedisBackend("rediss://cache.example:6380").ssl, ssl.SSLContext)
+    assert RedisBackend("redis://cache.example").ssl is None
+
+
+def test_one_deadline_for_all_backends():
+    async def body():
+        first, second = SlowBackend(0.2), SlowBackend(0.2)
+        cache = ResultCache([first, second], timeout=0.05)
+        started = time.perf_counter()
+        assert await cache.get(KEY) == (False, None)
+        assert time.perf_counter() - started < 0.15
+        # 同类后端的指标按实例区分
+        assert cache.get_metrics()["backends"] == {"slow": {"hits": 0, "misses": 0, "timeouts": 1, "errors": 0,
+                                                            "writes": 0},
+                                                   "slow#1": {"hits": 0, "misses": 0, "timeouts": 1, "errors": 0,
+                                                              "writes": 0}}
+    asyncio.run(body())
+
+
+def test_two_redis_backends_have_separate_stats():
+    cache = ResultCache([RedisBackend("redis://one:6379"), RedisBackend("redis://two:6379")])
+    assert set(cache.get_metrics()["backends"]) == {"redis://one:6379", "redis://two:6379"}
+
+
+def test_shared_memory_round_trip_and_contention():
+    async def body():
+        backend = SharedMemoryBackend(slots=8, slot_size=128)
+        await backend.set(KEY, b"value", 60)
+        assert await backend.get(KEY) == b"value"
+        await backend.set("cd" * 32, b"x" * 200, 60)
+        assert backend.oversized == 1
+        await backend.set(KEY, b"old", -1)
+        assert await backend.get(KEY) is None  # 已过期
+        backend._lock.acquire()
+        try:
+            assert await backend.get(KEY) is None
+        finally:
+            backend._lock.release()
+        assert backend.contended == 1
+    asyncio.run(body())
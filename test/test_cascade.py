@@ -0,0 +1,72 @@
+# coding=utf-8
+"""置信度级联（api/cascade.py）的单元测试"""
+
+import pytest
+
+from api.cascade import CascadeStats, should_escalate
+
+
+@pytest.mark.parametrize("confidence,escalate", [(0.0, True), (0.8999, True), (0.9, False), (1.0, False)])
+def test_threshold_is_inclusive(confidence, escalate):
+    assert should_escalate("ab12", confidence, 0.9) is escalate
+
+
+def test_zero_threshold_never_escalates_on_confidence():
+    assert should_escalate("", 0.0, 0.0) is False
+
+
+@pytest.mark.parametrize("expected_length,escalate", [
+    (4, False), (5, True), ([4, 5], False), ([5, 6], True), ([], False), (None, False), (0, True),
+])
+def test_expected_length(expected_length, escalate):
+    assert should_escalate("ab12", 0.99, 0.9, expected_length) is escalate
+
+
+def test_low_confidence_escalates_even_when_length_matches():
+    assert should_escalate("ab12", 0.5, 0.9, 4) is True
+
+
+def test_stats_empty():
+    metrics = CascadeStats().get_metrics()
+    assert metrics["requests"] == 0 and metrics["escalation_rate"] == 0.0
+    assert metrics["avg_fast_ms"] is None and metrics["saved_ms"] is None and metrics["saved_ratio"] is None
+
+
+def test_stats_without_escalations_cannot_estimate_savings():
+    stats = CascadeStats()
+    stats.record(0.01, None)
+    metrics = stats.get_metrics()
+    assert metrics["avg_fast_ms"] == pytest.approx(10) and metrics["avg_heavy_ms"] is None
+    assert metrics["saved_ms"] is None
+
+
+def test_stats_escalation_rate_and_savings():
+    stats = CascadeStats()
+    for _ in range(3):
+        stats.record(0.01, None)
+    stats.record(0.01, 0.1)
+    metrics = stats.get_metrics()
+    assert (metrics["requests"], metrics["escalations"]) == (4, 1)
+    assert metrics["escalation_rate"] == pytest.approx(0.25)
+    assert metrics["avg_heavy_ms"] == pytest.approx(100)
+    # 全走重模型 4 x 100ms，实际 4 x 10ms + 100ms
+    assert metrics["saved_ms"] == pytest.approx(260)
+    assert metrics["saved_ratio"] == pytest.approx(0.65)
+
+
+def test_switch_model_drops_stale_cascade(monkeypatch):
+    import ddddocr
+    from api.models import SwitchModelRequest
+    from api.server import DDDDOCRService
+
+    monkeypatch.setattr(ddddocr, "DdddOcr", lambda **options: object())
+    service = DDDDOCRService()
+    service.cascade_instance = heavy = object()
+    service.cascade_stats.record(0.01, 0.1)
+
+    result = service.switch_model(SwitchModelRequest(model_type="det"))
+    assert result["cascade_enabled"] is True and service.cascade_instance is heavy
+
+    result = service.switch_model(SwitchModelRequest(model_type="ocr_beta"))
+    assert result["cascade_enabled"] is False and service.cascade_instance is None
+    assert service.cascade_stats.get_metrics()["requests"] == 0
@@ -0,0 +1,134 @@
+# coding=utf-8
+"""向量化CTC解码（api/decoding.py）与 ddddocr 原逐元素解码的对照测试"""
+
+import base64
+
+import numpy as np
+import pytest
+from ddddocr.core.ocr_engine import OCREngine
+from ddddocr.models.charset_manager import CharsetManager
+
+from api import decoding
+
+CHARSET = ["", "a", "b", "c", "1", "2", "3"]
+
+
+def reference_engine(charset_range=None) -> OCREngine:
+    """不加载模型的 ddddocr OCREngine，只用于调用其输出处理方法"""
+    engine = OCREngine.__new__(OCREngine)
+    engine.session = None
+    engine.charset_manager = CharsetManager(list(CHARSET))
+    engine.charset_manager._update_valid_indices()
+    if charset_range is not None:
+        engine.charset_manager.set_ranges(charset_range)
+    return engine
+
+
+def valid_mask(charset_range):
+    if charset_range is None:
+        return None
+    mask = np.zeros(len(CHARSET), dtype=bool)
+    mask[reference_engine(charset_range).charset_manager.get_valid_indices()] = True
+    return mask
+
+
+def logits_for(path, seed: int = 0, layout: str = "T1C") -> np.ndarray:
+    """构造逐时间步 argmax 为 path 的 logits"""
+    rng = np.random.default_rng(seed)
+    logits = rng.normal(0, 1, (len(path), len(CHARSET))).astype(np.float32)
+    logits[np.arange(len(path)), path] += 6
+    return logits[:, None, :] if layout == "T1C" else logits[None]
+
+
+@pytest.mark.parametrize("layout", ["T1C", "1TC"])
+@pytest.mark.parametrize("path,expected", [
+    ([0, 1, 1, 0, 1, 2, 2, 3, 0, 0, 4], "aabc1"),  # blank 分隔的重复保留，连续重复合并
+    ([0, 0, 0], ""),
+    ([5, 5, 5, 5], "2"),
+    ([1, 0, 1, 0, 1], "aaa"),
+    ([6, 2, 0, 2, 6], "3bb3"),
+])
+def test_collapses_blanks_and_repeats_like_ddddocr(path, expected, layout):
+    output = logits_for(path, layout=layout)
+    assert reference_engine()._process_text_output(output) == expected
+    decoded = decoding.ctc_greedy_decode(output, CHARSET)
+    assert decoded.text == expected
+    assert [CHARSET[i] for i in decoded.indices.tolist()] == list(expected)
+
+
+@pytest.mark.parametrize("charset_range", [None, "ab", "123", 2, ["c", "3"]])
+@pytest.mark.parametrize("seed", range(20))
+def test_random_logits_match_reference(seed, charset_range):
+    rng = np.random.default_rng(seed)
+    output = rng.normal(0, 2, (int(rng.integers(1, 40)), 1, len(CHARSET))).astype(np.float32)
+    expected = reference_engine(charset_range)._process_text_output(output)
+    assert decoding.ctc_greedy_decode(output, CHARSET, valid_mask(charset_range)).text == expected
+
+
+def test_full_probability_matches_reference():
+    output = logits_for([0, 1, 1, 2, 0, 3], seed=3)
+    expected = reference_engine()._process_probability_output(output)
+    result = decoding.full_probability(output, decoding.ctc_greedy_decode(output, CHARSET), CHARSET)
+    assert result["text"] == expected["text"] and result["charset"] == expected["charset"]
+    assert result["confidence"] == pytest.approx(expected["confidence"])
+    np.testing.assert_allclose(result["probabilities"], expected["probabilities"], rtol=1e-6)
+
+
+def test_char_and_sequence_confidence():
+    output = logits_for([1, 1, 0, 2], seed=4)
+    decoded = decoding.ctc_greedy_decode(output, CHARSET)
+    probs = decoding.softmax(output[:, 0, :])
+    expected = [probs[0, 1], probs[3, 2]]
+    np.testing.assert_allclose(decoded.char_confidences(), expected, rtol=1e-6)
+    assert decoded.sequence_confidence() == pytest.approx(float(np.prod(expected)), rel=1e-6)
+    assert decoding.ctc_greedy_decode(logits_for([0, 0]), CHARSET).sequence_confidence() == 0.0
+
+
+@pytest.mark.parametrize("top_k", [1, 3, 10])
+def test_topk_shapes_and_ordering(top_k):
+    output = logits_for([0, 1, 1, 0, 4, 5], seed=5)
+    decoded = decoding.ctc_greedy_decode(output, CHARSET)
+    result = decoding.topk_probability(decoded, CHARSET, top_k=top_k)
+    probs = decoding.softmax(output[:, 0, :])
+
+    assert result["format"] == "topk" and result["text"] == "a12"
+    assert [c["position"] for c in result["characters"]] == [1, 4, 5]
+    for character in result["characters"]:
+        alternatives = character["alternatives"]
+        # blank 不参与候选，k 不超过非 blank 类别数
+        assert len(alternatives) == min(top_k, len(CHARSET) - 1)
+        assert "" not in [alt for alt, _ in alternatives]
+        scores = [score for _, score in alternatives]
+        assert scores == sorted(scores, reverse=True)
+        assert alternatives[0][0] == character["char"]
+        assert character["confidence"] == pytest.approx(probs[character["position"], CHARSET.index(character["char"])],
+                                                        abs=1e-6)
+    assert result["confidence"] == pytest.approx(np.prod([c["confidence"] for c in result["characters"]]))
+
+
+def test_topk_respects_charset_range():
+    output = logits_for([1, 0, 2], seed=6)
+    mask = valid_mask("ab")
+    result = decoding.topk_probability(decoding.ctc_greedy_decode(output, CHARSET, mask), CHARSET, top_k=5,
+                                       valid_mask=mask)
+    for character in result["characters"]:
+        assert {alt for alt, _ in character["alternatives"]} <= {"a", "b"}
+
+
+def test_topk_empty_result():
+    result = decoding.topk_probability(decoding.ctc_greedy_decode(logits_for([0, 0]), CHARSET), CHARSET)
+    assert result == {"format": "topk", "text": "", "confidence": 0.0, "characters": []}
+
+
+def test_packed_probability_is_little_endian_float16():
+    output = logits_for([0, 1, 2, 2, 0, 3, 6], seed=7)
+    decoded = decoding.ctc_greedy_decode(output, CHARSET)
+    result = decoding.packed_probability(decoded, CHARSET)
+
+    assert result["format"] == "float16" and result["shape"] == [7, len(CHARSET)]
+    raw = base64.b64decode(result["data"])
+    assert len(raw) == 7 * len(CHARSET) * 2
+    packed = np.frombuffer(raw, dtype="<f2").reshape(result["shape"])
+    np.testing.assert_allclose(packed.astype(np.float32), decoding.softmax(output[:, 0, :]), atol=1e-3)
+    np.testing.assert_allclose(packed.astype(np.float32).sum(axis=1), 1, atol=5e-3)
+    assert result["text"] == "abc3"
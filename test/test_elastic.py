@@ -0,0 +1,107 @@
+# coding=utf-8
+"""弹性并发控制器（api/elastic.py）的单元测试，直接驱动决策周期，不启动事件循环"""
+
+import time
+
+import pytest
+
+from api.elastic import ElasticController
+
+
+class FakeScheduler:
+    def __init__(self, max_concurrency: int = 1, ceiling: int = 8):
+        self.max_concurrency = max_concurrency
+        self.concurrency_ceiling = ceiling
+        self.completed = 0
+        self.queued = 0
+        self.pumps = 0
+
+    def _pump(self):
+        self.pumps += 1
+
+
+def make_controller(scheduler: FakeScheduler, **options) -> ElasticController:
+    resized = []
+    controller = ElasticController(scheduler, min_concurrency=1, max_concurrency=scheduler.concurrency_ceiling,
+                                   thread_budget=8, on_resize=resized.append, **options)
+    controller._schedule = lambda: None
+    controller.resized = resized
+    return controller
+
+
+def run_period(controller: ElasticController, completed: int, service_seconds: float, queued: int,
+               wait_seconds: float = 0.0):
+    """模拟一个 1 秒的决策周期：完成 completed 次推理，每次耗时 service_seconds"""
+    scheduler = controller.scheduler
+    controller._wait_ewma = wait_seconds
+    controller._service_ewma = service_seconds
+    controller._busy_seconds += completed * service_seconds
+    scheduler.completed += completed
+    scheduler.queued = queued
+    controller._last_tick = time.monotonic() - 1.0
+    controller._tick()
+
+
+def test_scales_up_on_queue_depth():
+    scheduler = FakeScheduler()
+    controller = make_controller(scheduler)
+    run_period(controller, completed=10, service_seconds=0.1, queued=5, wait_seconds=0.5)
+    assert scheduler.max_concurrency == 2 and scheduler.pumps == 1
+    assert controller.decisions[-1]["reason"] == "queue"
+    assert controller.resized == [4]
+
+    # 扩容后吞吐量随之提升，继续翻倍（不超过当前并发数 + 排队数）
+    run_period(controller, completed=20, service_seconds=0.1, queued=1, wait_seconds=0.5)
+    assert scheduler.max_concurrency == 3
+    assert controller.scale_ups == 2 and controller.resized == [4, 2]
+
+
+def test_short_queue_wait_does_not_scale_up():
+    scheduler = FakeScheduler()
+    controller = make_controller(scheduler)
+    run_period(controller, completed=10, service_seconds=0.1, queued=5, wait_seconds=0.01)
+    assert scheduler.max_concurrency == 1 and controller.scale_ups == 0
+
+
+def test_scales_back_when_latency_rises_without_throughput_gain():
+    scheduler = FakeScheduler(max_concurrency=2)
+    controller = make_controller(scheduler)
+    run_period(controller, completed=10, service_seconds=0.1, queued=8, wait_seconds=0.5)
+    assert scheduler.max_concurrency == 4
+
+    # 并发翻倍但吞吐量不变，单次推理耗时翻倍：CPU 争用，撤回扩容并暂停扩容
+    run_period(controller, completed=10, service_seconds=0.2, queued=8, wait_seconds=0.5)
+    assert scheduler.max_concurrency == 2
+    assert controller.decisions[-1]["reason"] == "contention"
+    assert controller._hold_until > time.monotonic()
+
+    run_period(controller, completed=10, service_seconds=0.1, queued=8, wait_seconds=0.5)
+    assert scheduler.max_concurrency == 2
+
+
+def test_scales_down_after_idle_ticks():
+    scheduler = FakeScheduler(max_concurrency=3)
+    controller = make_controller(scheduler, idle_ticks=2)
+    run_period(controller, completed=1, service_seconds=0.1, queued=0)
+    assert scheduler.max_concurrency == 3
+    run_period(controller, completed=1, service_seconds=0.1, queued=0)
+    assert scheduler.max_concurrency == 2 and controller.decisions[-1]["reason"] == "idle"
+    # 忙碌时不缩容
+    run_period(controller, completed=30, service_seconds=0.1, queued=0)
+    run_period(controller, completed=30, service_seconds=0.1, queued=0)
+    assert scheduler.max_concurrency == 2
+
+
+@pytest.mark.parametrize("value", ["", "eight", "8", "9"])
+def test_from_env_disabled(monkeypatch, value):
+    monkeypatch.setenv("DDDDOCR_MIN_CONCURRENCY", value)
+    assert ElasticController.from_env(FakeScheduler(ceiling=8)) is None
+
+
+def test_from_env_falls_back_on_invalid_numbers(monkeypatch):
+    monkeypatch.setenv("DDDDOCR_MIN_CONCURRENCY", "2")
+    monkeypatch.setenv("DDDDOCR_THREAD_BUDGET", "lots")
+    monkeypatch.setenv("DDDDOCR_ELASTIC_INTERVAL", "fast")
+    controller = ElasticController.from_env(FakeScheduler(ceiling=8))
+    assert (controller.min_concurrency, controller.max_concurrency) == (2, 8)
+    assert controller.thread_budget >= 1 and controller.interval == 1.0
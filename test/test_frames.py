@@ -0,0 +1,114 @@
+# coding=utf-8
+"""多帧验证码（api/frames.py）的单元测试"""
+
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from api.frames import frame_weights, load_frames, project, vote
+
+
+def make_frames(count: int, seed: int = 0, size=(24, 12), mode: str = "RGB"):
+    rng = np.random.default_rng(seed)
+    shape = (size[1], size[0]) if mode == "L" else (size[1], size[0], len(mode))
+    return [Image.fromarray(rng.integers(0, 256, shape, dtype=np.uint8), mode) for _ in range(count)]
+
+
+def gif(count: int, size=(32, 16), durations=None) -> bytes:
+    frames = [Image.new("P", size, index) for index in range(count)]
+    for index, frame in enumerate(frames):
+        frame.putpalette([value for color in range(256) for value in (color, 255 - color, color // 2)])
+        frame.putpixel((index % size[0], 0), (index + 1) % 256)  # 保证相邻帧不同，不被编码器合并
+    buffer = io.BytesIO()
+    frames[0].save(buffer, "GIF", save_all=True, append_images=frames[1:], duration=durations or 100, loop=0)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("mode,reducer", [("max", np.max), ("min", np.min)])
+def test_project_extremes(mode, reducer):
+    frames = make_frames(5)
+    expected = reducer(np.stack([np.asarray(frame) for frame in frames]), axis=0)
+    merged = project(frames, mode)
+    assert merged.mode == "RGB"
+    assert np.array_equal(np.asarray(merged), expected)
+
+
+@pytest.mark.parametrize("count", [2, 3, 4, 7])
+@pytest.mark.parametrize("mode", ["RGB", "RGBA", "L"])
+def test_project_median_matches_numpy(count, mode):
+    frames = make_frames(count, seed=count, mode=mode)
+    stack = np.stack([np.asarray(frame) for frame in frames])
+    expected = np.median(stack, axis=0).round().astype(np.uint8)
+    assert np.array_equal(np.asarray(project(frames, "median")), expected)
+
+
+def test_project_median_removes_flicker():
+    base = np.full((8, 8), 200, np.uint8)
+    frames = []
+    for index in range(5):
+        pixels = base.copy()
+        pixels[index, index] = 0  # 每帧一个不同位置的噪点
+        frames.append(Image.fromarray(pixels, "L"))
+    assert np.array_equal(np.asarray(project(frames, "median")), base)
+
+
+def test_project_single_frame_and_unknown_mode():
+    frames = make_frames(1)
+    assert project(frames, "max") is frames[0]
+    with pytest.raises(ValueError):
+        project(make_frames(2), "mean")
+
+
+def test_load_frames_static_image():
+    buffer = io.BytesIO()
+    Image.new("RGB", (10, 10)).save(buffer, "PNG")
+    frames = load_frames(buffer.getvalue())
+    assert len(frames) == 1 and frames[0].size == (10, 10)
+
+
+def test_load_frames_respects_max_frames():
+    frames = load_frames(gif(6), max_frames=4, max_pixels=0)
+    assert len(frames) == 4
+    assert {frame.mode for frame in frames} == {"RGB"}
+
+
+def test_load_frames_stops_at_pixel_budget():
+    data = gif(10, size=(32, 16))
+    assert len(load_frames(data, max_frames=256, max_pixels=32 * 16 * 3)) == 3
+    # 预算不足一帧时仍保留第一帧
+    assert len(load_frames(data, max_frames=256, max_pixels=100)) == 1
+
+
+def test_load_frames_reads_budget_from_env(monkeypatch):
+    monkeypatch.setenv("DDDDOCR_MAX_IMAGE_PIXELS", str(32 * 16 * 2))
+    assert len(load_frames(gif(5), max_frames=16)) == 2
+
+
+def test_frame_weights_use_duration():
+    frames = load_frames(gif(3, durations=[100, 300, 50]), max_pixels=0)
+    assert frame_weights(frames) == [100.0, 300.0, 50.0]
+    assert frame_weights([Image.new("L", (2, 2))]) == [1.0]
+
+
+def test_vote_majority_and_best_frame():
+    candidates = [("ab12", 0.7), ("ab12", 0.9), ("ab1z", 0.95)]
+    index, votes = vote(candidates)
+    assert (index, votes) == (1, {"ab12": 2.0, "ab1z": 1.0})
+
+
+def test_vote_weighted_by_duration():
+    candidates = [("ab12", 0.9), ("ab12", 0.9), ("ab1z", 0.5)]
+    index, votes = vote(candidates, [100, 100, 500])
+    assert index == 2 and votes == {"ab12": 200.0, "ab1z": 500.0}
+
+
+def test_vote_tie_goes_to_higher_confidence():
+    index, _ = vote([("aaaa", 0.4), ("bbbb", 0.8)])
+    assert index == 1
+
+
+def test_vote_ignores_empty_text():
+    assert vote([("", 0.9), ("abcd", 0.1)])[0] == 1
+    assert vote([("", 0.9), ("", 0.5)]) == (0, {})
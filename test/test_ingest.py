@@ -0,0 +1,110 @@
+# coding=utf-8
+"""请求体流式校验（api/ingest.py）的单元测试"""
+
+import io
+import json
+import base64
+import struct
+
+import pytest
+from PIL import Image
+
+from api.ingest import BodyRejected, _JSONImageScanner, sniff_image_header
+
+
+def image_bytes(fmt: str, size=(40, 20)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def scan(body: bytes, chunk_size: int = None, max_image_bytes: int = 0, max_image_pixels: int = 0):
+    scanner = _JSONImageScanner(max_image_bytes, max_image_pixels)
+    chunk_size = chunk_size or len(body)
+    for start in range(0, len(body), chunk_size):
+        scanner.feed(body[start:start + chunk_size])
+    return scanner.decoded
+
+
+@pytest.mark.parametrize("fmt", ["PNG", "GIF", "BMP", "JPEG", "WEBP"])
+def test_sniff_image_header(fmt):
+    assert sniff_image_header(image_bytes(fmt)) == (fmt.lower(), 40, 20)
+
+
+def test_sniff_needs_enough_bytes():
+    assert sniff_image_header(image_bytes("PNG")[:20]) is None
+    assert sniff_image_header(b"not an image") is None
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 64, None])
+def test_decodes_image_fields_across_chunks(chunk_size):
+    data = image_bytes("PNG")
+    body = json.dumps({"image": base64.b64encode(data).decode(), "png_fix": True}).encode()
+    assert scan(body, chunk_size) == {"image": data}
+
+
+def test_line_wrapped_and_spaced_base64_is_accepted():
+    data = image_bytes("PNG")
+    wrapped = base64.encodebytes(data).decode()  # 每76字符一个换行
+    body = json.dumps({"image": wrapped, "target_image": " " + base64.b64encode(data).decode() + " "}).encode()
+    for chunk_size in (5, None):
+        assert scan(body, chunk_size) == {"image": data, "target_image": data}
+    # 请求体中的原始换行同样忽略（与 base64.b64decode 的宽松解码一致）
+    raw = b'{"image": "' + base64.encodebytes(data).replace(b"\n", b"\r\n") + b'"}'
+    assert scan(raw, 9) == {"image": data}
+
+
+def test_escaped_slash_is_decoded():
+    data = bytes(range(256))
+    encoded = base64.b64encode(data).decode()
+    assert "/" in encoded
+    body = json.dumps({"image": encoded}).replace("/", "\\/").encode()
+    assert scan(body, 4) == {"image": data}
+
+
+@pytest.mark.parametrize("value", ["abc!", "ab=c", "YWJj\\u0041", "YQ==YWJj", "YWJjZ"])
+def test_invalid_base64_is_rejected(value):
+    with pytest.raises(BodyRejected) as error:
+        scan(('{"image": "%s"}' % value).encode())
+    assert error.value.status_code == 400
+
+
+def test_nested_image_fields_are_checked_but_not_reused():
+    data = image_bytes("PNG")
+    body = json.dumps({"batch": [{"image": base64.b64encode(data).decode()}]}).encode()
+    assert scan(body) == {}
+    with pytest.raises(BodyRejected):
+        scan(b'{"batch": [{"image": "@@@@"}]}')
+
+
+def test_other_strings_are_ignored():
+    body = json.dumps({"note": "not base64 \" at all !", "images": "!!!", "image": "YWJj"}).encode()
+    assert scan(body, 2) == {"image": b"abc"}
+
+
+def test_image_byte_limit():
+    body = json.dumps({"image": base64.b64encode(b"x" * 1000).decode()}).encode()
+    with pytest.raises(BodyRejected) as error:
+        scan(body, 16, max_image_bytes=999)
+    assert error.value.status_code == 413
+
+
+def test_pixel_limit_rejects_before_full_decode():
+    # 只有PNG头（声明 100000x100000）加一段填充，尚未到达图片数据就应拒绝
+    header = b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + struct.pack(">II", 100000, 100000)
+    body = json.dumps({"image": base64.b64encode(header + b"\0" * 30).decode()}).encode()
+    with pytest.raises(BodyRejected) as error:
+        scan(body, 8, max_image_pixels=4096 * 4096)
+    assert error.value.status_code == 413
+
+
+def test_body_limit_response_has_cors_headers(monkeypatch):
+    from fastapi.testclient import TestClient
+    from api.server import create_app
+
+    monkeypatch.setenv("DDDDOCR_MAX_BODY_BYTES", "64")
+    client = TestClient(create_app(gzip_min_size=0))
+    response = client.post("/ocr", content=b"{" + b" " * 100 + b"}", headers={
+        "Origin": "https://example.com", "Content-Type": "application/json"})
+    assert response.status_code == 413
+    assert response.headers.get("access-control-allow-origin")
@@ -0,0 +1,76 @@
+# coding=utf-8
+"""非阻塞日志（api/logs.py）的单元测试"""
+
+import json
+import hashlib
+
+from api.logs import LogWriter, RequestLogger
+from api.models import OCRRequest
+
+
+def make_writer(path, capacity: int = 3) -> LogWriter:
+    # 后台线程只在长间隔后才醒来，测试中由 flush() 同步写出
+    return LogWriter(str(path), capacity=capacity, batch_size=1000, flush_interval=3600)
+
+
+def read_lines(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_ring_buffer_drops_oldest_when_full(tmp_path):
+    writer = make_writer(tmp_path / "out.jsonl")
+    for index in range(5):
+        writer.put({"n": index})
+    assert list(writer._buffer) == [{"n": 2}, {"n": 3}, {"n": 4}]
+    assert writer.get_metrics()["dropped"] == 2
+
+
+def test_flush_writes_everything_in_order(tmp_path):
+    path = tmp_path / "logs" / "out.jsonl"
+    writer = make_writer(path, capacity=100)
+    for index in range(10):
+        writer.put({"n": index})
+    writer.flush()
+    assert [record["n"] for record in read_lines(path)] == list(range(10))
+    assert writer.get_metrics()["written"] == 10 and writer.get_metrics()["buffered"] == 0
+
+
+def test_formatter_errors_are_counted(tmp_path):
+    path = tmp_path / "out.jsonl"
+    writer = LogWriter(str(path), formatter=lambda record: record["text"], flush_interval=3600)
+    writer.put({"text": "ok"})
+    writer.put({})
+    writer.flush()
+    assert path.read_text(encoding="utf-8") == "ok\n"
+    assert (writer.written, writer.errors) == (1, 1)
+
+
+def test_after_fork_resets_child_state(tmp_path):
+    writer = make_writer(tmp_path / "out.jsonl")
+    writer.put({"n": 1})
+    parent_thread = writer._thread
+    assert parent_thread is not None
+
+    writer._after_fork()
+    assert len(writer._buffer) == 0
+    assert writer._thread is None and writer._stream is None
+    # 子进程首次写入时重新启动自己的后台线程
+    writer.put({"n": 2})
+    assert writer._thread is not None and writer._thread is not parent_thread
+
+
+def test_audit_entry_is_small_dict_without_images(tmp_path):
+    path = tmp_path / "audit.jsonl"
+    logger = RequestLogger(audit_path=str(path))
+    image = b"\x89PNG fake image bytes"
+    request = OCRRequest(image="iVBORw0KGgo=", png_fix=True)
+    logger.record("ocr", "ip:1.2.3.4", request, {"image": image}, {"text": "ab12"}, None, 0.0123)
+
+    entry = logger.audit._buffer[0]
+    assert isinstance(entry, dict)
+    assert entry["images"] == {"image": hashlib.sha256(image).hexdigest()}
+    assert "image" not in entry["options"] and entry["options"]["png_fix"] is True
+
+    logger.flush()
+    record = read_lines(path)[0]
+    assert record["result"] == {"text": "ab12"} and record["latency_ms"] == 12.3
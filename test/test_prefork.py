@@ -0,0 +1,54 @@
+# coding=utf-8
+"""预派生主进程重新派生策略（api/prefork.py）的单元测试，不实际 fork"""
+
+import time
+
+from api.prefork import PreforkServer
+
+
+def make_server(**options) -> PreforkServer:
+    server = PreforkServer(config=None, workers=2, **options)
+    server.started_at = {0: time.monotonic(), 1: time.monotonic()}
+    return server
+
+
+def delay(server: PreforkServer, index: int) -> float:
+    return server.respawn_at[index] - time.monotonic()
+
+
+def test_recycled_worker_restarts_immediately():
+    server = make_server()
+    server._on_exit(0, pid=100, exit_code=0)
+    assert server.failures[0] == 0
+    assert delay(server, 0) <= 0
+
+
+def test_rapid_failures_back_off_per_slot():
+    server = make_server(backoff=0.5, backoff_max=3, max_failures=0)
+    expected = [0.5, 1, 2, 3, 3]
+    for attempt, seconds in enumerate(expected, 1):
+        server._on_exit(0, pid=100 + attempt, exit_code=1)
+        assert server.failures[0] == attempt
+        assert abs(delay(server, 0) - seconds) < 0.05
+    # 其他槽位不受影响
+    server._on_exit(1, pid=200, exit_code=0)
+    assert delay(server, 1) <= 0
+
+
+def test_slot_abandoned_after_max_failures():
+    server = make_server(max_failures=3)
+    for attempt in range(3):
+        server.respawn_at.pop(0, None)
+        server._on_exit(0, pid=100 + attempt, exit_code=-9)
+    assert server.abandoned == [0]
+    assert 0 not in server.respawn_at
+
+
+def test_failure_after_long_uptime_resets_backoff():
+    server = make_server(rapid_window=30)
+    server._on_exit(0, pid=100, exit_code=1)
+    assert server.failures[0] == 1
+    server.started_at[0] = time.monotonic() - 60
+    server._on_exit(0, pid=101, exit_code=1)
+    assert server.failures[0] == 0
+    assert delay(server, 0) <= 0
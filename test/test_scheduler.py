@@ -0,0 +1,189 @@
+# coding=utf-8
+"""推理调度器（api/scheduler.py）的单元测试"""
+
+import time
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from api.scheduler import ClientContext, InferenceScheduler, parse_networks
+
+
+def make_request(peer: str = "203.0.113.7", forwarded_for: str = None, claims: dict = None) -> Request:
+    headers = [(b"x-forwarded-for", forwarded_for.encode())] if forwarded_for else []
+    request = Request({"type": "http", "method": "POST", "path": "/ocr", "headers": headers,
+                       "client": (peer, 40000)})
+    if claims is not None:
+        request.state.auth_claims = claims
+    return request
+
+
+async def run_blocked(scheduler: InferenceScheduler, submissions):
+    """
+    先用一个阻塞任务占满并发，再按顺序提交 (客户端, 名称)，放行后返回实际执行顺序
+    """
+    order = []
+    gate = threading.Event()
+    blocker = asyncio.ensure_future(scheduler.submit(gate.wait, client=ClientContext("blocker")))
+    await asyncio.sleep(0)
+    tasks = [asyncio.ensure_future(scheduler.submit(order.append, name, client=client))
+             for client, name in submissions]
+    await asyncio.sleep(0)
+    gate.set()
+    await blocker
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_identify_prefers_jwt_subject():
+    scheduler = InferenceScheduler()
+    assert scheduler.identify(make_request(claims={"sub": "crawler"})).client_id == "jwt:crawler"
+
+
+def test_identify_ignores_forwarded_for_from_untrusted_peer():
+    scheduler = InferenceScheduler()
+    assert scheduler.identify(make_request(forwarded_for="1.2.3.4")).client_id == "ip:203.0.113.7"
+
+
+def test_identify_uses_forwarded_for_behind_trusted_proxy():
+    scheduler = InferenceScheduler(trusted_proxies=parse_networks("10.0.0.0/8, 192.168.1.5"))
+    # 客户端自行伪造的最左侧地址被忽略，取最右侧的非受信地址
+    request = make_request(peer="10.0.0.2", forwarded_for="1.2.3.4, 198.51.100.9, 192.168.1.5")
+    assert scheduler.identify(request).client_id == "ip:198.51.100.9"
+    assert scheduler.identify(make_request(peer="10.0.0.2")).client_id == "ip:10.0.0.2"
+
+
+def test_parse_networks_skips_invalid_entries():
+    assert [str(network) for network in parse_networks("10.0.0.0/8,not-an-ip,,::1")] == ["10.0.0.0/8", "::1/128"]
+
+
+def test_identify_deadline_takes_earlier_value():
+    scheduler = InferenceScheduler()
+    request = Request({"type": "http", "method": "POST", "path": "/ocr", "client": ("127.0.0.1", 1),
+                       "headers": [(b"x-request-deadline", b"100")]})
+    assert scheduler.identify(request, deadline=200).deadline == 100
+    bad = Request({"type": "http", "method": "POST", "path": "/ocr", "client": ("127.0.0.1", 1),
+                   "headers": [(b"x-request-deadline", b"soon")]})
+    with pytest.raises(HTTPException) as error:
+        scheduler.identify(bad)
+    assert error.value.status_code == 400
+
+
+def test_token_bucket_limits_rate():
+    async def body():
+        scheduler = InferenceScheduler(client_rate=1, client_burst=2)
+        client = ClientContext("ip:1.1.1.1")
+        assert await scheduler.submit(int, "1", client=client) == 1
+        assert await scheduler.submit(int, "2", client=client) == 2
+        with pytest.raises(HTTPException) as error:
+            await scheduler.submit(int, "3", client=client)
+        assert error.value.status_code == 429
+    asyncio.run(body())
+
+
+def test_expired_request_does_not_spend_a_token():
+    async def body():
+        scheduler = InferenceScheduler(client_rate=0.001, client_burst=1)
+        with pytest.raises(HTTPException) as error:
+            await scheduler.submit(int, "1", client=ClientContext("ip:1.1.1.1", deadline=time.time() - 1))
+        assert error.value.status_code == 504
+        assert await scheduler.submit(int, "1", client=ClientContext("ip:1.1.1.1")) == 1
+    asyncio.run(body())
+
+
+def test_strict_priority_between_lanes():
+    async def body():
+        scheduler = InferenceScheduler(max_concurrency=1)
+        order = await run_blocked(scheduler, [
+            (ClientContext("a", priority="batch"), "batch"),
+            (ClientContext("b"), "default"),
+            (ClientContext("c", priority="interactive"), "interactive"),
+        ])
+        assert order == ["interactive", "default", "batch"]
+    asyncio.run(body())
+
+
+def test_weighted_fair_queueing_within_lane():
+    async def body():
+        scheduler = InferenceScheduler(max_concurrency=1)
+        heavy, light = ClientContext("heavy", weight=2), ClientContext("light")
+        order = await run_blocked(scheduler, [(heavy, "h")] * 4 + [(light, "l")] * 2)
+        # 权重 2:1，轻量客户端不必等重量客户端的队列排空
+        assert order == ["h", "h", "l", "h", "h", "l"]
+    asyncio.run(body())
+
+
+def test_client_queue_limit():
+    async def body():
+        scheduler = InferenceScheduler(max_concurrency=1, client_max_queue=1)
+        gate = threading.Event()
+        blocker = asyncio.ensure_future(scheduler.submit(gate.wait, client=ClientContext("blocker")))
+        await asyncio.sleep(0)
+        queued = asyncio.ensure_future(scheduler.submit(int, "1", client=ClientContext("a")))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as error:
+            await scheduler.submit(int, "2", client=ClientContext("a"))
+        assert error.value.status_code == 429
+        gate.set()
+        await asyncio.gather(blocker, queued)
+    asyncio.run(body())
+
+
+def test_tracked_clients_are_bounded_when_all_busy():
+    async def body():
+        scheduler = InferenceScheduler(max_concurrency=1, max_tracked_clients=2)
+        gate = threading.Event()
+        busy = [asyncio.ensure_future(scheduler.submit(gate.wait, client=ClientContext(name)))
+                for name in ("a", "b")]
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as error:
+            await scheduler.submit(int, "1", client=ClientContext("c"))
+        assert error.value.status_code == 503
+        assert len(scheduler._clients) == 2
+        gate.set()
+        await asyncio.gather(*busy)
+        # 空闲客户端可被回收，新客户端随后正常进入
+        assert await scheduler.submit(int, "1", client=ClientContext("c")) == 1
+        assert len(scheduler._clients) <= 2
+    asyncio.run(body())
+
+
+def test_codel_sheds_after_sustained_queue_delay():
+    scheduler = InferenceScheduler(codel_target_ms=5, codel_interval_ms=100)
+    scheduler._queued = 1
+    assert scheduler._codel_should_shed(0.02, now=10.0) is False
+    assert scheduler._codel_should_shed(0.02, now=10.05) is False
+    assert scheduler._codel_should_shed(0.02, now=10.11) is True
+    # 丢弃状态下按 interval/sqrt(count) 的间隔继续丢弃
+    assert scheduler._codel_should_shed(0.02, now=10.12) is False
+    assert scheduler._codel_should_shed(0.02, now=10.211) is True
+    assert scheduler._codel_should_shed(0.02, now=10.211 + 0.1 / 2 ** 0.5 - 0.001) is False
+    assert scheduler._codel_should_shed(0.02, now=10.211 + 0.1 / 2 ** 0.5 + 0.001) is True
+    # 时延回落后退出丢弃状态
+    assert scheduler._codel_should_shed(0.001, now=10.4) is False
+    assert scheduler._dropping is False
+
+
+def test_metrics_endpoint_requires_admin(monkeypatch):
+    import jwt
+    from fastapi.testclient import TestClient
+    from api.middleware import AuthMiddleware
+    from api.server import create_app
+
+    secret = "test-secret-" + "x" * 32
+    monkeypatch.setenv("OCR_SHARED_SECRET", secret)
+    app = create_app(gzip_min_size=0)
+    app.add_middleware(AuthMiddleware)
+    client = TestClient(app)
+
+    def token(**claims):
+        claims = {"sub": "crawler", "exp": time.time() + 60, **claims}
+        return {"Authorization": "Bearer " + jwt.encode(claims, secret, algorithm="HS256")}
+
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers=token()).status_code == 403
+    response = client.get("/metrics", headers=token(role="admin"))
+    assert response.status_code == 200 and "scheduler" in response.json()
@@ -0,0 +1,132 @@
+# coding=utf-8
+"""影子流量评估（api/shadow.py）的单元测试"""
+
+import os
+import json
+import threading
+
+import pytest
+
+from api.models import OCRRequest
+from api.shadow import ShadowEvaluator, bbox_iou, match_bboxes, resolve_dump_dir
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00\x00\x00\rIHDR" + b"\x00\x00\x00\x10\x00\x00\x00\x08" + b"\x00" * 16
+
+
+def test_bbox_iou():
+    assert bbox_iou([0, 0, 10, 10], [0, 0, 10, 10]) == 1.0
+    assert bbox_iou([0, 0, 10, 10], [5, 0, 15, 10]) == pytest.approx(50 / 150)
+    assert bbox_iou([0, 0, 10, 10], [20, 20, 30, 30]) == 0.0
+    assert bbox_iou([0, 0, 0, 0], [0, 0, 0, 0]) == 0.0
+
+
+def test_match_bboxes_agree_regardless_of_order():
+    primary = [[0, 0, 10, 10], [50, 50, 60, 60]]
+    candidate = [[51, 50, 61, 60], [0, 0, 10, 10]]
+    agree, mean_iou = match_bboxes(primary, candidate, 0.5)
+    assert agree and mean_iou == pytest.approx((1 + 90 / 110) / 2)
+
+
+def test_match_bboxes_disagreements():
+    # 数量不同
+    assert match_bboxes([[0, 0, 10, 10]], [[0, 0, 10, 10], [20, 20, 30, 30]], 0.5)[0] is False
+    # 重叠不足阈值
+    agree, mean_iou = match_bboxes([[0, 0, 10, 10]], [[6, 0, 16, 10]], 0.5)
+    assert agree is False and mean_iou == 0.0
+    # 一个候选框不能同时匹配两个主模型框
+    assert match_bboxes([[0, 0, 10, 10], [0, 0, 10, 10]], [[0, 0, 10, 10], [40, 40, 50, 50]], 0.5)[0] is False
+
+
+def test_match_bboxes_both_empty():
+    assert match_bboxes([], [], 0.5) == (True, 1.0)
+
+
+def test_resolve_dump_dir_stays_under_root(tmp_path):
+    root = str(tmp_path)
+    assert resolve_dump_dir(None, root) is None
+    assert resolve_dump_dir("run-1", root) == os.path.join(os.path.realpath(root), "run-1")
+    for escape in ("../elsewhere", "/etc", "a/../../b"):
+        with pytest.raises(ValueError):
+            resolve_dump_dir(escape, root)
+    os.symlink("/tmp", tmp_path / "link")
+    with pytest.raises(ValueError):
+        resolve_dump_dir("link/x", root)
+
+
+def test_resolve_dump_dir_requires_server_root(monkeypatch):
+    monkeypatch.delenv("DDDDOCR_SHADOW_DUMP_DIR", raising=False)
+    with pytest.raises(ValueError):
+        resolve_dump_dir("samples")
+
+
+def finish(evaluator: ShadowEvaluator):
+    evaluator.executor.shutdown(wait=True)
+    return evaluator.get_metrics()["operations"]
+
+
+def test_disagreements_are_counted_and_dumped(tmp_path):
+    answers = iter(["abcd", "abce", "abcd"])
+    evaluator = ShadowEvaluator({"ocr": lambda image, request: next(answers)}, sample_rate=1,
+                                dump_dir=str(tmp_path))
+    for _ in range(3):
+        evaluator.mirror("ocr", PNG, OCRRequest(image="eA=="), {"text": "abcd"}, 0.01)
+    stats = finish(evaluator)["ocr"]
+
+    assert (stats["mirrored"], stats["compared"], stats["disagreements"]) == (3, 3, 1)
+    assert stats["disagreement_rate"] == pytest.approx(1 / 3)
+    files = sorted(os.listdir(tmp_path / "ocr"))
+    assert [name.rsplit(".", 1)[1] for name in files] == ["json", "png"]
+    record = json.loads((tmp_path / "ocr" / files[0]).read_text(encoding="utf-8"))
+    assert record["primary"] == {"text": "abcd"} and record["candidate"] == "abce"
+    assert "image" not in record["options"]
+
+
+def test_detection_mean_iou():
+    evaluator = ShadowEvaluator({"detect": lambda image, request: [[0, 0, 10, 10]]}, sample_rate=1)
+    evaluator.mirror("detect", PNG, None, [[0, 0, 10, 10]], 0.01)
+    evaluator.mirror("detect", PNG, None, [], 0.01)
+    stats = finish(evaluator)["detect"]
+    assert stats["disagreements"] == 1 and stats["mean_iou"] == pytest.approx(0.5)
+
+
+def test_mirrors_dropped_when_max_pending_reached():
+    gate = threading.Event()
+    evaluator = ShadowEvaluator({"ocr": lambda image, request: gate.wait() and "x"}, sample_rate=1,
+                                max_pending=2)
+    for _ in range(5):
+        evaluator.mirror("ocr", PNG, None, "x", 0.01)
+    assert evaluator.get_metrics()["pending"] == 2
+    gate.set()
+    stats = finish(evaluator)["ocr"]
+    assert (stats["mirrored"], stats["dropped"], stats["compared"]) == (2, 3, 2)
+    assert evaluator.get_metrics()["pending"] == 0
+
+
+def test_dumps_capped_by_max_dumps(tmp_path):
+    evaluator = ShadowEvaluator({"ocr": lambda image, request: "wrong"}, sample_rate=1, dump_dir=str(tmp_path),
+                                max_dumps=2)
+    for _ in range(5):
+        evaluator.mirror("ocr", PNG, None, "right", 0.01)
+    stats = finish(evaluator)["ocr"]
+    assert stats["disagreements"] == 5
+    assert evaluator.get_metrics()["dumped"] == 2
+    assert len(os.listdir(tmp_path / "ocr")) == 4
+
+
+def test_candidate_errors_are_counted():
+    def broken(image, request):
+        raise RuntimeError("boom")
+
+    evaluator = ShadowEvaluator({"ocr": broken}, sample_rate=1)
+    evaluator.mirror("ocr", PNG, None, "x", 0.01)
+    stats = finish(evaluator)["ocr"]
+    assert (stats["errors"], stats["compared"]) == (1, 0)
+
+
+def test_shadow_endpoint_requires_admin():
+    from fastapi.testclient import TestClient
+    from api.server import create_app
+
+    client = TestClient(create_app(gzip_min_size=0))
+    response = client.post("/shadow", json={"enabled": False})
+    assert response.status_code == 403